@@ -1,7 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from services.crawler import handle_crawler_request
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from services.crawler import (
+    handle_crawler_request,
+    stream_batch_crawl,
+    stream_crawler_records,
+)
+from services.jobs import QUEUED, JobQueueFull, job_manager
+from services.listing_index import listing_index
+from services.llm_cache import llm_cache
 from core.logging import setup_logging
-from utils.misc import QueryParams
+from utils.account_pool import account_pool
+from utils.browser_pool import browser_pool
+from utils.metrics import PROMETHEUS_MEDIA_TYPE, render_metrics
+from utils.misc import BatchQueryParams, QueryParams, cities
+from utils.routing import routing_stats
+from utils.selectors import selector_registry
+from utils.serialization import (
+    ARROW_STREAM_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    negotiate_media_type,
+)
 
 # Initialize logger
 logger = setup_logging()
@@ -24,12 +44,230 @@ def root() -> dict:
 
 # Define the endpoint for the crawler
 @router.get("/crawler/")
-async def crawler(params: QueryParams = Depends()):
+async def crawler(request: Request, params: QueryParams = Depends()):
+    """
+    Runs the crawler. The response format follows the Accept header:
+    NDJSON streams one listing per line as it is extracted, Arrow IPC returns
+    the whole table, anything else returns the legacy JSON shape.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"))
 
     try:
         logger.info("Crawler request received with params: %s", params)
-        return await handle_crawler_request(params)
+        if media_type == NDJSON_MEDIA_TYPE:
+            # Waits for the first listing, so the crawl can still fail
+            # with its status
+            records = await stream_crawler_records(params)
+            return StreamingResponse(records, media_type=media_type)
+        headers = {}
+        content = await handle_crawler_request(params, media_type, headers)
+        if media_type == ARROW_STREAM_MEDIA_TYPE:
+            return Response(content, media_type=media_type, headers=headers)
+        return JSONResponse(content, headers=headers)
 
+    except HTTPException:
+        # Already carries its status, e.g. 503 when the pool is exhausted
+        raise
     except Exception as e:
         logger.error("Error handling crawler request: %s", str(e))
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Define the endpoint for batch crawls
+@router.post("/crawler/batch/")
+async def crawler_batch(params: BatchQueryParams):
+    """
+    Crawls every (city, query) combination concurrently and streams one JSON
+    line per combination as soon as it finishes.
+
+    Returns:
+        StreamingResponse: NDJSON stream of per-combination results.
+    """
+    unsupported = [c for c in params.cities if c not in cities]
+    if unsupported:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{', '.join(unsupported)} not supported.",
+        )
+
+    logger.info("Batch crawler request received with params: %s", params)
+    return StreamingResponse(
+        stream_batch_crawl(params), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+# Define the endpoints of the asynchronous crawl jobs
+@router.post("/jobs", status_code=202)
+async def submit_job(params: QueryParams) -> dict:
+    """
+    Queues a crawl job and returns its id without waiting for the crawl.
+
+    Returns:
+        dict: The job id and status.
+    """
+    try:
+        job_id = await job_manager.submit(params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"id": job_id, "status": QUEUED}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> dict:
+    """
+    Returns the status, progress and, once done, the result of a job.
+
+    Returns:
+        dict: The job description.
+    """
+    return await get_job_or_404(job_id)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """
+    Streams the job listings as NDJSON while they are extracted, followed by
+    a final line with the job status.
+
+    Returns:
+        StreamingResponse: NDJSON stream of listings.
+    """
+    await get_job_or_404(job_id)
+    return StreamingResponse(
+        job_manager.stream(job_id), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> dict:
+    """
+    Cancels a queued or running job.
+
+    Returns:
+        dict: The job id and status.
+    """
+    status = await job_manager.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"id": job_id, "status": status}
+
+
+async def get_job_or_404(job_id):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# Define the endpoint listing the crawl workers
+@router.get("/workers")
+async def list_workers() -> list:
+    """
+    Returns the crawl workers that sent a heartbeat recently, with their
+    concurrency and running jobs.
+
+    Returns:
+        list: The workers.
+    """
+    return await job_manager.backend.workers()
+
+
+# Define the endpoint exposing the browser pool metrics
+@router.get("/pool/metrics")
+def pool_metrics() -> dict:
+    """
+    Returns the browser pool size, usage and wait-time metrics.
+
+    Returns:
+        dict: Browser pool metrics.
+    """
+    return browser_pool.metrics()
+
+
+# Define the endpoint exposing the account pool usage
+@router.get("/accounts/stats")
+def accounts_stats() -> list:
+    """
+    Returns the running crawls, request budget and cooldown of each account
+    of the account pool.
+
+    Returns:
+        list: Per account statistics.
+    """
+    return account_pool.stats()
+
+
+# Define the endpoint exposing the stage timings to Prometheus
+@router.get("/metrics")
+def metrics() -> Response:
+    """
+    Returns the duration histograms of the crawl stages and of the
+    extraction of each listing, in the Prometheus text format.
+
+    Returns:
+        Response: The metrics page.
+    """
+    return Response(render_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+# Define the endpoint exposing the request routing counters
+@router.get("/routing/stats")
+def routing_stats_endpoint() -> dict:
+    """
+    Returns, per routing policy, the allowed and blocked requests and bytes
+    and the static assets served from the disk cache.
+
+    Returns:
+        dict: Request routing statistics.
+    """
+    return routing_stats.stats()
+
+
+# Define the endpoint exposing the LLM result cache statistics
+@router.get("/llm/cache/stats")
+def llm_cache_stats() -> dict:
+    """
+    Returns the LLM result cache hit/miss counters and sizes.
+
+    Returns:
+        dict: LLM result cache statistics.
+    """
+    return llm_cache.stats()
+
+
+# Define the endpoint exposing the selector hit rates
+@router.get("/selectors/stats")
+def selectors_stats() -> dict:
+    """
+    Returns the active selector set and, for each selector set used, how
+    often each field was found by the selectors, by the structural fallback
+    or not at all.
+
+    Returns:
+        dict: Selector registry statistics.
+    """
+    return selector_registry.stats()
+
+
+# Define the endpoint listing the listing changes of incremental crawls
+@router.get("/listings/changes")
+def listing_changes(
+    since: int = Query(default=0, ge=0),
+    city: Optional[str] = None,
+    query: Optional[str] = None,
+    limit: int = Query(default=1000, ge=1, le=10000),
+) -> dict:
+    """
+    Returns the new, changed, price dropped and removed listings recorded by
+    incremental crawls after a cursor.
+
+    Args:
+        since (int): The cursor returned by the previous call (0 for all).
+        city (str, optional): Only the changes of this city.
+        query (str, optional): Only the changes of this query.
+        limit (int): Maximum number of changes returned.
+
+    Returns:
+        dict: The next ``cursor`` and the ``changes``.
+    """
+    return listing_index.changes(since, city, query, limit)
@@ -0,0 +1,98 @@
+"""
+Measure the event-loop lag while pages are parsed, per parse executor.
+
+A probe task sleeps for ``--interval`` seconds in a loop and records how
+late it wakes up, i.e. how long any other request would have been frozen,
+while ``--concurrency`` synthetic pages are parsed at once.
+
+Usage:
+    python -m benchmarks.event_loop_lag [--listings 2000] [--concurrency 4]
+        [--workers 4] [--chunk-size 100] [--interval 0.005]
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import time
+
+from benchmarks.pages import synthetic_page
+from services.parse_pool import INLINE, PROCESS, THREAD, ParsePool
+
+
+async def probe_lag(interval, lags, stop):
+    while not stop.is_set():
+        start_time = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start_time - interval)
+
+
+def percentile(values, q):
+    # Nearest rank, so a single long stall still shows up
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+async def run(kind, html, args):
+    """
+    Parse ``args.concurrency`` copies of a page with one executor kind.
+
+    Returns:
+        dict: The wall time and the event-loop lag percentiles in ms.
+    """
+    pool = ParsePool(kind, args.workers, args.chunk_size)
+    await pool.start()
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.create_task(probe_lag(args.interval, lags, stop))
+    start_time = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            pool.extract_listings(html, args.backend)
+            for _ in range(args.concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - start_time
+    stop.set()
+    await probe
+    await pool.stop()
+    assert all(len(listings) == args.listings for listings in results)
+    return {
+        "seconds": elapsed,
+        "lag_p50": percentile(lags, 50) * 1000,
+        "lag_p99": percentile(lags, 99) * 1000,
+        "lag_max": max(lags, default=0) * 1000,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--listings", type=int, default=2000)
+    arg_parser.add_argument("--concurrency", type=int, default=4)
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    arg_parser.add_argument("--chunk-size", type=int, default=100)
+    arg_parser.add_argument("--interval", type=float, default=0.005)
+    arg_parser.add_argument("--backend", default="selectolax")
+    args = arg_parser.parse_args()
+
+    html = synthetic_page(args.listings)
+    print(
+        f"{args.concurrency} pages of {args.listings} listings, "
+        f"{args.workers} workers, {args.chunk_size} listings per chunk"
+    )
+    print(
+        f"  {'executor':<10} {'wall s':>8} "
+        f"{'lag p50':>9} {'lag p99':>9} {'lag max':>9}"
+    )
+    for kind in (INLINE, THREAD, PROCESS):
+        result = asyncio.run(run(kind, html, args))
+        print(
+            f"  {kind:<10} {result['seconds']:8.2f} "
+            f"{result['lag_p50']:7.1f}ms {result['lag_p99']:7.1f}ms "
+            f"{result['lag_max']:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
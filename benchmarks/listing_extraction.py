@@ -0,0 +1,163 @@
+"""
+Track the parse time per listing of each parser backend across releases.
+
+Every run measures the page parse and the per-card scan of each backend on
+recorded marketplace pages, prints the time per listing and compares it with
+the last run recorded in the history file. Pass ``--record`` to append the
+run to the history, labelled with ``--release`` (the git revision by
+default).
+
+Usage:
+    python -m benchmarks.listing_extraction [--pages "data/*.html"]
+        [--repeat 20] [--record] [--release v1.2.0]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import timeit
+
+from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from selectolax.parser import HTMLParser
+
+from benchmarks.pages import load_pages
+from services.parser_backends import (
+    PARSER_BACKENDS,
+    scan_listing_bs4,
+    scan_listing_lxml,
+    scan_listing_selectolax,
+)
+from utils.selectors import (
+    LISTING_CLASS,
+    LISTING_SELECTOR,
+    selector_registry,
+)
+
+HISTORY_PATH = os.path.join("benchmarks", "history", "listing_extraction.jsonl")
+
+
+def listing_nodes(html):
+    """
+    Parse a page with each backend and return its listing card nodes.
+
+    Returns:
+        dict: The listing nodes of each backend.
+    """
+    return {
+        "selectolax": HTMLParser(html).css(LISTING_SELECTOR),
+        "lxml": lxml_html.fromstring(html).xpath(
+            f'//div[@class="{LISTING_CLASS}"]'
+        ),
+        "bs4": BeautifulSoup(html, "html.parser").find_all(
+            "div", class_=LISTING_CLASS
+        ),
+    }
+
+
+SCANNERS = {
+    "selectolax": scan_listing_selectolax,
+    "lxml": scan_listing_lxml,
+    "bs4": scan_listing_bs4,
+}
+
+
+def best_time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def run(pages, repeat):
+    """
+    Measure the microseconds per listing of every backend.
+
+    Args:
+        pages (dict): Page HTML keyed by path.
+        repeat (int): Timing repetitions (the best one is kept).
+
+    Returns:
+        dict: ``{"<page>": {"<backend>.<stage>": us_per_listing}}`` with the
+        ``page`` stage (full extraction) and ``scan`` stage (card scans on a
+        parsed page).
+    """
+    selector_set = selector_registry.active
+    results = {}
+    for path, html in pages.items():
+        nodes = listing_nodes(html)
+        listings = len(nodes["selectolax"]) or 1
+        timings = {}
+        for name, backend in PARSER_BACKENDS.items():
+            page_time = best_time(lambda: backend(html), repeat)
+            scan = SCANNERS[name]
+            scan_time = best_time(
+                lambda: [scan(node, selector_set) for node in nodes[name]],
+                repeat,
+            )
+            timings[f"{name}.page"] = page_time * 1e6 / listings
+            timings[f"{name}.scan"] = scan_time * 1e6 / listings
+        results[path] = {"listings": listings, "us_per_listing": timings}
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--pages", default="data/*.html")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--history", default=HISTORY_PATH)
+    arg_parser.add_argument("--release", default=None)
+    arg_parser.add_argument("--record", action="store_true")
+    args = arg_parser.parse_args()
+
+    history = load_history(args.history)
+    previous = history[-1] if history else None
+    release = args.release or git_revision()
+    results = run(load_pages(args.pages), args.repeat)
+
+    for path, result in results.items():
+        print(f"\n{path}: {result['listings']} listings ({release})")
+        baseline = (
+            previous["pages"].get(path, {}).get("us_per_listing", {})
+            if previous
+            else {}
+        )
+        for key, value in result["us_per_listing"].items():
+            line = f"  {key:<18} {value:9.2f} us/listing"
+            if key in baseline:
+                change = (value - baseline[key]) / baseline[key]
+                line += f"  {change:+7.1%} vs {previous['release']}"
+            print(line)
+
+    if args.record:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        entry = {
+            "release": release,
+            "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "pages": results,
+        }
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"\nRecorded in {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Load test the crawler API end to end against the Marketplace stand-in.
+
+Sends ``--requests`` crawls of varied queries to ``GET /crawler/`` with
+``--concurrency`` in flight, streaming NDJSON, and reports the request
+latency and time to first listing percentiles, the listings per second and
+the peak resident memory of the API process and its children (browsers and
+parse workers). With ``--start`` the stand-in and the API are launched
+locally, the API pointed at the stand-in; otherwise ``--api`` is load
+tested as is (pass ``--api-pid`` to sample its memory). Pass ``--record``
+to append the run to the history, labelled with ``--release`` (the git
+revision by default), and compare later runs with it.
+
+Usage:
+    python -m benchmarks.load --start [--concurrency 4] [--requests 40]
+        [--strategy GRAPHQL] [--scroll] [--latency 0.2] [--jitter 0.1]
+        [--recordings recordings/] [--record] [--release v1.2.0]
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import psutil
+
+from benchmarks.event_loop_lag import percentile
+from benchmarks.listing_extraction import git_revision, load_history
+from utils.serialization import NDJSON_MEDIA_TYPE
+
+HISTORY_PATH = os.path.join("benchmarks", "history", "load.jsonl")
+
+QUERIES = (
+    "macbook",
+    "iphone",
+    "velo",
+    "canape",
+    "playstation",
+    "table basse",
+    "appareil photo",
+    "guitare",
+)
+
+
+def start_servers(args):
+    """
+    Launch the stand-in and the API, the API pointed at the stand-in.
+
+    Returns:
+        List[subprocess.Popen]: The stand-in and API processes.
+    """
+    standin_url = f"http://127.0.0.1:{args.standin_port}"
+    standin_command = [
+        sys.executable,
+        "-m",
+        "benchmarks.standin",
+        "--port",
+        str(args.standin_port),
+        "--latency",
+        str(args.latency),
+        "--jitter",
+        str(args.jitter),
+        "--listings",
+        str(args.listings),
+        "--pages",
+        str(args.pages),
+    ]
+    if args.recordings:
+        standin_command += ["--recordings", args.recordings]
+    env = dict(
+        os.environ,
+        MARKETPLACE_BASE_URL=standin_url,
+        email="load@standin.local",
+        password="standin",
+        # Every request must reach the browser
+        RESULT_CACHE_BACKEND="none",
+    )
+    api_command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "main:app",
+        "--port",
+        str(args.api_port),
+        "--log-level",
+        "warning",
+    ]
+    return [
+        subprocess.Popen(standin_command),
+        subprocess.Popen(api_command, env=env),
+    ]
+
+
+async def wait_until_up(urls, processes, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for url, process in zip(urls, processes):
+            while True:
+                try:
+                    await client.get(url)
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        raise RuntimeError(f"{url} exited on startup")
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"{url} did not start")
+                    await asyncio.sleep(0.2)
+
+
+async def sample_peak_rss(pid, peak, stop, interval=0.1):
+    """
+    Track the peak resident memory of a process and its children, in bytes.
+    """
+    process = psutil.Process(pid)
+    while not stop.is_set():
+        try:
+            processes = [process] + process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        rss = 0
+        for p in processes:
+            try:
+                rss += p.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        peak[0] = max(peak[0], rss)
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def crawl(client, args, query, results):
+    """
+    Stream one crawl and record its latency and number of listings.
+    """
+    params = {
+        "city": args.city,
+        "query": query,
+        "max_price": args.max_price,
+        "itemCondition": "used_like_new",
+        "strategy": args.strategy,
+        "scroll": str(args.scroll).lower(),
+        "max_listings": args.max_listings,
+    }
+    start_time = time.perf_counter()
+    first_listing, listings = None, 0
+    try:
+        async with client.stream(
+            "GET",
+            "/crawler/",
+            params=params,
+            headers={"Accept": NDJSON_MEDIA_TYPE},
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                if "error" in json.loads(line):
+                    raise httpx.HTTPError(json.loads(line)["error"])
+                if first_listing is None:
+                    first_listing = time.perf_counter() - start_time
+                listings += 1
+    except httpx.HTTPError as e:
+        results["errors"] += 1
+        print(f"  {query!r} failed: {e}")
+        return
+    results["latencies"].append(time.perf_counter() - start_time)
+    results["listings"] += listings
+    if first_listing is not None:
+        results["first_listing"].append(first_listing)
+
+
+async def run(args):
+    """
+    Run the load test.
+
+    Returns:
+        dict: The latency percentiles in seconds, listings per second, errors
+        and peak RSS in MB.
+    """
+    results = {"latencies": [], "first_listing": [], "listings": 0}
+    results["errors"] = 0
+    queries = itertools.cycle(QUERIES)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    peak, stop = [0], asyncio.Event()
+    sampler = None
+    if args.api_pid:
+        sampler = asyncio.create_task(
+            sample_peak_rss(args.api_pid, peak, stop)
+        )
+
+    async def limited(client, query):
+        async with semaphore:
+            await crawl(client, args, query, results)
+
+    async with httpx.AsyncClient(base_url=args.api, timeout=None) as client:
+        start_time = time.perf_counter()
+        await asyncio.gather(
+            *(limited(client, next(queries)) for _ in range(args.requests))
+        )
+        elapsed = time.perf_counter() - start_time
+    stop.set()
+    if sampler is not None:
+        await sampler
+
+    latencies, first_listing = results["latencies"], results["first_listing"]
+    return {
+        "seconds": elapsed,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "first_listing_p50": percentile(first_listing, 50),
+        "listings": results["listings"],
+        "listings_per_second": results["listings"] / elapsed,
+        "errors": results["errors"],
+        "peak_rss_mb": peak[0] / 2**20 if args.api_pid else None,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    arg_parser.add_argument("--api", default=None)
+    arg_parser.add_argument("--api-pid", type=int, default=None)
+    arg_parser.add_argument("--start", action="store_true")
+    arg_parser.add_argument("--api-port", type=int, default=8000)
+    arg_parser.add_argument("--standin-port", type=int, default=8100)
+    arg_parser.add_argument("--concurrency", type=int, default=4)
+    arg_parser.add_argument("--requests", type=int, default=40)
+    arg_parser.add_argument("--strategy", default="CSS")
+    arg_parser.add_argument("--scroll", action="store_true")
+    arg_parser.add_argument("--max-listings", type=int, default=100)
+    arg_parser.add_argument("--city", default="paris")
+    arg_parser.add_argument("--max-price", type=float, default=1000)
+    arg_parser.add_argument("--latency", type=float, default=0.0)
+    arg_parser.add_argument("--jitter", type=float, default=0.0)
+    arg_parser.add_argument("--listings", type=int, default=24)
+    arg_parser.add_argument("--pages", type=int, default=5)
+    arg_parser.add_argument("--recordings", default=None)
+    arg_parser.add_argument("--history", default=HISTORY_PATH)
+    arg_parser.add_argument("--release", default=None)
+    arg_parser.add_argument("--record", action="store_true")
+    args = arg_parser.parse_args()
+    args.api = args.api or f"http://127.0.0.1:{args.api_port}"
+
+    processes = []
+    try:
+        if args.start:
+            processes = start_servers(args)
+            args.api_pid = processes[1].pid
+            asyncio.run(
+                wait_until_up(
+                    [f"http://127.0.0.1:{args.standin_port}/", args.api + "/"],
+                    processes,
+                )
+            )
+        result = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    history = load_history(args.history)
+    previous = history[-1] if history else None
+    release = args.release or git_revision()
+    print(
+        f"{args.requests} {args.strategy} crawls, {args.concurrency} "
+        f"concurrent, scroll={args.scroll} ({release})"
+    )
+    for key, unit in (
+        ("latency_p50", "s"),
+        ("latency_p95", "s"),
+        ("latency_p99", "s"),
+        ("first_listing_p50", "s"),
+        ("listings_per_second", "/s"),
+        ("peak_rss_mb", "MB"),
+        ("errors", ""),
+    ):
+        value = result[key]
+        if value is None:
+            continue
+        line = f"  {key:<20} {value:10.2f} {unit}"
+        baseline = previous["result"].get(key) if previous else None
+        if baseline:
+            change = (value - baseline) / baseline
+            line += f"  {change:+7.1%} vs {previous['release']}"
+        print(line)
+
+    if args.record:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        entry = {
+            "release": release,
+            "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "args": {
+                key: getattr(args, key)
+                for key in (
+                    "concurrency",
+                    "requests",
+                    "strategy",
+                    "scroll",
+                    "latency",
+                    "jitter",
+                    "recordings",
+                )
+            },
+            "result": result,
+        }
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"\nRecorded in {args.history}")
+
+
+if __name__ == "__main__":
+    main()
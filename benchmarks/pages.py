@@ -0,0 +1,54 @@
+import glob
+
+from utils.selectors import LISTING_CLASS
+
+LISTING_TEMPLATE = (
+    '<div class="{listing_class}">'
+    '<div class="x1n2onr6"><a href="/marketplace/item/{item}/?ref=search">'
+    '<div class="x1n2onr6"><img src="https://example.com/{item}.jpg"/></div>'
+    '<div class="x1gslohp"><span class="x193iq5w xeuugli">€{price}</span></div>'
+    '<div class="x1iorvi4"><span class="x1lliihq x6ikm8r x10wlt62 x1n2onr6">'
+    "Macbook Pro {item}</span></div>"
+    '<div class="x1iorvi4"><span class="x1nxh6w3 x1sibtaa">Paris, France</span></div>'
+    "</a></div></div>"
+)
+
+
+def synthetic_page(listings_count):
+    """
+    Build a marketplace-like results page with synthetic listing cards.
+
+    Args:
+        listings_count (int): Number of listing cards.
+
+    Returns:
+        str: The page HTML.
+    """
+    cards = "".join(
+        LISTING_TEMPLATE.format(
+            listing_class=LISTING_CLASS, item=1000 + i, price=100 + i
+        )
+        for i in range(listings_count)
+    )
+    return f"<html><head></head><body><div>{cards}</div></body></html>"
+
+
+def load_pages(pattern, synthetic_listings=200):
+    """
+    Load recorded marketplace pages, or a synthetic page if none match.
+
+    Args:
+        pattern (str): Glob pattern of recorded HTML pages.
+        synthetic_listings (int, optional): Listing cards of the synthetic
+            fallback page.
+
+    Returns:
+        dict: Page HTML keyed by file path (or "synthetic").
+    """
+    pages = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            pages[path] = f.read()
+    if not pages:
+        pages["synthetic"] = synthetic_page(synthetic_listings)
+    return pages
@@ -0,0 +1,56 @@
+"""
+Compare the HTML parsing backends on recorded marketplace pages.
+
+Usage:
+    python -m benchmarks.parser_backends [--pages "data/*.html"] [--repeat 5]
+"""
+
+import argparse
+import timeit
+
+from bs4 import BeautifulSoup
+
+from benchmarks.pages import load_pages
+from services.parser_backends import PARSER_BACKENDS, extract_listings_bs4
+from utils.selectors import LISTING_CLASS
+
+FIELDS = ("href", "title", "price", "location", "item_number", "empty")
+
+
+def extract_listings_legacy(html, include_html=False):
+    # Original path: html.parser, then prettify and re-parse every post
+    soup = BeautifulSoup(html, "html.parser")
+    listings = []
+    for node in soup.find_all("div", class_=LISTING_CLASS):
+        listings.extend(extract_listings_bs4(node.prettify()))
+    return listings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--pages", default="data/*.html")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    backends = {"legacy (bs4 + prettify)": extract_listings_legacy}
+    backends.update(PARSER_BACKENDS)
+
+    for path, html in load_pages(args.pages).items():
+        reference = [
+            tuple(listing[f] for f in FIELDS)
+            for listing in PARSER_BACKENDS["bs4"](html)
+        ]
+        print(f"\n{path}: {len(reference)} listings")
+        for name, backend in backends.items():
+            seconds = min(
+                timeit.repeat(lambda: backend(html), number=1, repeat=args.repeat)
+            )
+            records = [
+                tuple(listing[f] for f in FIELDS) for listing in backend(html)
+            ]
+            same = "same records" if records == reference else "DIFFERENT records"
+            print(f"  {name:<24} {seconds * 1000:9.2f} ms  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the vectorised price parser with the original row-by-row one.
+
+Usage:
+    python -m benchmarks.prices [--rows 1000000] [--repeat 3]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from services.prices import parse_prices
+
+PRICE_FORMATS = (
+    "€{0:,}",
+    "${0:,}",
+    "{2} €",
+    "€{0:,}€{1:,}",
+    "Gratuit",
+    "Free",
+    "${0:,}.50",
+)
+
+
+def synthetic_prices(rows, seed=0):
+    """
+    Generate marketplace-like price strings.
+
+    Args:
+        rows (int): Number of prices.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        Series: The price strings.
+    """
+    rng = np.random.default_rng(seed)
+    amounts = rng.integers(1, 50_000, size=rows)
+    formats = rng.integers(0, len(PRICE_FORMATS), size=rows)
+    return pd.Series(
+        [
+            PRICE_FORMATS[f].format(a, a + a // 4, f"{a:,}".replace(",", " "))
+            for f, a in zip(formats, amounts)
+        ]
+    )
+
+
+def parse_prices_legacy(prices):
+    # Original features_engineering: apply() per row, then a second regex pass
+    def clean_price(price):
+        if "Gratuit" in price:
+            return 0
+        clean_price = (
+            price.replace("€", "")
+            .replace("$", "")
+            .replace(" ", "")
+            .replace(",", "")
+        )
+        return pd.to_numeric(clean_price, errors="coerce")
+
+    df = pd.DataFrame({"cleaned_price": prices.apply(clean_price)})
+    parts = prices.str.extract(r"[$€]\s*([\d,]+)\s*[$€]?\s*([\d,]*)")
+    df["price_before"] = pd.to_numeric(
+        parts[1].str.replace(",", ""), errors="coerce"
+    )
+    df["price_after"] = pd.to_numeric(
+        parts[0].str.replace(",", ""), errors="coerce"
+    )
+    df["price_difference"] = df["price_before"] - df["price_after"]
+    return df
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, default=1_000_000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    prices = synthetic_prices(args.rows)
+    print(f"{args.rows} synthetic prices")
+    for name, parser in (
+        ("legacy (apply)", parse_prices_legacy),
+        ("vectorised", parse_prices),
+    ):
+        seconds = min(
+            timeit.repeat(lambda: parser(prices), number=1, repeat=args.repeat)
+        )
+        parsed = parser(prices)["cleaned_price"].notna().mean()
+        print(f"  {name:<16} {seconds:8.2f} s  {parsed:6.1%} parsed")
+
+
+if __name__ == "__main__":
+    main()
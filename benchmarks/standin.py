@@ -0,0 +1,249 @@
+"""
+A local stand-in for Facebook Marketplace, to benchmark the crawler end to
+end without hitting the live site.
+
+It serves the login flow the crawler drives (cookie banner, email and
+password form, session cookies), results pages whose listing cards and
+embedded JSON follow the live markup, and ``/api/graphql/`` responses
+loaded as the page is scrolled. Pages and payloads replay a recording
+directory (see ``utils/recording.py``) when given, and are synthesised from
+the query otherwise. Every response is delayed by ``--latency`` seconds,
+plus or minus ``--jitter``.
+
+Point the API at it with ``MARKETPLACE_BASE_URL``:
+
+    python -m benchmarks.standin --port 8100 [--latency 0.2] [--jitter 0.1]
+        [--recordings recordings/] [--listings 24] [--pages 5]
+    MARKETPLACE_BASE_URL=http://127.0.0.1:8100 uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import html
+import itertools
+import json
+import random
+import urllib.parse
+import zlib
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+
+from benchmarks.pages import LISTING_TEMPLATE
+from services.marketplace_graphql import LISTING_TITLE_KEY
+from utils.recording import PAGE, PAYLOAD, load_recordings
+from utils.selectors import LISTING_CLASS
+
+SESSION_COOKIES = ("c_user", "xs")
+
+LOGIN_PAGE = """<html><head><title>Log in</title></head><body>
+<div id="cookies" role="dialog">
+<button onclick="this.parentElement.remove()">Allow all cookies</button>
+</div>
+<form method="post" action="/login">
+<input type="text" name="email"/>
+<input type="password" name="pass"/>
+<button type="submit" name="login">Log in</button>
+</form>
+</body></html>"""
+
+# Loads the next results through the GraphQL endpoint when the page is
+# scrolled to the bottom, like the live site
+SCROLL_JS = """
+let cursor = 1, loading = false;
+window.addEventListener("scroll", async () => {
+  const bottom = window.innerHeight + window.scrollY
+    >= document.body.scrollHeight - 10;
+  if (!bottom || loading || cursor === null) return;
+  loading = true;
+  const body = new URLSearchParams({cursor: cursor, query: QUERY});
+  const response = await fetch("/api/graphql/", {method: "POST", body: body});
+  try {
+    const payload = await response.json();
+    document.getElementById("feed")
+      .insertAdjacentHTML("beforeend", payload.extensions.cards_html);
+    const pageInfo = payload.data.marketplace_search.feed_units.page_info;
+    cursor = pageInfo.has_next_page ? Number(pageInfo.end_cursor) : null;
+  } catch (e) {
+    // Recorded payloads hold no synthetic cards
+    cursor += 1;
+  }
+  loading = false;
+});
+"""
+
+
+def listing_node(query, index):
+    """
+    Build the GraphQL node of the ``index``-th synthetic listing of a query.
+    """
+    item_number = f"{zlib.crc32(query.encode()) % 10**9}{index:06d}"
+    price = 100 + index * 37 % 900
+    return {
+        "__typename": "GroupCommerceProductItem",
+        "id": item_number,
+        LISTING_TITLE_KEY: f"{query.title()} {index}",
+        "custom_title": None,
+        "listing_price": {
+            "formatted_amount": f"€{price}",
+            "amount": f"{price}.00",
+        },
+        "strikethrough_price": None,
+        "location": {"reverse_geocode": {"city": "Paris", "state": "IDF"}},
+        "is_sold": False,
+    }
+
+
+def listing_card(node):
+    card = LISTING_TEMPLATE.format(
+        listing_class=LISTING_CLASS,
+        item=node["id"],
+        price=node["listing_price"]["amount"].split(".")[0],
+    )
+    # The template title is swapped for the listing title
+    return card.replace(
+        f"Macbook Pro {node['id']}", html.escape(node[LISTING_TITLE_KEY])
+    )
+
+
+def feed_payload(nodes, cursor, has_next_page):
+    """
+    Build a search feed response holding ``nodes``.
+    """
+    return {
+        "data": {
+            "marketplace_search": {
+                "feed_units": {
+                    "edges": [
+                        {"node": {"listing": node}, "cursor": node["id"]}
+                        for node in nodes
+                    ],
+                    "page_info": {
+                        "end_cursor": str(cursor),
+                        "has_next_page": has_next_page,
+                    },
+                }
+            }
+        },
+        "extensions": {
+            "is_final": True,
+            "cards_html": "".join(listing_card(node) for node in nodes),
+        },
+    }
+
+
+def results_page(query, cards_html, embedded_payloads):
+    scripts = "".join(
+        f'<script type="application/json">{payload}</script>'
+        for payload in embedded_payloads
+    )
+    return (
+        "<html><head><title>Marketplace</title></head><body>"
+        f'<div id="feed">{cards_html}</div>{scripts}'
+        f"<script>const QUERY = {json.dumps(query)};{SCROLL_JS}</script>"
+        "</body></html>"
+    )
+
+
+def create_app(latency=0.0, jitter=0.0, recordings=None, listings=24, pages=5):
+    """
+    Create the stand-in application.
+
+    Args:
+        latency (float, optional): Mean delay of every response in seconds.
+        jitter (float, optional): Maximum deviation from ``latency``.
+        recordings (str, optional): A recording directory to replay.
+            Synthetic pages are served when it is empty or not given.
+        listings (int, optional): Listings per synthetic page or response.
+        pages (int, optional): Synthetic results pages per query, the first
+            one included.
+
+    Returns:
+        FastAPI: The application.
+    """
+    app = FastAPI(title="Marketplace stand-in")
+    entries = load_recordings(recordings) if recordings else []
+    recorded_pages = [e["body"] for e in entries if e["kind"] == PAGE]
+    recorded_payloads = [e["body"] for e in entries if e["kind"] == PAYLOAD]
+    # Each results page replays the next recorded page and payloads
+    next_page = itertools.cycle(recorded_pages) if recorded_pages else None
+    next_payload = (
+        itertools.cycle(recorded_payloads) if recorded_payloads else None
+    )
+
+    @app.middleware("http")
+    async def add_latency(request: Request, call_next):
+        delay = random.uniform(latency - jitter, latency + jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await call_next(request)
+
+    @app.get("/")
+    async def home():
+        return HTMLResponse("<html><body>Home</body></html>")
+
+    @app.get("/login")
+    async def login_page():
+        return HTMLResponse(LOGIN_PAGE)
+
+    @app.post("/login")
+    async def login(request: Request):
+        form = urllib.parse.parse_qs((await request.body()).decode())
+        email = form.get("email", [""])[0] or "standin"
+        response = RedirectResponse("/", status_code=303)
+        response.set_cookie("c_user", str(zlib.crc32(email.encode())))
+        response.set_cookie("xs", "standin-session")
+        return response
+
+    @app.get("/marketplace/{city}/search/")
+    async def search(request: Request, city: str, query: str = ""):
+        if not all(request.cookies.get(name) for name in SESSION_COOKIES):
+            return RedirectResponse(f"/login?next={request.url.path}")
+        if next_page is not None:
+            return HTMLResponse(next(next_page))
+        nodes = [listing_node(query, i) for i in range(listings)]
+        payload = json.dumps(feed_payload(nodes, 1, pages > 1))
+        cards_html = "".join(listing_card(node) for node in nodes)
+        return HTMLResponse(results_page(query, cards_html, [payload]))
+
+    @app.post("/api/graphql/")
+    async def graphql(request: Request):
+        if next_payload is not None:
+            return Response(next(next_payload), media_type="application/json")
+        form = urllib.parse.parse_qs((await request.body()).decode())
+        cursor = int(form.get("cursor", ["1"])[0])
+        query = form.get("query", [""])[0]
+        start = cursor * listings
+        nodes = [
+            listing_node(query, i) for i in range(start, start + listings)
+        ]
+        return Response(
+            json.dumps(feed_payload(nodes, cursor + 1, cursor + 1 < pages)),
+            media_type="application/json",
+        )
+
+    return app
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8100)
+    arg_parser.add_argument("--latency", type=float, default=0.0)
+    arg_parser.add_argument("--jitter", type=float, default=0.0)
+    arg_parser.add_argument("--recordings", default=None)
+    arg_parser.add_argument("--listings", type=int, default=24)
+    arg_parser.add_argument("--pages", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    app = create_app(
+        args.latency, args.jitter, args.recordings, args.listings, args.pages
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Tuple
 import os
 from dotenv import load_dotenv
 
@@ -18,5 +18,190 @@ class Settings:
     FACEBOOK_PASSWORD: str = os.getenv("password")
     HOST: str = os.getenv("HOST", "0.0.0.0")
 
+    # Marketplace site, e.g. a local stand-in server for benchmarks
+    MARKETPLACE_BASE_URL: str = os.getenv(
+        "MARKETPLACE_BASE_URL", "https://www.facebook.com"
+    ).rstrip("/")
+    # Directory where live sessions are recorded (HAR, HTML, JSON), empty to
+    # disable recording
+    RECORDING_DIR: str = os.getenv("RECORDING_DIR", "")
+
+    # Browser pool
+    BROWSER_POOL_SIZE: int = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+    BROWSER_POOL_CONTEXTS_PER_BROWSER: int = int(
+        os.getenv("BROWSER_POOL_CONTEXTS_PER_BROWSER", "4")
+    )
+    BROWSER_POOL_MAX_QUEUE: int = int(os.getenv("BROWSER_POOL_MAX_QUEUE", "32"))
+    BROWSER_POOL_MAX_USES: int = int(os.getenv("BROWSER_POOL_MAX_USES", "50"))
+    BROWSER_POOL_ACQUIRE_TIMEOUT: float = float(
+        os.getenv("BROWSER_POOL_ACQUIRE_TIMEOUT", "60")
+    )
+    BROWSER_POOL_HEADLESS: bool = (
+        os.getenv("BROWSER_POOL_HEADLESS", "true").lower() == "true"
+    )
+
+    # Authenticated session cache
+    SESSION_CACHE_DIR: str = os.getenv("SESSION_CACHE_DIR", "data/sessions")
+    SESSION_CACHE_TTL: float = float(os.getenv("SESSION_CACHE_TTL", "86400"))
+
+    # Account pool: a JSON file listing the accounts (empty for the single
+    # email/password account), the crawls run at once and the marketplace
+    # navigations allowed per window on each account, and the cooldown of an
+    # account sent to a checkpoint
+    FACEBOOK_ACCOUNTS_FILE: str = os.getenv("FACEBOOK_ACCOUNTS_FILE", "")
+    ACCOUNT_MAX_CONCURRENCY: int = int(os.getenv("ACCOUNT_MAX_CONCURRENCY", "4"))
+    ACCOUNT_REQUEST_BUDGET: int = int(os.getenv("ACCOUNT_REQUEST_BUDGET", "200"))
+    ACCOUNT_BUDGET_WINDOW: float = float(
+        os.getenv("ACCOUNT_BUDGET_WINDOW", "3600")
+    )
+    ACCOUNT_COOLDOWN: float = float(os.getenv("ACCOUNT_COOLDOWN", "1800"))
+    ACCOUNT_ACQUIRE_TIMEOUT: float = float(
+        os.getenv("ACCOUNT_ACQUIRE_TIMEOUT", "60")
+    )
+
+    # Marketplace scrolling
+    LISTING_WAIT_TIMEOUT: float = float(os.getenv("LISTING_WAIT_TIMEOUT", "15"))
+    SCROLL_MAX_LISTINGS: int = int(os.getenv("SCROLL_MAX_LISTINGS", "200"))
+    SCROLL_TIME_BUDGET: float = float(os.getenv("SCROLL_TIME_BUDGET", "30"))
+    SCROLL_IDLE_TIMEOUT: float = float(os.getenv("SCROLL_IDLE_TIMEOUT", "5"))
+
+    # HTML parsing backend: selectolax, lxml or bs4
+    PARSER_BACKEND: str = os.getenv("PARSER_BACKEND", "selectolax")
+
+    # Parsing off the event loop: process, thread or inline executor,
+    # warm workers (default: CPU count) and listing cards per chunk
+    PARSE_EXECUTOR: str = os.getenv("PARSE_EXECUTOR", "process")
+    PARSE_WORKERS: int = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count()
+    PARSE_CHUNK_SIZE: int = int(os.getenv("PARSE_CHUNK_SIZE", "100"))
+
+    # LLM extraction
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_REQUESTS_PER_SECOND: float = float(
+        os.getenv("LLM_REQUESTS_PER_SECOND", "5")
+    )
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+    LLM_HTTP_MAX_CONNECTIONS: int = int(
+        os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")
+    )
+    # Listing HTML sent to the model: html, text or none
+    LLM_HTML_COMPACTION: str = os.getenv("LLM_HTML_COMPACTION", "html")
+    LLM_BATCH_TOKEN_BUDGET: int = int(
+        os.getenv("LLM_BATCH_TOKEN_BUDGET", "6000")
+    )
+    LLM_BATCH_MAX_SIZE: int = int(os.getenv("LLM_BATCH_MAX_SIZE", "20"))
+    # Chains built at startup, e.g. "OpenAI:gpt-4,Ollama:llama3"
+    LLM_WARMUP_MODELS: List[Tuple[str, str]] = [
+        tuple(model.split(":", 1))
+        for model in os.getenv("LLM_WARMUP_MODELS", "").split(",")
+        if ":" in model
+    ]
+
+    # LLM result cache
+    LLM_CACHE_ENABLED: bool = (
+        os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    )
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite")
+    LLM_CACHE_MEMORY_ENTRIES: int = int(
+        os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024")
+    )
+    LLM_CACHE_DISK_ENTRIES: int = int(
+        os.getenv("LLM_CACHE_DISK_ENTRIES", "100000")
+    )
+    LLM_CACHE_TTL: float = float(os.getenv("LLM_CACHE_TTL", "604800"))
+    LLM_CACHE_EVICT_INTERVAL: float = float(
+        os.getenv("LLM_CACHE_EVICT_INTERVAL", "60")
+    )
+
+    # Crawl jobs
+    JOB_MAX_QUEUE: int = int(os.getenv("JOB_MAX_QUEUE", "100"))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_TIMEOUT: float = float(os.getenv("JOB_TIMEOUT", "600"))
+    JOB_RETENTION_TTL: float = float(os.getenv("JOB_RETENTION_TTL", "3600"))
+    # Job queue shared by the API and the crawl workers ("memory" or "redis")
+    JOB_QUEUE_BACKEND: str = os.getenv("JOB_QUEUE_BACKEND", "memory")
+    JOB_QUEUE_URL: str = os.getenv("JOB_QUEUE_URL", "redis://localhost:6379/1")
+    # Whether the API process runs a crawl worker; without it the API only
+    # queues crawls for `python -m services.worker` nodes
+    JOB_EMBEDDED_WORKER: bool = (
+        os.getenv("JOB_EMBEDDED_WORKER", "true").lower() == "true"
+    )
+    # A crawl whose worker misses heartbeats for this long is delivered again
+    JOB_VISIBILITY_TIMEOUT: float = float(
+        os.getenv("JOB_VISIBILITY_TIMEOUT", "60")
+    )
+    JOB_HEARTBEAT_INTERVAL: float = float(
+        os.getenv("JOB_HEARTBEAT_INTERVAL", "10")
+    )
+    JOB_MAX_DELIVERIES: int = int(os.getenv("JOB_MAX_DELIVERIES", "3"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "0.2"))
+
+    # Parquet datasets root directory
+    STORAGE_DIR: str = os.getenv("STORAGE_DIR", "data")
+
+    # Incremental crawls
+    LISTING_INDEX_PATH: str = os.getenv(
+        "LISTING_INDEX_PATH", "data/listing_index.sqlite"
+    )
+    LISTING_INDEX_REMOVAL_AFTER: int = int(
+        os.getenv("LISTING_INDEX_REMOVAL_AFTER", "2")
+    )
+
+    # Selector registry
+    SELECTOR_CACHE_PATH: str = os.getenv(
+        "SELECTOR_CACHE_PATH", "data/selectors.json"
+    )
+    SELECTOR_SET_VERSION: str = os.getenv("SELECTOR_SET_VERSION", "")
+    SELECTOR_MIN_HIT_RATE: float = float(
+        os.getenv("SELECTOR_MIN_HIT_RATE", "0.8")
+    )
+    SELECTOR_MIN_ACCURACY: float = float(
+        os.getenv("SELECTOR_MIN_ACCURACY", "0.8")
+    )
+    SELECTOR_LEARN_SAMPLES: int = int(os.getenv("SELECTOR_LEARN_SAMPLES", "5"))
+
+    # Request-level result cache ("memory", "redis" or "none")
+    RESULT_CACHE_BACKEND: str = os.getenv("RESULT_CACHE_BACKEND", "memory")
+    RESULT_CACHE_URL: str = os.getenv(
+        "RESULT_CACHE_URL", "redis://localhost:6379/0"
+    )
+    RESULT_CACHE_FRESH_TTL: float = float(
+        os.getenv("RESULT_CACHE_FRESH_TTL", "300")
+    )
+    RESULT_CACHE_STALE_TTL: float = float(
+        os.getenv("RESULT_CACHE_STALE_TTL", "900")
+    )
+    RESULT_CACHE_MAX_ENTRIES: int = int(
+        os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")
+    )
+
+    # Request routing: URL regular expressions separated by whitespace
+    ROUTING_ENABLED: bool = os.getenv("ROUTING_ENABLED", "true").lower() == "true"
+    ROUTING_ALLOW_PATTERNS: List[str] = os.getenv(
+        "ROUTING_ALLOW_PATTERNS", ""
+    ).split()
+    ROUTING_DENY_PATTERNS: List[str] = os.getenv(
+        "ROUTING_DENY_PATTERNS", ""
+    ).split()
+    ROUTING_STATIC_CACHE_ENABLED: bool = (
+        os.getenv("ROUTING_STATIC_CACHE_ENABLED", "true").lower() == "true"
+    )
+    ROUTING_STATIC_CACHE_DIR: str = os.getenv(
+        "ROUTING_STATIC_CACHE_DIR", "data/static_cache"
+    )
+
+    # Tracing: OTLP/HTTP collector receiving the stage spans, e.g.
+    # http://localhost:4318 (disabled when empty)
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = os.getenv(
+        "OTEL_EXPORTER_OTLP_ENDPOINT", ""
+    )
+    OTEL_SERVICE_NAME: str = os.getenv("OTEL_SERVICE_NAME", "webdata_collector")
+
+    # Batch crawls
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+    BATCH_HOST_MIN_INTERVAL: float = float(
+        os.getenv("BATCH_HOST_MIN_INTERVAL", "1.0")
+    )
+
 
 settings = Settings()
@@ -1,4 +1,5 @@
 import logging
+import time
 from io import StringIO
 
 import pandas as pd
@@ -13,6 +14,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+API_URL = "http://127.0.0.1:8000"
+REQUEST_TIMEOUT = 10  # seconds per HTTP call
+JOB_TIMEOUT = 600  # seconds to wait for a crawl job
+POLL_INTERVAL = 2  # seconds between job status checks
+
+
 def fetch_data(
     city,
     query,
@@ -23,21 +30,44 @@ def fetch_data(
     llm_choice,
     model_name,
 ):
-    url = (
-        f"http://127.0.0.1:8000/crawler/?"
-        f"city={city}&query={query}&max_price={max_price}&itemCondition={item_condition}&headless={headless}&strategy={strategy}&llm_choice={llm_choice}&model_name={model_name}"
-    )
-    logger.info(f"Request URL: {url}")
-    response = requests.get(url)
-
-    logger.info(f"Response Code: {response.status_code}")
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        logger.error(
-            f"Request failed with status code: {response.status_code}"
+    params = {
+        "city": city,
+        "query": query,
+        "max_price": max_price,
+        "itemCondition": item_condition,
+        "headless": headless,
+        "strategy": strategy,
+        "llm_choice": llm_choice,
+        "model_name": model_name,
+    }
+    logger.info(f"Submitting crawl job: {params}")
+    try:
+        response = requests.post(
+            f"{API_URL}/jobs", json=params, timeout=REQUEST_TIMEOUT
         )
+        response.raise_for_status()
+        job_id = response.json()["id"]
+
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            response = requests.get(
+                f"{API_URL}/jobs/{job_id}", timeout=REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            job = response.json()
+            if job["status"] == "done":
+                return job["result"]
+            if job["status"] in ("failed", "cancelled"):
+                logger.error(f"Job {job_id} {job['status']}: {job['error']}")
+                return None
+            time.sleep(POLL_INTERVAL)
+
+        logger.error(f"Job {job_id} did not finish in {JOB_TIMEOUT} seconds")
+        requests.delete(f"{API_URL}/jobs/{job_id}", timeout=REQUEST_TIMEOUT)
+        return None
+
+    except requests.RequestException as e:
+        logger.error(f"Request failed: {e}")
         return None
 
 
@@ -58,7 +88,7 @@ def choose_strategy(strategy):
                 else ["llama2", "llama3"]
             ),
         )
-    elif strategy == "CSS":
+    elif strategy in ("CSS", "GRAPHQL"):
         llm_choice, model_name = None, None
     return strategy, llm_choice, model_name
 
@@ -82,7 +112,9 @@ selected_condition = st.sidebar.selectbox(
 # Create an expander for the sidebar menu
 with st.sidebar.expander("Parameters", expanded=True):
     headless = st.selectbox("Headless Browser", [True, False], index=0)
-    choice = st.selectbox("Choose between CSS or LLM", ("CSS", "LLM"))
+    choice = st.selectbox(
+        "Choose between CSS, LLM or GraphQL", ("CSS", "LLM", "GRAPHQL")
+    )
     # You would need to define your choose_strategy function
     strategy, llm_choice, model_name = choose_strategy(choice)
 
@@ -90,16 +122,17 @@ submit = st.sidebar.button("Submit")
 
 if submit:
     logger.info("Form Submitted")
-    response_json = fetch_data(
-        city,
-        query,
-        max_price,
-        selected_condition,
-        headless,
-        strategy,
-        llm_choice,
-        model_name,
-    )
+    with st.spinner("Crawling the marketplace..."):
+        response_json = fetch_data(
+            city,
+            query,
+            max_price,
+            selected_condition,
+            headless,
+            strategy,
+            llm_choice,
+            model_name,
+        )
 
     if response_json:
         data = response_json.get("data")
@@ -1,15 +1,58 @@
 import os
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
 import uvicorn
 
 from api.endpoints import router as api_router
 from core.config import settings
 from core.logging import setup_logging
+from services.jobs import job_manager
+from services.llm import close_llm_chains, warm_llm_chains
+from services.parse_pool import parse_pool
+from services.result_cache import result_cache
+from services.worker import crawl_worker
+from utils.browser_pool import browser_pool
+from utils.metrics import setup_tracing, shutdown_tracing
 
 logger = setup_logging()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_tracing()
+    if not settings.JOB_EMBEDDED_WORKER:
+        # Crawls run on the worker nodes, the API only queues them
+        if settings.JOB_QUEUE_BACKEND.lower() == "memory":
+            raise ValueError(
+                "JOB_EMBEDDED_WORKER=false needs a shared job queue: "
+                "set JOB_QUEUE_BACKEND=redis"
+            )
+        yield
+        await result_cache.close()
+        await job_manager.stop()
+        shutdown_tracing()
+        return
+
+    await parse_pool.start()
+    await browser_pool.start()
+    warm_llm_chains()
+    await crawl_worker.start()
+    yield
+    await crawl_worker.stop()
+    await browser_pool.stop()
+    await close_llm_chains()
+    await result_cache.close()
+    await job_manager.stop()
+    await parse_pool.stop()
+    shutdown_tracing()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,6 +64,17 @@ app.add_middleware(
 
 app.include_router(api_router)
 
+
+@app.exception_handler(ValidationError)
+async def validation_error_handler(request: Request, exc: ValidationError):
+    # Query parameter models are built by their dependency, so their model
+    # validators fail outside of the request validation
+    return JSONResponse(
+        status_code=422,
+        content={"detail": jsonable_encoder(exc.errors(include_url=False))},
+    )
+
+
 if __name__ == "__main__":
     logger.info("Starting server...")
     uvicorn.run(app, host=os.environ.get("HOST"), port=os.environ.get("PORT"))
@@ -1,48 +1,272 @@
+import asyncio
+import itertools
 import time
+from contextlib import AsyncExitStack, asynccontextmanager
 
+import pandas as pd
 from fastapi import HTTPException
 from playwright.async_api import TimeoutError, async_playwright
 
+from core.config import settings
 from core.logging import logger, setup_logging
-from services.parser import parse_facebook_marketplace_listings
+from services.jobs import job_manager
+from services.parser import (
+    parse_facebook_marketplace_listings,
+    parse_marketplace_payload_listings,
+)
+from services.result_cache import (
+    MISS,
+    CacheStatus,
+    result_cache,
+    result_cache_key,
+)
+from utils.account_pool import AccountBlocked, AccountPoolExhausted, account_pool
 from utils.browser import (
-    login_facebook,
+    FacebookSession,
+    capture_marketplace_listings,
     save_html,
-    scrape_marketplace,
     setup_browser_context,
 )
-from utils.misc import QueryParams, cities, setup_urls_facebook_marketplace
+from utils.browser_pool import BrowserPoolExhausted, browser_pool
+from utils.metrics import span
+from utils.misc import (
+    URL_LOGIN,
+    BatchQueryParams,
+    QueryParams,
+    cities,
+    setup_urls_facebook_marketplace,
+)
+from utils.rate_limit import HostRateLimiter
+from utils.serialization import (
+    ARROW_STREAM_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    arrow_ipc_to_dataframe,
+    dataframe_to_arrow_ipc,
+    to_ndjson_line,
+)
+from utils.session_cache import session_cache
 
 logger = setup_logging()
 
 
-async def handle_crawler_request(params: QueryParams):
+async def handle_crawler_request(
+    params: QueryParams, media_type=JSON_MEDIA_TYPE, headers=None
+):
     logger.info("START")
     start_time = time.time()
 
     try:
         logger.info("Running the crawler")
-        df_crawler = await run_facebook_marketplace_crawler_and_parser(
-            city_param=params.city,
-            query_param=params.query,
-            max_price_param=params.max_price,
-            item_condition_param=params.itemCondition,
-            headless_param=params.headless,
-            strategy_param=params.strategy,
-            llm_choice_param=params.llm_choice,
-            model_name_param=params.model_name,
-        )
+        with span("request", city=params.city, query=params.query):
+            df_crawler, cache_status = await cached_crawl(params)
+        if headers is not None:
+            headers.update(result_cache.headers(cache_status))
 
         logger.info("END")
+        if media_type == ARROW_STREAM_MEDIA_TYPE:
+            return process_crawler_response_arrow(df_crawler)
         return process_crawler_response(df_crawler, start_time)
 
+    except BrowserPoolExhausted as e:
+        logger.error(f"Browser pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except AccountPoolExhausted as e:
+        logger.error(f"Account pool exhausted: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error occurred: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def cached_crawl(params: QueryParams, on_record=None, crawl=None):
+    """
+    Get the listings of a set of query parameters from the result cache, or
+    crawl them, sharing the crawl with identical in-flight requests.
+
+    Incremental crawls depend on the listing index and are never cached.
+
+    Args:
+        params (QueryParams): The query parameters.
+        on_record (Callable, optional): Called with each listing record, as
+            soon as it is extracted or replayed from the cached result.
+        crawl (Callable, optional): Coroutine function crawling on a miss,
+            with the parameters and ``on_record``. Defaults to ``run_crawl``.
+
+    Returns:
+        Tuple[DataFrame, CacheStatus]: The parsed listings and how they were
+        served.
+    """
+    crawl = crawl or run_crawl
+    if params.incremental or result_cache.backend is None:
+        return await crawl(params, on_record), CacheStatus(MISS)
+
+    async def crawl_to_arrow(on_record=None):
+        df = await crawl(params, on_record)
+        if df is None or df.empty:
+            return None
+        return dataframe_to_arrow_ipc(df)
+
+    data, cache_status = await result_cache.get_or_produce(
+        result_cache_key(params),
+        lambda: crawl_to_arrow(on_record),
+        revalidate=crawl_to_arrow,
+    )
+    df = arrow_ipc_to_dataframe(data) if data is not None else None
+    if on_record is not None and df is not None and cache_status.state != MISS:
+        for record in df.to_dict(orient="records"):
+            on_record(record)
+    logger.info(f"Crawl served from result cache: {cache_status.state}")
+    return df, cache_status
+
+
+async def crawl_query_params(params: QueryParams, on_record=None, crawl=None):
+    """
+    Get the listings of a set of query parameters, through the result cache.
+
+    Args:
+        params (QueryParams): The query parameters.
+        on_record (Callable, optional): Called with each listing record as
+            soon as it is extracted.
+        crawl (Callable, optional): Coroutine function crawling on a cache
+            miss. Defaults to ``run_crawl``.
+
+    Returns:
+        DataFrame: The parsed listings.
+    """
+    df, _ = await cached_crawl(params, on_record, crawl)
+    return df
+
+
+async def run_crawl(params: QueryParams, on_record=None):
+    """
+    Run the crawler and parser for a set of query parameters, in this
+    process or, when the API runs no crawl worker, on a worker node.
+
+    Args:
+        params (QueryParams): The query parameters.
+        on_record (Callable, optional): Called with each listing record as
+            soon as it is extracted.
+
+    Returns:
+        DataFrame: The parsed listings.
+    """
+    if not settings.JOB_EMBEDDED_WORKER:
+        return await job_manager.run(params, on_record)
+    return await run_local_crawl(params, on_record)
+
+
+async def run_local_crawl(params: QueryParams, on_record=None, crawl_id=None):
+    """
+    Run the crawler and parser for a set of query parameters in this
+    process.
+
+    Args:
+        params (QueryParams): The query parameters.
+        on_record (Callable, optional): Called with each listing record as
+            soon as it is extracted.
+        crawl_id (str, optional): Identifies the crawl in the stored files,
+            so a crawl delivered again overwrites its own files.
+
+    Returns:
+        DataFrame: The parsed listings.
+    """
+    return await run_facebook_marketplace_crawler_and_parser(
+        city_param=params.city,
+        query_param=params.query,
+        max_price_param=params.max_price,
+        item_condition_param=params.itemCondition,
+        headless_param=params.headless,
+        strategy_param=params.strategy,
+        llm_choice_param=params.llm_choice,
+        model_name_param=params.model_name,
+        scroll_param=params.scroll,
+        max_listings_param=params.max_listings,
+        time_budget_param=params.time_budget,
+        llm_batching_param=params.llm_batching,
+        incremental_param=params.incremental,
+        on_record_param=on_record,
+        crawl_id_param=crawl_id,
+    )
+
+
+async def stream_crawler_records(params: QueryParams):
+    """
+    Run the crawler and stream each listing record as soon as it is
+    extracted.
+
+    The crawl starts right away and this returns once its first record is
+    extracted, so a crawl failing before any listing, e.g. on an exhausted
+    browser pool, fails the request with its status rather than a stream.
+
+    Args:
+        params (QueryParams): The query parameters.
+
+    Returns:
+        AsyncIterator[bytes]: One NDJSON line per listing; a final
+        ``{"error": ...}`` line if the crawl fails midway.
+
+    Raises:
+        HTTPException: 503 if the browser or account pool is exhausted, 500
+            if the crawl fails before its first listing.
+    """
+    records = asyncio.Queue()
+    end_of_stream = object()
+
+    async def crawl():
+        try:
+            await crawl_query_params(params, on_record=records.put_nowait)
+        except Exception as e:
+            logger.error(f"Error occurred: {e}")
+            records.put_nowait(e)
+        finally:
+            records.put_nowait(end_of_stream)
+
+    task = asyncio.create_task(crawl())
+    try:
+        first = await records.get()
+    except BaseException:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+    if isinstance(first, Exception):
+        await asyncio.gather(task, return_exceptions=True)
+        status_code = 500
+        if isinstance(first, (BrowserPoolExhausted, AccountPoolExhausted)):
+            status_code = 503
+        raise HTTPException(status_code=status_code, detail=str(first))
+
+    async def stream():
+        record = first
+        try:
+            while record is not end_of_stream:
+                if isinstance(record, Exception):
+                    record = {"error": str(record)}
+                yield to_ndjson_line(record)
+                record = await records.get()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    return stream()
+
+
+def process_crawler_response_arrow(df_crawler):
+    """
+    Serialise the crawler results to an Arrow IPC stream.
+
+    Returns:
+        bytes: The Arrow IPC stream, schema only when nothing was found.
+    """
+    if df_crawler is None or df_crawler.empty:
+        logger.info("No data found by the crawler")
+        # Zero record batches: readers get an empty table
+        if df_crawler is None:
+            df_crawler = pd.DataFrame()
+    return dataframe_to_arrow_ipc(df_crawler)
+
+
 def process_crawler_response(df_crawler, start_time):
-    if not df_crawler.empty:
+    if df_crawler is not None and not df_crawler.empty:
         logger.info("Crawler returned data")
         elapsed_time = round(time.time() - start_time, 2)
         logger.info(f"Elapsed time: {elapsed_time} seconds")
@@ -64,6 +288,13 @@ async def run_facebook_marketplace_crawler_and_parser(
     strategy_param,
     llm_choice_param,
     model_name_param,
+    scroll_param=False,
+    max_listings_param=None,
+    time_budget_param=None,
+    llm_batching_param=False,
+    incremental_param=False,
+    on_record_param=None,
+    crawl_id_param=None,
 ):
     logger.info("Loading cities dict")
     if city_param in cities:
@@ -76,37 +307,379 @@ async def run_facebook_marketplace_crawler_and_parser(
         query_param, max_price_param, city, item_condition_param
     )
     param_dict = {
+        "city": city_param,
+        "query": query_param,
         "strategy": strategy_param,
         "model_name": model_name_param,
         "llm_choice": llm_choice_param,
+        "llm_batching": llm_batching_param,
+        "incremental": incremental_param,
+        "crawl_id": crawl_id_param,
     }
-    async with async_playwright() as p:
+
+    routing_mode = "scroll" if scroll_param else "page"
+    # A blocked account cools down and the crawl moves to another one
+    retries = 1 if len(account_pool.accounts) > 1 else 0
+    for attempt in range(retries + 1):
         try:
-            logger.info("Setup browser and context (Playwright)")
-            browser, context = await setup_browser_context(p, headless_param)
-            page = await context.new_page()
-            await page.route(
-                "**/*.{png,jpg,jpeg}", lambda route: route.abort()
+            async with open_crawl_context(
+                headless_param, url_login, routing_mode
+            ) as (context, session):
+                page = await context.new_page()
+                try:
+                    logger.info(f"Navigating to marketplace: {url_marketplace}")
+                    df = await scrape_and_parse(
+                        session,
+                        page,
+                        url_marketplace,
+                        param_dict,
+                        scroll=scroll_param,
+                        max_listings=max_listings_param,
+                        time_budget=time_budget_param,
+                        on_record=on_record_param,
+                        html_path="data/posts_html.html",
+                    )
+
+                except TimeoutError:
+                    logger.error("Timeout occurred during the crawling process.")
+                    df = None
+                finally:
+                    await page.close()
+
+            return df
+        except AccountBlocked as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"{e}, crawling on another account")
+
+
+async def scrape_and_parse(
+    session,
+    page,
+    url_marketplace,
+    param_dict,
+    scroll=False,
+    max_listings=None,
+    time_budget=None,
+    on_record=None,
+    html_path=None,
+):
+    """
+    Scrape a marketplace page and parse its listings with the strategy of
+    ``param_dict``.
+
+    The GRAPHQL strategy decodes the listings from the page JSON payloads
+    and falls back to the CSS strategy on the rendered page when no payload
+    held any listing.
+
+    Args:
+        session (FacebookSession): The session of the browser context.
+        page (Page): The page to navigate with.
+        url_marketplace (str): The marketplace search URL.
+        param_dict (dict): The crawl parameters.
+        scroll (bool, optional): Whether to keep scrolling to load more
+            results. Defaults to False.
+        max_listings (int, optional): Target number of listings when
+            scrolling.
+        time_budget (float, optional): Maximum scrolling time in seconds.
+        on_record (Callable, optional): Called with each record.
+        html_path (str, optional): Where to save the page HTML, if anywhere.
+
+    Returns:
+        DataFrame: The parsed listings.
+    """
+    scrape_kwargs = {
+        "scroll": scroll,
+        "max_listings": max_listings,
+        "time_budget": time_budget,
+    }
+    if param_dict["strategy"] == "GRAPHQL":
+        listings = await session.scrape(
+            page,
+            url_marketplace,
+            scraper=capture_marketplace_listings,
+            **scrape_kwargs,
+        )
+        if listings:
+            return await parse_marketplace_payload_listings(
+                listings, param_dict, on_record
             )
+        logger.warning("No listing payload captured, parsing the page HTML")
+        html = await page.content()
+        param_dict = {**param_dict, "strategy": "CSS"}
+    else:
+        html = await session.scrape(page, url_marketplace, **scrape_kwargs)
+
+    if html_path is not None:
+        logger.info("Saving the HTML code")
+        await save_html(html, html_path)
+
+    logger.info("Parsing HTML of all posts' page")
+    return await parse_facebook_marketplace_listings(html, param_dict, on_record)
+
+
+async def stream_batch_crawl(params: BatchQueryParams):
+    """
+    Crawl the cross product of cities and queries concurrently.
+
+    On the browser pool, each combination runs on an account of the account
+    pool, on a page of the sticky browser context of the account, so each
+    account logs in once. On a dedicated browser, all combinations share one
+    browser context, hence one account and one login. At most
+    ``params.max_concurrency`` pages are in flight.
+    Navigations to the same host are spaced by ``BATCH_HOST_MIN_INTERVAL``.
+
+    Args:
+        params (BatchQueryParams): The batch query parameters.
 
-            logger.info(f"Navigating to login page: {url_login}")
-            await login_facebook(page, url_login)
+    Yields:
+        bytes: One JSON line per combination, in completion order.
+    """
+    unsupported = [c for c in params.cities if c not in cities]
+    if unsupported:
+        raise ValueError(f"{', '.join(unsupported)} not supported.")
 
-            logger.info(f"Navigating to marketplace: {url_marketplace}")
-            html = await scrape_marketplace(page, url_marketplace)
+    param_dict = {
+        "strategy": params.strategy,
+        "model_name": params.model_name,
+        "llm_choice": params.llm_choice,
+        "llm_batching": params.llm_batching,
+        "incremental": params.incremental,
+    }
+    combinations = list(itertools.product(params.cities, params.queries))
+    logger.info(f"Batch crawl of {len(combinations)} combinations")
+    if not settings.JOB_EMBEDDED_WORKER:
+        async for line in dispatch_batch_crawl(params, combinations):
+            yield line
+        return
 
-            logger.info("Saving the HTML code")
-            filepath = "data/posts_html.html"
-            await save_html(html, filepath)
+    semaphore = asyncio.Semaphore(params.max_concurrency)
+    rate_limiter = HostRateLimiter(settings.BATCH_HOST_MIN_INTERVAL)
 
-            logger.info("Parsing HTML of all posts' page")
-            df = parse_facebook_marketplace_listings(html, param_dict)
+    routing_mode = "scroll" if params.scroll else "page"
+    shared, shared_account, blocked = None, None, []
 
-        except TimeoutError:
-            logger.error("Timeout occurred during the crawling process.")
-            df = None
+    @asynccontextmanager
+    async def combination_context():
+        if shared is not None:
+            yield shared
+            return
+        async with open_crawl_context(
+            params.headless, URL_LOGIN, routing_mode
+        ) as (context, session):
+            yield context, session
+
+    async def crawl_combination(city_param, query_param):
+        _, url_marketplace = setup_urls_facebook_marketplace(
+            query_param,
+            params.max_price,
+            cities[city_param],
+            params.itemCondition,
+        )
+        result = {"city": city_param, "query": query_param}
+        async with semaphore:
+            try:
+                async with combination_context() as (context, session):
+                    page = await context.new_page()
+                    try:
+                        await session.ensure(page)
+                        await rate_limiter.wait(url_marketplace)
+                        logger.info(
+                            f"Navigating to marketplace: {url_marketplace}"
+                        )
+                        df = await scrape_and_parse(
+                            session,
+                            page,
+                            url_marketplace,
+                            {
+                                **param_dict,
+                                "city": city_param,
+                                "query": query_param,
+                            },
+                            scroll=params.scroll,
+                            max_listings=params.max_listings,
+                            time_budget=params.time_budget,
+                        )
+                    finally:
+                        await page.close()
+                if df.empty:
+                    result.update(status="pok", data=None)
+                else:
+                    result.update(
+                        status="ok", data=df.to_dict(orient="records")
+                    )
+            except Exception as e:
+                if isinstance(e, AccountBlocked):
+                    blocked.append(e)
+                logger.error(
+                    f"Error crawling {city_param} / {query_param}: {e}"
+                )
+                result.update(status="error", data=None, detail=str(e))
+        return result
+
+    async with AsyncExitStack() as stack:
+        if not uses_browser_pool(params.headless):
+            shared_account = await stack.enter_async_context(
+                account_pool.acquire()
+            )
+            shared = await stack.enter_async_context(
+                open_account_context(
+                    shared_account, params.headless, URL_LOGIN, routing_mode
+                )
+            )
+        tasks = [
+            asyncio.create_task(crawl_combination(city_param, query_param))
+            for city_param, query_param in combinations
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                yield to_ndjson_line(result)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    if shared_account is not None and blocked:
+        # The shared dedicated browser is closed with the stack; only its
+        # account is left to cool down
+        account_pool.cool_down(shared_account)
+
+
+async def dispatch_batch_crawl(params: BatchQueryParams, combinations):
+    """
+    Crawl each combination of a batch as a job on the worker nodes, with at
+    most ``params.max_concurrency`` jobs queued or running at once.
+
+    Yields:
+        bytes: One JSON line per combination, in completion order.
+    """
+    semaphore = asyncio.Semaphore(params.max_concurrency)
+    shared_params = params.model_dump(
+        exclude={"cities", "queries", "max_concurrency"}
+    )
+
+    async def crawl_combination(city_param, query_param):
+        result = {"city": city_param, "query": query_param}
+        async with semaphore:
+            try:
+                df = await crawl_query_params(
+                    QueryParams(
+                        city=city_param, query=query_param, **shared_params
+                    )
+                )
+                if df is None or df.empty:
+                    result.update(status="pok", data=None)
+                else:
+                    result.update(
+                        status="ok", data=df.to_dict(orient="records")
+                    )
+            except Exception as e:
+                logger.error(
+                    f"Error crawling {city_param} / {query_param}: {e}"
+                )
+                result.update(status="error", data=None, detail=str(e))
+        return result
+
+    tasks = [
+        asyncio.create_task(crawl_combination(city_param, query_param))
+        for city_param, query_param in combinations
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield to_ndjson_line(await task)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def uses_browser_pool(headless_param):
+    """
+    Whether crawls with this headless mode run on the shared browser pool.
+    """
+    return browser_pool.started and headless_param == browser_pool.headless
+
+
+@asynccontextmanager
+async def open_crawl_context(headless_param, url_login, routing_mode="page"):
+    """
+    Open a browser context for a crawl on an account of the account pool,
+    see ``open_account_context``.
+
+    Args:
+        headless_param (bool): Whether to run the browser in headless mode.
+        url_login (str): The login URL used if the session must be renewed.
+        routing_mode (str, optional): The crawl mode selecting the request
+            routing policy ("page" or "scroll"). Defaults to "page".
+
+    Yields:
+        Tuple: The browser context and its ``FacebookSession``.
+
+    Raises:
+        AccountPoolExhausted: If no account became available in time.
+    """
+    async with account_pool.acquire() as account:
+        async with open_account_context(
+            account, headless_param, url_login, routing_mode
+        ) as (context, session):
+            yield context, session
+
+
+@asynccontextmanager
+async def open_account_context(
+    account, headless_param, url_login, routing_mode="page"
+):
+    """
+    Open a browser context for a crawl on an account, preloaded with the
+    cached session of the account.
+
+    The context comes from the shared browser pool when it serves the
+    requested headless mode, otherwise a dedicated browser is launched.
+    Pooled contexts are sticky: each account keeps one context per routing
+    mode, logged in once and reused by its next crawls, until the account is
+    sent to a checkpoint.
+
+    Args:
+        account (Account): The account, acquired from the account pool.
+        headless_param (bool): Whether to run the browser in headless mode.
+        url_login (str): The login URL used if the session must be renewed.
+        routing_mode (str, optional): The crawl mode selecting the request
+            routing policy ("page" or "scroll"). Defaults to "page".
+
+    Yields:
+        Tuple: The browser context and its ``FacebookSession``.
+    """
+    storage_state = session_cache.load(account.session_key)
+
+    def new_session():
+        return FacebookSession(
+            account.session_key,
+            url_login,
+            storage_state is not None,
+            credentials=account.credentials,
+            on_navigation=account.spend,
+        )
+
+    if uses_browser_pool(headless_param):
+        logger.info(f"Acquiring the browser context of {account.email}")
+        sticky_key = f"{account.session_key}:{routing_mode}"
+        try:
+            async with browser_pool.sticky_context(
+                sticky_key, storage_state, routing_mode, new_session
+            ) as (context, session):
+                yield context, session
+        except AccountBlocked:
+            await browser_pool.drop(sticky_key)
+            raise
+        return
+
+    async with async_playwright() as p:
+        logger.info("Setup browser and context (Playwright)")
+        browser, context = await setup_browser_context(
+            p, headless_param, storage_state, routing_mode
+        )
+        try:
+            yield context, new_session()
         finally:
             await context.close()
             await browser.close()
-
-        return df
@@ -0,0 +1,203 @@
+import asyncio
+import uuid
+
+from core.config import settings
+from core.logging import setup_logging
+from services.task_queue import (  # noqa: F401
+    CANCELLED,
+    DONE,
+    FINISHED_STATUSES,
+    QUEUED,
+    JobQueueFull,
+    create_job_queue_backend,
+)
+from utils.misc import QueryParams
+from utils.serialization import arrow_ipc_to_dataframe, to_ndjson_line
+
+logger = setup_logging()
+
+
+def task_dataframe(task):
+    """
+    Get the listings of a finished task.
+
+    Returns:
+        DataFrame | None: The listings, None when nothing was found.
+    """
+    if not task["result"]:
+        return None
+    return arrow_ipc_to_dataframe(task["result"])
+
+
+class JobManager:
+    """
+    Producer of crawl jobs: queues them for the crawl workers and reads their
+    progress and results back from the job queue.
+
+    The workers run in the API process (``JOB_EMBEDDED_WORKER``) or on
+    worker nodes sharing a Redis job queue, see ``services/worker.py``.
+
+    Attributes:
+        backend: The job queue backend (memory or Redis).
+        poll_interval (float): Seconds between polls of a running job.
+    """
+
+    def __init__(self, backend, poll_interval):
+        self.backend = backend
+        self.poll_interval = poll_interval
+
+    async def stop(self):
+        await self.backend.close()
+
+    async def submit(self, params: QueryParams, cached=True):
+        """
+        Queue a crawl job.
+
+        Args:
+            params (QueryParams): The crawl query parameters.
+            cached (bool, optional): Whether the worker may serve the job
+                from the result cache. Defaults to True.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            JobQueueFull: If the queue already holds ``JOB_MAX_QUEUE`` jobs.
+        """
+        job_id = uuid.uuid4().hex
+        await self.backend.enqueue(
+            job_id, {"params": params.model_dump(), "cached": cached}
+        )
+        logger.info(f"Job {job_id} queued")
+        return job_id
+
+    async def get(self, job_id):
+        """
+        Describe a job.
+
+        Returns:
+            dict | None: The status, progress and, once done, the result of
+            the job, or None if unknown or expired.
+        """
+        task = await self.backend.get(job_id)
+        if task is None:
+            return None
+        result = None
+        if task["status"] == DONE:
+            df = task_dataframe(task)
+            result = (
+                {"status": "ok", "data": df.to_json(orient="records")}
+                if df is not None
+                else {"status": "pok", "data": None}
+            )
+        listings = await self.backend.count_listings(job_id)
+        return {
+            "id": job_id,
+            "status": task["status"],
+            "progress": {"listings": listings},
+            "error": task["error"],
+            "attempts": task["attempts"],
+            "worker": task["worker"] or None,
+            "created_at": task["created_at"],
+            "started_at": task["started_at"],
+            "finished_at": task["finished_at"],
+            "result": result,
+        }
+
+    async def cancel(self, job_id):
+        """
+        Cancel a queued or running job; its worker stops at its next
+        heartbeat.
+
+        Returns:
+            str | None: The job status, or None if unknown or expired.
+        """
+        status = await self.backend.cancel(job_id)
+        if status == CANCELLED:
+            logger.info(f"Job {job_id} cancelled")
+        return status
+
+    async def follow(self, job_id):
+        """
+        Poll a job until it finishes.
+
+        Yields:
+            Tuple[List[dict], dict]: The listings published since the
+            previous poll, and the job state.
+        """
+        sent = 0
+        while True:
+            task = await self.backend.get(job_id)
+            records = await self.backend.listings(job_id, sent)
+            sent += len(records)
+            yield records, task
+            if task is None or task["status"] in FINISHED_STATUSES:
+                # Listings published before the final status
+                records = await self.backend.listings(job_id, sent)
+                if records:
+                    yield records, task
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def stream(self, job_id):
+        """
+        Yield the job listings as NDJSON lines while they are extracted,
+        followed by a final line with the job status.
+
+        Yields:
+            bytes: One JSON line per listing, then the status line.
+        """
+        task = None
+        async for records, task in self.follow(job_id):
+            for record in records:
+                yield to_ndjson_line(record)
+        status = {
+            "id": job_id,
+            "status": task["status"] if task else None,
+            "error": task["error"] if task else "Job expired",
+        }
+        yield to_ndjson_line({"job": status})
+
+    async def run(self, params: QueryParams, on_record=None):
+        """
+        Crawl on a worker and wait for the listings, the way
+        ``run_local_crawl`` crawls in process.
+
+        Args:
+            params (QueryParams): The query parameters.
+            on_record (Callable, optional): Called with each listing record
+                as soon as the worker publishes it.
+
+        Returns:
+            DataFrame: The parsed listings.
+        """
+        # The caller already went through the result cache
+        job_id = await self.submit(params, cached=False)
+        task = None
+        try:
+            async for records, task in self.follow(job_id):
+                if on_record is not None:
+                    for record in records:
+                        on_record(record)
+        except asyncio.CancelledError:
+            await self.cancel(job_id)
+            raise
+        if task is None:
+            raise RuntimeError(f"Job {job_id} expired")
+        if task["status"] != DONE:
+            raise RuntimeError(
+                task["error"] or f"Job {job_id} {task['status']}"
+            )
+        return task_dataframe(task)
+
+
+job_manager = JobManager(
+    backend=create_job_queue_backend(
+        settings.JOB_QUEUE_BACKEND,
+        settings.JOB_QUEUE_URL,
+        max_queue=settings.JOB_MAX_QUEUE,
+        max_deliveries=settings.JOB_MAX_DELIVERIES,
+        retention_ttl=settings.JOB_RETENTION_TTL,
+    ),
+    poll_interval=settings.JOB_POLL_INTERVAL,
+)
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from core.config import settings
+from core.logging import setup_logging
+from services.llm_cache import normalize_html
+from services.prices import parse_prices
+
+logger = setup_logging()
+
+NEW = "new"
+CHANGED = "changed"
+PRICE_DROP = "price_drop"
+REMOVED = "removed"
+
+FINGERPRINT_FIELDS = ("title", "price", "location")
+
+
+def listing_fingerprint(listing):
+    """
+    Fingerprint the content of a listing card.
+
+    The card fields extracted by the parser backend are used; when none was
+    found (e.g. the CSS classes changed) the normalised HTML is used instead.
+
+    Args:
+        listing (dict): A listing from the parser backend.
+
+    Returns:
+        str: The hex SHA-256 fingerprint.
+    """
+    fields = [listing.get(field, "None") for field in FINGERPRINT_FIELDS]
+    if all(value == "None" for value in fields) and listing.get("html"):
+        fields = [normalize_html(listing["html"])]
+    digest = hashlib.sha256()
+    for value in fields:
+        digest.update(str(value).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def to_price(price):
+    return parse_prices(pd.Series([price]))["cleaned_price"].iloc[0]
+
+
+class ListingIndex:
+    """
+    Persistent index of the listings seen by each search.
+
+    Listings are keyed by search (city and query) and marketplace item
+    number, with a fingerprint of their content. Every new, changed or
+    removed listing appends an event, numbered by an increasing cursor, so
+    clients can poll the changes since the last cursor they saw.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        removal_after (int): Consecutive crawls of a search a listing must be
+            missing from before it is reported as removed.
+    """
+
+    def __init__(self, path, removal_after):
+        self.path = path
+        self.removal_after = removal_after
+
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def select_changed(self, city, query, listings):
+        """
+        Keep the listings that are new or changed since the last crawl.
+
+        Args:
+            city (str): The crawled city.
+            query (str): The search query.
+            listings (List[dict]): The listings from the parser backend.
+
+        Returns:
+            Tuple[List[dict], Dict[str, str]]: The new or changed listings,
+            and the fingerprint of every listing seen by item number.
+        """
+        fingerprints = {
+            listing["item_number"]: listing_fingerprint(listing)
+            for listing in listings
+            if listing["item_number"] != "None"
+        }
+        with self._lock:
+            known = dict(
+                self._db().execute(
+                    "SELECT item_number, fingerprint FROM listings "
+                    "WHERE city = ? AND query = ? AND removed_at IS NULL",
+                    (city, query),
+                )
+            )
+        changed = [
+            listing
+            for listing in listings
+            if listing["item_number"] == "None"
+            or known.get(listing["item_number"])
+            != fingerprints[listing["item_number"]]
+        ]
+        logger.info(
+            f"{len(listings) - len(changed)} unchanged listings skipped, "
+            f"{len(changed)} new or changed"
+        )
+        return changed, fingerprints
+
+    def update(self, city, query, fingerprints, records):
+        """
+        Record a crawl and append the resulting change events.
+
+        Args:
+            city (str): The crawled city.
+            query (str): The search query.
+            fingerprints (Dict[str, str]): The fingerprint of every listing
+                seen by item number.
+            records (Dict[str, dict]): The records of the new or changed
+                listings by item number.
+
+        Returns:
+            Dict[str, int]: The number of events of each kind.
+        """
+        now = time.time()
+        counts = {NEW: 0, CHANGED: 0, PRICE_DROP: 0, REMOVED: 0}
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                for item_number, record in records.items():
+                    if item_number not in fingerprints:
+                        continue
+                    kind = self._upsert(
+                        db,
+                        city,
+                        query,
+                        item_number,
+                        fingerprints[item_number],
+                        record,
+                        now,
+                    )
+                    counts[kind] += 1
+
+                db.executemany(
+                    "UPDATE listings SET last_seen = ?, missed = 0 "
+                    "WHERE city = ? AND query = ? AND item_number = ?",
+                    [(now, city, query, item) for item in fingerprints],
+                )
+                counts[REMOVED] = self._sweep_missing(db, city, query, now)
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        logger.info(f"Listing index updated for {city}/{query}: {counts}")
+        return counts
+
+    def changes(self, since=0, city=None, query=None, limit=1000):
+        """
+        List the change events after a cursor.
+
+        Args:
+            since (int, optional): The last cursor already seen. Defaults to
+                0, i.e. every event.
+            city (str, optional): Only the events of this city.
+            query (str, optional): Only the events of this query.
+            limit (int, optional): Maximum number of events. Defaults to 1000.
+
+        Returns:
+            dict: The ``cursor`` to poll from next and the ``changes``.
+        """
+        sql = "SELECT * FROM events WHERE cursor > ?"
+        args = [since]
+        if city is not None:
+            sql += " AND city = ?"
+            args.append(city)
+        if query is not None:
+            sql += " AND query = ?"
+            args.append(query)
+        sql += " ORDER BY cursor LIMIT ?"
+        args.append(limit)
+
+        with self._lock:
+            cursor = self._db().execute(sql, args)
+            columns = [column[0] for column in cursor.description]
+            changes = [dict(zip(columns, row)) for row in cursor]
+        for change in changes:
+            change["record"] = json.loads(change["record"])
+        return {
+            "cursor": changes[-1]["cursor"] if changes else since,
+            "changes": changes,
+        }
+
+    def _upsert(self, db, city, query, item_number, fingerprint, record, now):
+        row = db.execute(
+            "SELECT record, removed_at FROM listings "
+            "WHERE city = ? AND query = ? AND item_number = ?",
+            (city, query, item_number),
+        ).fetchone()
+        price = to_price(record.get("price"))
+        previous_price = None
+        if row is None or row[1] is not None:
+            kind = NEW
+        else:
+            previous_price = to_price(json.loads(row[0]).get("price"))
+            kind = CHANGED
+            if price < previous_price:
+                kind = PRICE_DROP
+
+        value = json.dumps(record, default=str)
+        db.execute(
+            "INSERT OR REPLACE INTO listings (city, query, item_number, "
+            "fingerprint, record, first_seen, last_seen, missed, removed_at) "
+            "VALUES (?, ?, ?, ?, ?, COALESCE((SELECT first_seen FROM listings "
+            "WHERE city = ? AND query = ? AND item_number = ?), ?), ?, 0, NULL)",
+            (
+                city,
+                query,
+                item_number,
+                fingerprint,
+                value,
+                city,
+                query,
+                item_number,
+                now,
+                now,
+            ),
+        )
+        self._add_event(
+            db, city, query, item_number, kind, value, previous_price, price, now
+        )
+        return kind
+
+    def _sweep_missing(self, db, city, query, now):
+        db.execute(
+            "UPDATE listings SET missed = missed + 1 "
+            "WHERE city = ? AND query = ? AND removed_at IS NULL "
+            "AND last_seen < ?",
+            (city, query, now),
+        )
+        removed = db.execute(
+            "SELECT item_number, record FROM listings "
+            "WHERE city = ? AND query = ? AND removed_at IS NULL "
+            "AND missed >= ?",
+            (city, query, self.removal_after),
+        ).fetchall()
+        for item_number, value in removed:
+            db.execute(
+                "UPDATE listings SET removed_at = ? "
+                "WHERE city = ? AND query = ? AND item_number = ?",
+                (now, city, query, item_number),
+            )
+            self._add_event(
+                db, city, query, item_number, REMOVED, value, None, None, now
+            )
+        return len(removed)
+
+    def _add_event(
+        self,
+        db,
+        city,
+        query,
+        item_number,
+        kind,
+        value,
+        previous_price,
+        price,
+        now,
+    ):
+        # NaN prices (unparsable or missing) are stored as NULL
+        db.execute(
+            "INSERT INTO events (city, query, item_number, kind, record, "
+            "previous_price, price, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                city,
+                query,
+                item_number,
+                kind,
+                value,
+                None if pd.isna(previous_price) else float(previous_price),
+                None if pd.isna(price) else float(price),
+                now,
+            ),
+        )
+
+    def _db(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS listings ("
+                "city TEXT NOT NULL, query TEXT NOT NULL, "
+                "item_number TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                "record TEXT NOT NULL, first_seen REAL NOT NULL, "
+                "last_seen REAL NOT NULL, missed INTEGER NOT NULL DEFAULT 0, "
+                "removed_at REAL, PRIMARY KEY (city, query, item_number))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "cursor INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "city TEXT NOT NULL, query TEXT NOT NULL, "
+                "item_number TEXT NOT NULL, kind TEXT NOT NULL, "
+                "record TEXT NOT NULL, previous_price REAL, price REAL, "
+                "created_at REAL NOT NULL)"
+            )
+        return self._connection
+
+
+listing_index = ListingIndex(
+    path=settings.LISTING_INDEX_PATH,
+    removal_after=settings.LISTING_INDEX_REMOVAL_AFTER,
+)
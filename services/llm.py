@@ -1,5 +1,12 @@
-from typing import Optional
+import asyncio
+import functools
+import random
+import threading
+import time
+from typing import List, Optional
 
+import httpx
+import tiktoken
 from langchain.prompts import ChatPromptTemplate
 from langchain_community.llms import Ollama
 from langchain_core.prompts import ChatPromptTemplate
@@ -8,6 +15,106 @@ from pydantic import BaseModel, Field
 
 from core.config import settings
 from core.logging import logger
+from services.llm_cache import llm_cache, llm_cache_key
+from utils.metrics import observe_post_extraction
+from utils.rate_limit import TokenBucket
+
+# Bump whenever the prompt or Post schema changes to invalidate cached results
+PROMPT_VERSION = "1"
+# Same for the batch prompt and PostBatch schema
+BATCH_PROMPT_VERSION = "1"
+
+
+class Post(BaseModel):
+    """https://python.langchain.com/v0.1/docs/use_cases/extraction/quickstart/"""
+
+    title: Optional[str] = Field(
+        description="Title of the post",
+        default="None",
+    )
+    location: Optional[str] = Field(
+        description="Location of the product",
+        default="None",
+    )
+    price: Optional[str] = Field(
+        description="Price of the product",
+        default="None",
+    )
+    item_number: Optional[str] = Field(
+        description="Marketplace item number",
+        default="None",
+    )
+
+
+LLM_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You are an expert extraction algorithm. "
+            "Only extract relevant information from the text. "
+            "If you do not know the value of an attribute asked to extract, "
+            "return null for the attribute's value."
+            "Find and extract text of title, location, price, and item_number from HTML code of a Facebook marketplace post.",
+        ),
+        ("human", "{HTML}"),
+    ]
+)
+
+
+class IndexedPost(Post):
+    index: int = Field(description="Index of the listing in the input")
+
+
+class PostBatch(BaseModel):
+    """Posts extracted from several listings sent in a single request."""
+
+    posts: List[IndexedPost] = Field(
+        description="One entry per input listing, in any order"
+    )
+
+
+LLM_BATCH_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You are an expert extraction algorithm. "
+            "Only extract relevant information from the text. "
+            "If you do not know the value of an attribute asked to extract, "
+            "return null for the attribute's value."
+            "The input holds the HTML code of several Facebook marketplace posts, "
+            "each one preceded by a line '### Listing <index>'. "
+            "For every listing, find and extract text of title, location, price, and item_number, "
+            "and return it with the index of its listing.",
+        ),
+        ("human", "{LISTINGS}"),
+    ]
+)
+
+# Process-wide chains keyed by (llm_choice, model_name, batch)
+_chains = {}
+_chains_lock = threading.Lock()
+
+# HTTP clients shared by every OpenAI model so they reuse one connection pool
+_http_client = None
+_http_async_client = None
+
+
+def get_http_clients():
+    """
+    Get the HTTP clients shared by the OpenAI models, creating them lazily.
+
+    Returns:
+        Tuple: The sync and async ``httpx`` clients.
+    """
+    global _http_client, _http_async_client
+    if _http_client is None:
+        limits = httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        )
+        _http_client = httpx.Client(limits=limits)
+        _http_async_client = httpx.AsyncClient(limits=limits)
+    return _http_client, _http_async_client
 
 
 def get_model(llm_choice_param, model_name_param):
@@ -15,10 +122,13 @@ def get_model(llm_choice_param, model_name_param):
         llm_model = Ollama(model=model_name_param)
         return llm_model
     elif llm_choice_param.lower() == "openai":
+        http_client, http_async_client = get_http_clients()
         llm_model = ChatOpenAI(
             api_key=settings.OPENAI_API_KEY,
             model=model_name_param,
             temperature=0,
+            http_client=http_client,
+            http_async_client=http_async_client,
         )
         return llm_model
     else:
@@ -27,51 +137,167 @@ def get_model(llm_choice_param, model_name_param):
         )
 
 
-def setup_llm_chain(llm_choice_param="OpenAI", model_name_param="gpt-4"):
-    class Post(BaseModel):
-        """https://python.langchain.com/v0.1/docs/use_cases/extraction/quickstart/"""
-
-        title: Optional[str] = Field(
-            description="Title of the post",
-            default="None",
-        )
-        location: Optional[str] = Field(
-            description="Location of the product",
-            default="None",
-        )
-        price: Optional[str] = Field(
-            description="Price of the product",
-            default="None",
-        )
-        item_number: Optional[str] = Field(
-            description="Marketplace item number",
-            default="None",
-        )
-
-    logger.info(f"Loading LLM prompt")
-    llm_prompt = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "You are an expert extraction algorithm. "
-                "Only extract relevant information from the text. "
-                "If you do not know the value of an attribute asked to extract, "
-                "return null for the attribute's value."
-                "Find and extract text of title, location, price, and item_number from HTML code of a Facebook marketplace post.",
-            ),
-            ("human", "{HTML}"),
-        ]
-    )
-
+def setup_llm_chain(
+    llm_choice_param="OpenAI", model_name_param="gpt-4", batch=False
+):
     logger.info(
         f"Loading LLM Model : {llm_choice_param.lower()}, {model_name_param}"
     )
     llm_model = get_model(llm_choice_param, model_name_param)
-    chain = llm_prompt | llm_model.with_structured_output(schema=Post)
+    if batch:
+        chain = LLM_BATCH_PROMPT | llm_model.with_structured_output(
+            schema=PostBatch
+        )
+    else:
+        chain = LLM_PROMPT | llm_model.with_structured_output(schema=Post)
+
+    return chain
+
+
+def get_llm_chain(
+    llm_choice_param="OpenAI", model_name_param="gpt-4", batch=False
+):
+    """
+    Get the extraction chain of a model, building it on first use.
+
+    Chains are cached per (llm_choice, model_name, batch) for the lifetime of
+    the process, so the prompt, model client and HTTP connection pool are set
+    up once instead of for every post.
+
+    Parameters:
+    - llm_choice_param (str): The choice of LLM to use (e.g. "OpenAI").
+    - model_name_param (str): The name of the LLM model to use (e.g. "gpt-4").
+    - batch (bool, optional): Whether to get the chain extracting several
+      listings per request.
 
+    Returns:
+    - Runnable: The extraction chain.
+
+    """
+    key = (llm_choice_param.lower(), model_name_param, batch)
+    chain = _chains.get(key)
+    if chain is None:
+        with _chains_lock:
+            chain = _chains.get(key)
+            if chain is None:
+                chain = setup_llm_chain(
+                    llm_choice_param, model_name_param, batch
+                )
+                _chains[key] = chain
     return chain
 
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name_param):
+    # Only loaded encodings are cached: tiktoken downloads its vocabularies
+    # on first use, so a failed load is retried on the next call
+    try:
+        return tiktoken.encoding_for_model(model_name_param)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model_name_param):
+    """
+    Count the tokens of a text with the tokenizer of a model.
+
+    Models unknown to tiktoken (e.g. Ollama models) are counted with
+    ``cl100k_base``, which is close enough for budgeting. If no encoding can
+    be loaded, tokens are estimated at four characters each.
+
+    Parameters:
+    - text (str): The text to tokenize.
+    - model_name_param (str): The name of the LLM model.
+
+    Returns:
+    - int: The number of tokens.
+
+    """
+    try:
+        encoding = get_encoding(model_name_param)
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding: {e}")
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def plan_llm_batches(htmls, model_name_param, token_budget=None, max_size=None):
+    """
+    Group listings into batches fitting a prompt token budget.
+
+    Listings are packed greedily in order. A listing larger than the budget
+    on its own gets a batch of its own.
+
+    Parameters:
+    - htmls (List[str]): The HTML code of each listing.
+    - model_name_param (str): The name of the LLM model.
+    - token_budget (int, optional): Maximum listing tokens per batch.
+      Defaults to ``LLM_BATCH_TOKEN_BUDGET``.
+    - max_size (int, optional): Maximum listings per batch. Defaults to
+      ``LLM_BATCH_MAX_SIZE``.
+
+    Returns:
+    - List[List[int]]: Indices of ``htmls`` in each batch.
+
+    """
+    token_budget = token_budget or settings.LLM_BATCH_TOKEN_BUDGET
+    max_size = max_size or settings.LLM_BATCH_MAX_SIZE
+
+    batches = []
+    batch, batch_tokens = [], 0
+    for idx, html in enumerate(htmls):
+        tokens = count_tokens(html, model_name_param)
+        if batch and (
+            batch_tokens + tokens > token_budget or len(batch) >= max_size
+        ):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(idx)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def format_listings_batch(htmls):
+    return "\n\n".join(
+        f"### Listing {idx}\n{html}" for idx, html in enumerate(htmls)
+    )
+
+
+def warm_llm_chains(models=None):
+    """
+    Build the extraction chains ahead of the first request.
+
+    Parameters:
+    - models (List[Tuple[str, str]], optional): (llm_choice, model_name)
+      pairs to warm. Defaults to ``LLM_WARMUP_MODELS``.
+
+    """
+    for llm_choice_param, model_name_param in (
+        models if models is not None else settings.LLM_WARMUP_MODELS
+    ):
+        try:
+            get_llm_chain(llm_choice_param, model_name_param)
+        except Exception as e:
+            logger.error(
+                f"Could not warm LLM chain {llm_choice_param}/{model_name_param}: {e}"
+            )
+
+
+async def close_llm_chains():
+    """
+    Drop the cached chains and close their shared HTTP clients.
+    """
+    global _http_client, _http_async_client
+    with _chains_lock:
+        _chains.clear()
+    if _http_client is not None:
+        _http_client.close()
+        await _http_async_client.aclose()
+        _http_client, _http_async_client = None, None
+
+
 def get_single_post_data_using_llm(html, llm_choice_param, model_name_param):
     """
     Get data from a single post using a Language Model (LLM).
@@ -85,9 +311,225 @@ def get_single_post_data_using_llm(html, llm_choice_param, model_name_param):
     - dict: Extracted data from the post including title, location, price, and item number.
 
     """
-    logger.info("Setup LLM")
-    chain = setup_llm_chain(llm_choice_param, model_name_param)
+    cache_key = get_llm_cache_key(html, llm_choice_param, model_name_param)
+    cached = get_cached_post_data(cache_key)
+    if cached is not None:
+        logger.info("LLM result served from cache")
+        return cached
+
+    chain = get_llm_chain(llm_choice_param, model_name_param)
 
     logger.info("Invoke LLM")
-    response = chain.invoke({"HTML": html})
+    response = post_data_to_dict(chain.invoke({"HTML": html}))
+    set_cached_post_data(cache_key, response)
     return response
+
+
+def get_llm_cache_key(html, llm_choice_param, model_name_param, batch=False):
+    # Posts extracted in batches are cached apart from single extractions
+    model_id = f"{llm_choice_param.lower()}:{model_name_param}"
+    if batch:
+        return llm_cache_key(html, f"{model_id}:batch", BATCH_PROMPT_VERSION)
+    return llm_cache_key(html, model_id, PROMPT_VERSION)
+
+
+def get_cached_post_data(cache_key):
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return llm_cache.get(cache_key)
+
+
+def set_cached_post_data(cache_key, post_data):
+    if settings.LLM_CACHE_ENABLED:
+        llm_cache.set(cache_key, post_data)
+
+
+async def aget_cached_post_data(cache_key):
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return await llm_cache.aget(cache_key)
+
+
+async def aset_cached_post_data(cache_key, post_data):
+    if settings.LLM_CACHE_ENABLED:
+        await llm_cache.aset(cache_key, post_data)
+
+
+def post_data_to_dict(post_data):
+    """
+    Convert the structured output of the LLM chain to a plain dict.
+
+    Args:
+        post_data (BaseModel | dict): The chain output.
+
+    Returns:
+        dict: The extracted post fields.
+    """
+    if isinstance(post_data, BaseModel):
+        return post_data.model_dump()
+    return dict(post_data)
+
+
+def is_rate_limit_error(error):
+    """
+    Check whether an exception is an HTTP 429 from the model provider.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429
+
+
+async def ainvoke_with_retry(chain, inputs, rate_limiter):
+    """
+    Invoke the LLM chain, retrying with exponential backoff on HTTP 429.
+
+    Args:
+        chain (Runnable): The extraction chain.
+        inputs (dict): The prompt variables.
+        rate_limiter (TokenBucket): Limiter applied before every attempt.
+
+    Returns:
+        The structured output of the chain.
+    """
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        await rate_limiter.acquire()
+        try:
+            return await chain.ainvoke(inputs)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == settings.LLM_MAX_RETRIES:
+                raise
+            delay = settings.LLM_RETRY_BASE_DELAY * 2**attempt
+            delay += random.uniform(0, delay / 2)
+            logger.warning(f"LLM rate limited, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def aget_posts_data_using_llm(
+    htmls,
+    llm_choice_param,
+    model_name_param,
+    max_concurrency=None,
+    batching=False,
+):
+    """
+    Get data from several posts concurrently using a Language Model (LLM).
+
+    Posts already extracted with the same model and prompt version are
+    served from the result cache; with ``batching``, posts extracted in
+    batches or on their own both are. At most ``max_concurrency`` model calls are
+    in flight, requests are rate limited with a token bucket
+    (``LLM_REQUESTS_PER_SECOND``) and HTTP 429 responses are retried with
+    exponential backoff.
+
+    With ``batching``, posts are packed into requests of several listings
+    sized by ``plan_llm_batches``; any listing the model leaves out of a
+    batch answer is extracted on its own.
+
+    Parameters:
+    - htmls (List[str]): The HTML code of each Facebook marketplace post.
+    - llm_choice_param (str): The choice of LLM to use (e.g. "OpenAI").
+    - model_name_param (str): The name of the LLM model to use (e.g. "gpt-4").
+    - max_concurrency (int, optional): Maximum concurrent model calls.
+    - batching (bool, optional): Whether to extract several posts per call.
+
+    Returns:
+    - List[dict | None]: Extracted data for each post, in the order of
+      ``htmls``; None for posts whose extraction failed.
+
+    """
+    semaphore = asyncio.Semaphore(
+        max_concurrency or settings.LLM_MAX_CONCURRENCY
+    )
+    rate_limiter = TokenBucket(
+        rate=settings.LLM_REQUESTS_PER_SECOND,
+        capacity=max(1, settings.LLM_REQUESTS_PER_SECOND),
+    )
+
+    cache_keys = [
+        get_llm_cache_key(html, llm_choice_param, model_name_param)
+        for html in htmls
+    ]
+    batch_cache_keys = [
+        get_llm_cache_key(html, llm_choice_param, model_name_param, batch=True)
+        for html in (htmls if batching else ())
+    ]
+    results = await asyncio.gather(
+        *(aget_cached_post_data(cache_key) for cache_key in cache_keys)
+    )
+    if batching:
+        missing = [idx for idx, result in enumerate(results) if result is None]
+        batch_results = await asyncio.gather(
+            *(aget_cached_post_data(batch_cache_keys[idx]) for idx in missing)
+        )
+        for idx, result in zip(missing, batch_results):
+            results[idx] = result
+    pending = [idx for idx, result in enumerate(results) if result is None]
+    logger.info(
+        f"{len(htmls) - len(pending)} of {len(htmls)} posts served from cache"
+    )
+
+    async def extract_single(idx):
+        chain = get_llm_chain(llm_choice_param, model_name_param)
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                response = await ainvoke_with_retry(
+                    chain, {"HTML": htmls[idx]}, rate_limiter
+                )
+            except Exception as e:
+                logger.error(f"LLM extraction failed for post {idx + 1}: {e}")
+                return
+            finally:
+                observe_post_extraction("llm", time.perf_counter() - start_time)
+        results[idx] = post_data_to_dict(response)
+        await aset_cached_post_data(cache_keys[idx], results[idx])
+
+    async def extract_batch(indices):
+        chain = get_llm_chain(llm_choice_param, model_name_param, batch=True)
+        listings = format_listings_batch([htmls[idx] for idx in indices])
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                response = await ainvoke_with_retry(
+                    chain, {"LISTINGS": listings}, rate_limiter
+                )
+                posts = post_data_to_dict(response)["posts"]
+            except Exception as e:
+                logger.error(f"LLM batch extraction failed: {e}")
+                posts = []
+            # A batch call is spread evenly over its listings
+            elapsed = (time.perf_counter() - start_time) / len(indices)
+            for _ in indices:
+                observe_post_extraction("llm_batch", elapsed)
+
+        for post in posts:
+            post = dict(post)
+            local_idx = post.pop("index", None)
+            if isinstance(local_idx, int) and 0 <= local_idx < len(indices):
+                idx = indices[local_idx]
+                if results[idx] is None:
+                    results[idx] = post
+                    await aset_cached_post_data(batch_cache_keys[idx], post)
+
+        dropped = [idx for idx in indices if results[idx] is None]
+        if dropped:
+            logger.info(f"Falling back to single calls for {len(dropped)} posts")
+            await asyncio.gather(*(extract_single(idx) for idx in dropped))
+
+    if batching and pending:
+        batches = [
+            [pending[i] for i in batch]
+            for batch in plan_llm_batches(
+                [htmls[idx] for idx in pending], model_name_param
+            )
+        ]
+        logger.info(
+            f"Invoke LLM on {len(pending)} posts in {len(batches)} batches"
+        )
+        await asyncio.gather(*(extract_batch(batch) for batch in batches))
+    else:
+        logger.info(f"Invoke LLM on {len(pending)} posts")
+        await asyncio.gather(*(extract_single(idx) for idx in pending))
+
+    return results
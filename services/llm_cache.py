@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import settings
+from core.logging import setup_logging
+
+logger = setup_logging()
+
+
+def normalize_html(html):
+    """
+    Normalise listing HTML so cosmetic whitespace changes share a cache key.
+
+    Args:
+        html (str): The HTML code of a post.
+
+    Returns:
+        str: The HTML with whitespace runs collapsed and trimmed.
+    """
+    return re.sub(r"\s+", " ", re.sub(r">\s+<", "><", html)).strip()
+
+
+def llm_cache_key(html, model_id, prompt_version):
+    """
+    Content-address an LLM extraction.
+
+    Args:
+        html (str): The HTML code of a post.
+        model_id (str): The model identifier (e.g. "openai:gpt-4").
+        prompt_version (str): The version of the extraction prompt.
+
+    Returns:
+        str: The hex SHA-256 key.
+    """
+    digest = hashlib.sha256()
+    for part in (prompt_version, model_id, normalize_html(html)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMResultCache:
+    """
+    Two-tier cache of LLM extraction results.
+
+    Results live in an in-memory LRU tier backed by a SQLite tier on disk.
+    Both tiers expire entries after ``ttl`` seconds; the disk tier also evicts
+    the least recently used entries beyond ``max_disk_entries``, at most once
+    every ``evict_interval`` seconds, so it may briefly hold more entries.
+
+    ``aget`` and ``aset`` serve the memory tier inline and run the disk tier
+    in a thread, off the event loop.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        max_memory_entries (int): Capacity of the in-memory tier.
+        max_disk_entries (int): Capacity of the disk tier.
+        ttl (float): Time to live of an entry in seconds.
+        evict_interval (float): Minimum seconds between disk evictions.
+    """
+
+    def __init__(
+        self, path, max_memory_entries, max_disk_entries, ttl, evict_interval
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.evict_interval = evict_interval
+
+        self._memory = OrderedDict()
+        # Memory tier and counters; the disk tier has its own lock so the
+        # event loop never waits on disk I/O
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._connection = None
+        self._evicted_at = 0.0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+        }
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict | None: The cached result, or None on a miss.
+        """
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None:
+            value = self._get_disk(key, now)
+        return value
+
+    async def aget(self, key):
+        """
+        Look up a cached result, reading the disk tier in a thread.
+        """
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        return value
+
+    def set(self, key, value):
+        """
+        Store a result in both tiers.
+
+        Args:
+            key (str): The cache key.
+            value (dict): The extraction result.
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        self._set_disk(key, value, now)
+
+    async def aset(self, key, value):
+        """
+        Store a result in both tiers, writing the disk tier in a thread.
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        await asyncio.to_thread(self._set_disk, key, value, now)
+
+    def stats(self):
+        """
+        Return hit/miss counters and tier sizes.
+
+        Returns:
+            dict: Cache statistics.
+        """
+        with self._db_lock:
+            disk_entries = self._db().execute(
+                "SELECT COUNT(*) FROM results"
+            ).fetchone()[0]
+        with self._lock:
+            lookups = (
+                self._counters["memory_hits"]
+                + self._counters["disk_hits"]
+                + self._counters["misses"]
+            )
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if now - stored_at <= self.ttl:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key, now):
+        with self._db_lock:
+            row = self._db().execute(
+                "SELECT value, stored_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.ttl:
+                self._db().execute(
+                    "UPDATE results SET accessed_at = ? WHERE key = ?",
+                    (now, key),
+                )
+        with self._lock:
+            if row is None or now - row[1] > self.ttl:
+                self._counters["misses"] += 1
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self._counters["disk_hits"] += 1
+            return value
+
+    def _set_disk(self, key, value, now):
+        with self._db_lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, value, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            deleted = 0
+            if now - self._evicted_at >= self.evict_interval:
+                self._evicted_at = now
+                deleted = self._evict_disk(db, now)
+        with self._lock:
+            self._counters["writes"] += 1
+            self._counters["evictions"] += deleted
+
+    def _remember(self, key, value, stored_at):
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _evict_disk(self, db, now):
+        deleted = db.execute(
+            "DELETE FROM results WHERE stored_at < ?", (now - self.ttl,)
+        ).rowcount
+        overflow = (
+            db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            - self.max_disk_entries
+        )
+        if overflow > 0:
+            deleted += db.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        return deleted
+
+    def _db(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            # Cheaper commits: writes go to a log synced at checkpoints
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_accessed_at "
+                "ON results (accessed_at)"
+            )
+        return self._connection
+
+
+llm_cache = LLMResultCache(
+    path=settings.LLM_CACHE_PATH,
+    max_memory_entries=settings.LLM_CACHE_MEMORY_ENTRIES,
+    max_disk_entries=settings.LLM_CACHE_DISK_ENTRIES,
+    ttl=settings.LLM_CACHE_TTL,
+    evict_interval=settings.LLM_CACHE_EVICT_INTERVAL,
+)
@@ -0,0 +1,242 @@
+import argparse
+import glob
+import json
+import re
+
+from selectolax.parser import HTMLParser
+
+GRAPHQL_URL_PATTERN = re.compile(r"/api/graphql/?(?:\?|$)")
+
+# Key identifying a marketplace listing node in the payloads
+LISTING_TITLE_KEY = "marketplace_listing_title"
+
+# Anti-JSON-hijacking prefix of some responses
+JSON_PREFIX = "for (;;);"
+
+_decoder = json.JSONDecoder()
+
+
+def decode_payloads(body):
+    """
+    Decode the JSON documents of a response body.
+
+    GraphQL responses may stream several documents separated by newlines
+    (deferred parts of the query); a body that is not JSON yields nothing.
+
+    Args:
+        body (str | bytes): The response body.
+
+    Yields:
+        The decoded documents.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    idx = 0
+    if body.lstrip().startswith(JSON_PREFIX):
+        idx = body.index(JSON_PREFIX) + len(JSON_PREFIX)
+    end = len(body)
+    while idx < end:
+        while idx < end and body[idx].isspace():
+            idx += 1
+        if idx == end:
+            break
+        try:
+            document, idx = _decoder.raw_decode(body, idx)
+        except ValueError:
+            return
+        yield document
+
+
+def iter_listing_nodes(document):
+    """
+    Find the listing nodes of a decoded document, in document order.
+
+    Args:
+        document: A decoded JSON document.
+
+    Yields:
+        dict: Each object holding a listing title and id.
+    """
+    stack = [document]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if LISTING_TITLE_KEY in value and "id" in value:
+                yield value
+                continue
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+
+
+def find_page_info(document):
+    """
+    Find the pagination state of a decoded document.
+
+    Args:
+        document: A decoded JSON document.
+
+    Returns:
+        dict: The ``page_info`` object holding ``end_cursor`` and
+        ``has_next_page``, None if the document has none.
+    """
+    stack = [document]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            page_info = value.get("page_info")
+            if isinstance(page_info, dict) and "end_cursor" in page_info:
+                return page_info
+            stack.extend(reversed(list(value.values())))
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+    return None
+
+
+def _text(value):
+    if isinstance(value, dict):
+        value = value.get("formatted_amount") or value.get("text")
+    if value is None or value == "":
+        return None
+    return str(value)
+
+
+def listing_from_node(node):
+    """
+    Map a listing node onto the listing schema of the parser backends.
+
+    The price is the current price followed by the strikethrough price, if
+    any, as displayed on the listing card.
+
+    Args:
+        node (dict): A listing node of the payloads.
+
+    Returns:
+        dict: The ``href``, ``title``, ``price``, ``location`` and
+        ``item_number`` of the listing, "None" for missing fields.
+    """
+    item_number = str(node["id"])
+    price = _text(node.get("listing_price"))
+    strikethrough = _text(node.get("strikethrough_price"))
+    if price and strikethrough:
+        price += strikethrough
+
+    geocode = (node.get("location") or {}).get("reverse_geocode") or {}
+    location = ", ".join(
+        part for part in (geocode.get("city"), geocode.get("state")) if part
+    )
+
+    title = node.get("custom_title") or node.get(LISTING_TITLE_KEY)
+    return {
+        "href": f"/marketplace/item/{item_number}/",
+        "title": title.replace("\n", " ").strip() if title else "None",
+        "price": price.strip() if price else "None",
+        "location": location or "None",
+        "item_number": item_number,
+    }
+
+
+def parse_listing_payload(body):
+    """
+    Decode the listings of a response body.
+
+    Args:
+        body (str | bytes): The response body.
+
+    Returns:
+        List[dict]: The listings, see ``listing_from_node``.
+    """
+    return [
+        listing_from_node(node)
+        for document in decode_payloads(body)
+        for node in iter_listing_nodes(document)
+    ]
+
+
+def extract_embedded_payloads(html):
+    """
+    Get the JSON scripts of a page that hold listings.
+
+    Args:
+        html (str): The page HTML.
+
+    Returns:
+        List[str]: The script contents.
+    """
+    return [
+        text
+        for node in HTMLParser(html).css('script[type="application/json"]')
+        if LISTING_TITLE_KEY in (text := node.text())
+    ]
+
+
+class ListingPayloadCollector:
+    """
+    Listings decoded from the payloads of a page, deduplicated by item
+    number in arrival order.
+
+    Attributes:
+        end_cursor (str): The cursor of the last page of results received.
+        has_next_page (bool): Whether more results follow, None until a
+            payload held the pagination state.
+    """
+
+    def __init__(self):
+        self._listings = {}
+        self.end_cursor = None
+        self.has_next_page = None
+
+    def add_payload(self, body):
+        """
+        Decode a payload and keep its listings not seen yet.
+
+        Args:
+            body (str | bytes): A response body or embedded script.
+
+        Returns:
+            int: The number of new listings.
+        """
+        count = len(self._listings)
+        for document in decode_payloads(body):
+            for node in iter_listing_nodes(document):
+                listing = listing_from_node(node)
+                self._listings.setdefault(listing["item_number"], listing)
+            page_info = find_page_info(document)
+            if page_info is not None:
+                self.end_cursor = page_info["end_cursor"]
+                self.has_next_page = bool(page_info.get("has_next_page"))
+        return len(self._listings) - count
+
+    @property
+    def listings(self):
+        return list(self._listings.values())
+
+    def __len__(self):
+        return len(self._listings)
+
+
+if __name__ == "__main__":
+    # Decode recorded payloads, e.g. to check the mapping after a change of
+    # the Marketplace schema
+    arg_parser = argparse.ArgumentParser(
+        description="Decode recorded Marketplace payloads into listings"
+    )
+    arg_parser.add_argument(
+        "paths", nargs="+", help="Recorded response bodies or HTML pages"
+    )
+    args = arg_parser.parse_args()
+
+    collector = ListingPayloadCollector()
+    for pattern in args.paths:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "r", encoding="utf-8") as f:
+                body = f.read()
+            payloads = (
+                extract_embedded_payloads(body)
+                if path.endswith((".html", ".htm"))
+                else [body]
+            )
+            for payload in payloads:
+                collector.add_payload(payload)
+    for listing in collector.listings:
+        print(json.dumps(listing, ensure_ascii=False))
@@ -0,0 +1,257 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from selectolax.parser import HTMLParser
+
+from core.config import settings
+from core.logging import setup_logging
+from services.parser_backends import (
+    get_parser_backend,
+    record_selector_sources,
+)
+from utils.metrics import merge_metrics, pop_metrics
+from utils.selectors import (
+    LISTING_LINK_SELECTOR,
+    SelectorSet,
+    selector_registry,
+)
+
+logger = setup_logging()
+
+PROCESS = "process"
+THREAD = "thread"
+INLINE = "inline"
+
+# Set in the worker processes only
+_in_worker_process = False
+
+
+def _init_worker():
+    global _in_worker_process
+    _in_worker_process = True
+
+
+def _warm_up():
+    # Import the parsing modules (LLM tokenizers included) ahead of the
+    # first request
+    import services.parser  # noqa: F401
+
+    return os.getpid()
+
+
+def _call(func, args):
+    # Metrics observed in a worker process are handed back to the parent
+    result = func(*args)
+    return result, pop_metrics() if _in_worker_process else None
+
+
+def split_listing_chunks(html, selector_set, chunk_size):
+    """
+    Split a results page into documents of at most ``chunk_size`` listing
+    cards.
+
+    Args:
+        html (str): The page HTML.
+        selector_set (SelectorSet): The selectors locating the cards.
+        chunk_size (int): Maximum listing cards per chunk.
+
+    Returns:
+        List[str] | None: The chunk documents, or None when the page holds
+        no more than ``chunk_size`` cards.
+    """
+    tree = HTMLParser(html)
+    nodes = tree.css(selector_set.listing_selector) or tree.css(
+        LISTING_LINK_SELECTOR
+    )
+    if len(nodes) <= chunk_size:
+        return None
+    return [
+        "<html><body>"
+        + "".join(node.html for node in nodes[start : start + chunk_size])
+        + "</body></html>"
+        for start in range(0, len(nodes), chunk_size)
+    ]
+
+
+def extract_listings_chunk(html, backend_name, include_html, selector_set_data):
+    """
+    Extract the listings of a page or page chunk in a worker.
+
+    The selector set is passed as a dict so the worker process uses the
+    selectors of the serving process.
+    """
+    return get_parser_backend(backend_name)(
+        html,
+        include_html=include_html,
+        selector_set=SelectorSet.from_dict(selector_set_data),
+    )
+
+
+def extract_or_split(
+    html, backend_name, include_html, selector_set_data, chunk_size
+):
+    # Pages small enough for one worker are extracted right away
+    selector_set = SelectorSet.from_dict(selector_set_data)
+    chunks = None
+    if chunk_size > 0:
+        chunks = split_listing_chunks(html, selector_set, chunk_size)
+    if chunks is not None:
+        return None, chunks
+    return (
+        extract_listings_chunk(
+            html, backend_name, include_html, selector_set_data
+        ),
+        None,
+    )
+
+
+class ParsePool:
+    """
+    Warm pool of workers running the CPU-bound parsing off the event loop.
+
+    Listing extraction, LLM input compaction and feature engineering are
+    submitted to a process (or thread) pool so requests keep being served
+    while a page is parsed. Pages with more than ``chunk_size`` listing cards
+    are split into chunks extracted in parallel.
+
+    Attributes:
+        kind (str): "process", "thread" or "inline" (on the event loop).
+        workers (int): Number of workers.
+        chunk_size (int): Maximum listing cards per chunk, 0 to never split.
+    """
+
+    def __init__(self, kind, workers, chunk_size):
+        self.kind = kind.lower()
+        self.workers = workers
+        self.chunk_size = chunk_size
+        if self.kind not in (PROCESS, THREAD, INLINE):
+            raise ValueError(f"{kind} is not a supported parse executor")
+
+        self._executor = None
+
+    async def start(self):
+        """
+        Create the executor and start every worker.
+        """
+        if self.kind == INLINE or self._executor is not None:
+            return
+        if self.kind == PROCESS:
+            # Forking would copy the event loop and the Playwright threads
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="parse"
+            )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, _warm_up)
+                for _ in range(self.workers)
+            )
+        )
+        logger.info(f"Parse pool started: {self.workers} {self.kind} workers")
+
+    async def stop(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(
+                executor.shutdown, wait=True, cancel_futures=True
+            )
+
+    async def run(self, func, *args):
+        """
+        Run a function in the pool.
+
+        Args:
+            func (Callable): A module-level function (it is pickled by
+                reference for worker processes).
+            *args: Its arguments.
+
+        Returns:
+            The function result.
+        """
+        if self.kind == INLINE:
+            return func(*args)
+        if self._executor is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            result, metrics = await loop.run_in_executor(
+                self._executor, _call, func, args
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory): start afresh next time
+            logger.error("Parse pool broken, restarting it on the next call")
+            self._executor = None
+            raise
+        if metrics:
+            merge_metrics(metrics)
+        return result
+
+    async def extract_listings(
+        self,
+        html,
+        backend_name,
+        include_html=False,
+        selector_set=None,
+        record=True,
+    ):
+        """
+        Extract the listings of a results page with a parser backend.
+
+        Args:
+            html (str): The page HTML.
+            backend_name (str): The parser backend, see
+                ``get_parser_backend``.
+            include_html (bool, optional): Whether to keep the card HTML.
+            selector_set (SelectorSet, optional): The selectors to use.
+                Defaults to the active ones.
+            record (bool, optional): Whether to count the field sources in
+                the selector registry. Defaults to True.
+
+        Returns:
+            List[dict]: The listings, in page order.
+        """
+        selector_set = selector_set or selector_registry.active
+        selector_set_data = selector_set.to_dict()
+        # Chunks only pay off when they run in parallel
+        chunk_size = 0 if self.kind == INLINE else self.chunk_size
+        listings, chunks = await self.run(
+            extract_or_split,
+            html,
+            backend_name,
+            include_html,
+            selector_set_data,
+            chunk_size,
+        )
+        if chunks is not None:
+            parts = await asyncio.gather(
+                *(
+                    self.run(
+                        extract_listings_chunk,
+                        chunk,
+                        backend_name,
+                        include_html,
+                        selector_set_data,
+                    )
+                    for chunk in chunks
+                )
+            )
+            listings = [listing for part in parts for listing in part]
+        if record:
+            record_selector_sources(listings, selector_set)
+        return listings
+
+
+parse_pool = ParsePool(
+    kind=settings.PARSE_EXECUTOR,
+    workers=settings.PARSE_WORKERS,
+    chunk_size=settings.PARSE_CHUNK_SIZE,
+)
@@ -1,177 +1,350 @@
+import asyncio
 import datetime
 import logging
-import asyncio
 import pandas as pd
-from bs4 import BeautifulSoup
-from services.llm import get_single_post_data_using_llm
-from rich import print
+from core.config import settings
+from services.listing_index import listing_index
+from services.llm import aget_posts_data_using_llm, count_tokens
+from services.parse_pool import parse_pool
+from services.parser_backends import (
+    extract_card_fields,
+    get_parser_backend,
+    record_selector_sources,
+    selector_hit_rate,
+)
+from services.prices import parse_prices
+from services.storage import BRONZE, SILVER, append_crawl
+from utils.html_utils import compact_html
+from utils.metrics import span
+from utils.selectors import selector_registry
 
 logger = logging.getLogger(__name__)
 
 
-def parse_facebook_marketplace_listings(html, param_dict):
+async def parse_facebook_marketplace_listings(
+    html, param_dict, on_record=None
+):
     strategy_param = param_dict["strategy"]
     llm_choice_param = param_dict["llm_choice"]
     model_name_param = param_dict["model_name"]
-
-    soup = BeautifulSoup(html, "html.parser")
+    parser_backend = (
+        param_dict.get("parser_backend") or settings.PARSER_BACKEND
+    )
+    # Fail on an unknown backend before anything is submitted to the pool
+    get_parser_backend(parser_backend)
+    if strategy_param not in ("LLM", "CSS"):
+        raise ValueError("Invalid parsing method")
 
     logger.info("Getting HTML of all posts")
-    soup_posts = soup.find_all(
-        "div",
-        class_="x9f619 x78zum5 x1r8uery xdt5ytf x1iyjqo2 xs83m0k x1e558r4 x150jy0e x1iorvi4 xjkvuk6 xnpuxes x291uyu x1uepa24",
-    )
+    with span("parse", backend=parser_backend):
+        listings = await parse_pool.extract_listings(
+            html, parser_backend, include_html=strategy_param == "LLM"
+        )
 
-    result = []
-    posts_count = len(soup_posts)
-
-    if posts_count > 0:
-        logger.info("Iterating through {} posts".format(posts_count))
-        for idx, soup_single_post in enumerate(soup_posts):
-            print("# ----------------------------------------------------")
-
-            empty_divs = find_empty_html_divs(soup_single_post)
-            if empty_divs:
-                continue
-            else:
-                pass
-            logger.info(
-                "Extracting metadata from a single HTML post %d", idx + 1
-            )
+    posts_count = len(listings)
+    if posts_count == 0:
+        logger.warn("No listing found")
+        return pd.DataFrame()
 
-            try:
-                url_post = "https://www.facebook.com" + soup_single_post.find(
-                    "a"
-                ).get("href")
-                print(url_post)
-            except:
-                print(soup_single_post)
-                url_post = ""
-
-            if strategy_param == "LLM":
-                logger.info("Extracting post's data using LLM chain")
-                try:
-                    html = soup_single_post.prettify()
-                    post_data = get_single_post_data_using_llm(
-                        html, llm_choice_param, model_name_param
-                    )
-                    asyncio.sleep(2)
-                    print(post_data)
-                    title = post_data.get("title")
-                    price = post_data.get("price")
-                    location = post_data.get("location")
-                    item_number = post_data.get("item_number")
-                except:
-                    title = "None"
-                    price = "None"
-                    location = "None"
-                    item_number = "None"
-
-            elif strategy_param == "CSS":
-                logger.info("Extracting post's data using CSS Extractor")
-                html_content = soup_single_post.prettify()
-                title, price, location, item_number = (
-                    get_single_post_data_using_css(html_content)
-                )
-            else:
-                raise ValueError("Invalid parsing method")
-
-            logger.info("Update dictionary with extracted listing data")
-            result.append(
-                {
-                    "title": title,
-                    "price": price,
-                    "location": location,
-                    "item_number": item_number,
-                    "url": url_post,
-                    "date": datetime.date.today(),
-                }
+    logger.info("Iterating through {} posts".format(posts_count))
+    listings = [listing for listing in listings if not listing["empty"]]
+    if strategy_param == "CSS":
+        with span("css_extraction"):
+            listings = await heal_selectors(
+                html, listings, param_dict, parser_backend
             )
 
-        df = pd.DataFrame(result)
-
-        if not df.empty:
-            logger.info("Crawler returned data")
-
-            filepath = f"data/results_bronze.csv"
-            logger.info("Saving dataframe to CSV: Bronze")
-            df.to_csv(filepath, index=False)
-
-            logger.info("Saving dataframe to CSV: Silver")
-            df = features_engineering(filepath)
+    city_param = param_dict.get("city")
+    query_param = param_dict.get("query")
+    incremental = param_dict.get("incremental", False)
+    if incremental:
+        # Only the new or changed listings go through extraction
+        listings, fingerprints = await asyncio.to_thread(
+            listing_index.select_changed, city_param, query_param, listings
+        )
 
-            filepath = f"data/results_silver.csv"
-            df.to_csv(filepath, index=False)
-        return df
+    if strategy_param == "LLM":
+        logger.info("Extracting posts' data using LLM chain")
+        with span("llm_extraction", model=model_name_param or ""):
+            posts_data = await aget_posts_data_using_llm(
+                await parse_pool.run(
+                    compact_listings_html, listings, param_dict
+                ),
+                llm_choice_param,
+                model_name_param,
+                param_dict.get("llm_max_concurrency"),
+                param_dict.get("llm_batching", False),
+            )
+        if selector_hit_rate(listings) < settings.SELECTOR_MIN_HIT_RATE:
+            # The LLM labels teach the CSS path its new selectors
+            await learn_selectors(listings, posts_data)
     else:
-        logger.warn("No listing found")
-        return pd.DataFrame()
+        logger.info("Extracting posts' data using CSS Extractor")
+        posts_data = listings
+
+    return await save_listings(
+        listings,
+        posts_data,
+        param_dict,
+        on_record,
+        fingerprints if incremental else None,
+    )
 
 
-def find_empty_html_divs(soup):
-    div_tags = soup.find_all("div")
-    empty_divs = [div for div in div_tags if not div.contents]
-    return empty_divs
+async def parse_marketplace_payload_listings(
+    listings, param_dict, on_record=None
+):
+    """
+    Save the listings decoded from the Marketplace JSON payloads.
+
+    The payloads already hold every field, so there is no DOM parsing nor
+    LLM extraction; incremental crawls still skip the unchanged listings.
+
+    Args:
+        listings (List[dict]): The listings from
+            ``capture_marketplace_listings``.
+        param_dict (dict): The crawl parameters.
+        on_record (Callable, optional): Called with each record.
+
+    Returns:
+        DataFrame: The records with their price features.
+    """
+    fingerprints = None
+    if param_dict.get("incremental", False):
+        listings, fingerprints = await asyncio.to_thread(
+            listing_index.select_changed,
+            param_dict.get("city"),
+            param_dict.get("query"),
+            listings,
+        )
+    logger.info(f"Saving {len(listings)} listings decoded from payloads")
+    return await save_listings(
+        listings, listings, param_dict, on_record, fingerprints
+    )
 
 
-def get_single_post_data_using_css(html):
-    try:
-        soup = BeautifulSoup(html, "html.parser")
-        item_div = soup.find("div", class_="x9f619")
+async def save_listings(
+    listings, posts_data, param_dict, on_record=None, fingerprints=None
+):
+    """
+    Build the records of the extracted listings and save them.
+
+    Args:
+        listings (List[dict]): The listings, for their ``href``.
+        posts_data (List[dict | None]): The extracted fields of each
+            listing, None when the extraction failed.
+        param_dict (dict): The crawl parameters.
+        on_record (Callable, optional): Called with each record.
+        fingerprints (Dict[str, str], optional): The fingerprints of an
+            incremental crawl, to update the listing index with.
+
+    Returns:
+        DataFrame: The records with their price features.
+    """
+    city_param = param_dict.get("city")
+    query_param = param_dict.get("query")
+    crawl_id = param_dict.get("crawl_id")
+    result = []
+    changed_records = {}
+    for listing, post_data in zip(listings, posts_data):
+        href = listing["href"]
+        url_post = settings.MARKETPLACE_BASE_URL + href if href else ""
+        extracted = post_data is not None
+        post_data = post_data or {}
+
+        record = {
+            "title": post_data.get("title", "None"),
+            "price": post_data.get("price", "None"),
+            "location": post_data.get("location", "None"),
+            "item_number": post_data.get("item_number", "None"),
+            "url": url_post,
+            "date": datetime.date.today(),
+        }
+        result.append(record)
+        if extracted:
+            # Failed extractions are retried on the next incremental crawl
+            changed_records[listing["item_number"]] = record
+        if on_record is not None:
+            on_record(record)
+
+    if fingerprints is not None:
+        with span("storage_write"):
+            await asyncio.to_thread(
+                listing_index.update,
+                city_param,
+                query_param,
+                fingerprints,
+                changed_records,
+            )
 
-        title_element = item_div.find(
-            "span", class_="x1lliihq x6ikm8r x10wlt62 x1n2onr6"
+    df = pd.DataFrame(result)
+
+    if not df.empty:
+        logger.info("Crawler returned data")
+        logger.info("Saving dataframe to Parquet: Bronze")
+        await asyncio.to_thread(
+            append_crawl, df, BRONZE, city_param, query_param, crawl_id
         )
-        title = (
-            title_element.text.replace("\n", " ").strip()
-            if title_element
-            else "None"
+
+        logger.info("Saving dataframe to Parquet: Silver")
+        with span("feature_engineering"):
+            df = add_price_features(
+                df, await parse_pool.run(parse_prices, df["price"])
+            )
+        await asyncio.to_thread(
+            append_crawl, df, SILVER, city_param, query_param, crawl_id
         )
+    return df
 
-        price_element = item_div.find("span", class_="x193iq5w")
-        price = price_element.text.strip() if price_element else "None"
 
-        location_element = item_div.find("span", class_="x1nxh6w3")
-        location = (
-            location_element.text.strip() if location_element else "None"
+async def heal_selectors(html, listings, param_dict, parser_backend):
+    """
+    Learn new selectors when the active ones miss too many fields.
+
+    A handful of listings are labelled with the LLM of the request, if any,
+    and the learned selector set is used to extract the page again. The
+    selector sources of the page were already recorded by its first
+    extraction, so the extractions here are not counted.
+
+    Returns:
+        List[dict]: The listings, extracted again with the learned selectors
+        if a better set was found.
+    """
+    hit_rate = selector_hit_rate(listings)
+    if not listings or hit_rate >= settings.SELECTOR_MIN_HIT_RATE:
+        return listings
+
+    version = selector_registry.active.version
+    logger.warning(f"Selectors {version} only found {hit_rate:.0%} of fields")
+    llm_choice_param = param_dict.get("llm_choice")
+    model_name_param = param_dict.get("model_name")
+    if not (llm_choice_param and model_name_param):
+        logger.warning("No LLM given to relabel listings, using fallbacks")
+        return listings
+
+    samples = [
+        listing
+        for listing in await parse_pool.extract_listings(
+            html, parser_backend, include_html=True, record=False
         )
-
-        item_number_element = item_div.find("a")
-        item_number = (
-            item_number_element["href"].split("/")[-2]
-            if item_number_element
-            else "None"
+        if not listing["empty"]
+    ][: settings.SELECTOR_LEARN_SAMPLES]
+    labels = await aget_posts_data_using_llm(
+        await parse_pool.run(compact_listings_html, samples, param_dict),
+        llm_choice_param,
+        model_name_param,
+    )
+    selector_set = await learn_selectors(samples, labels)
+    if selector_set is None:
+        return listings
+    return [
+        listing
+        for listing in await parse_pool.extract_listings(
+            html, parser_backend, selector_set=selector_set, record=False
         )
+        if not listing["empty"]
+    ]
+
+
+async def learn_selectors(listings, posts_data):
+    """
+    Learn a selector set from listings labelled by the LLM, off the event
+    loop.
+
+    Args:
+        listings (List[dict]): Listings with their card ``html``.
+        posts_data (List[dict]): The LLM extraction of each listing (None
+            when it failed).
+
+    Returns:
+        SelectorSet | None: The adopted selector set, or None.
+    """
+    samples = [
+        (listing["html"], post_data)
+        for listing, post_data in zip(listings, posts_data)
+        if post_data
+    ][: settings.SELECTOR_LEARN_SAMPLES]
+    selector_set = await asyncio.to_thread(
+        selector_registry.learn, samples, extract_card_fields
+    )
+    if selector_set is not None:
+        logger.info(f"Adopted learned selectors {selector_set.version}")
+    return selector_set
 
-        return title, price, location, item_number
-    except Exception as e:
-        print("An error occurred:", e)
 
+def compact_listings_html(listings, param_dict):
+    """
+    Minimise the HTML of each listing before LLM extraction and log the
+    prompt tokens saved per post.
 
-def features_engineering(filepath):
-    df = pd.read_csv(filepath)
+    The mode comes from ``param_dict["llm_compaction"]`` or
+    ``LLM_HTML_COMPACTION``: "html" (compact HTML), "text" (compact text with
+    link markers) or "none".
 
-    def clean_price(price):
-        if "Gratuit" in price:
-            return 0
-        clean_price = (
-            price.replace("€", "")
-            .replace("$", "")
-            .replace(" ", "")
-            .replace(",", "")
-        )
-        return pd.to_numeric(clean_price, errors="coerce")
+    Returns:
+        List[str]: The model input of each listing.
+    """
+    mode = param_dict.get("llm_compaction") or settings.LLM_HTML_COMPACTION
+    mode = mode.lower()
+    if mode not in ("html", "text", "none"):
+        raise ValueError(f"{mode} is not a supported LLM compaction mode")
 
-    df["cleaned_price"] = df["price"].apply(clean_price)
+    model_name_param = param_dict["model_name"]
+    htmls = []
+    tokens_before_total, tokens_after_total = 0, 0
+    for idx, listing in enumerate(listings):
+        html = listing["html"]
+        if mode != "none":
+            html = compact_html(html, as_text=mode == "text")
+        htmls.append(html)
+
+        tokens_before = count_tokens(listing["html"], model_name_param)
+        tokens_after = count_tokens(html, model_name_param)
+        tokens_before_total += tokens_before
+        tokens_after_total += tokens_after
+        logger.info(
+            "Post %d prompt tokens: %d -> %d",
+            idx + 1,
+            tokens_before,
+            tokens_after,
+        )
 
-    prices = df["price"].str.extract(r"[$€]\s*([\d,]+)\s*[$€]?\s*([\d,]*)")
-    df["price_before"] = pd.to_numeric(
-        prices[1].str.replace(",", ""), errors="coerce"
+    logger.info(
+        "Prompt tokens with '%s' compaction: %d -> %d",
+        mode,
+        tokens_before_total,
+        tokens_after_total,
     )
-    df["price_after"] = pd.to_numeric(
-        prices[0].str.replace(",", ""), errors="coerce"
+    return htmls
+
+
+def get_single_post_data_using_css(html):
+    """
+    Extract title, price, location and item number from a single post HTML.
+
+    Returns:
+        tuple: The title, price, location and item number, each "None" when
+        not found.
+    """
+    listings = get_parser_backend(settings.PARSER_BACKEND)(html)
+    record_selector_sources(listings)
+    if not listings:
+        return "None", "None", "None", "None"
+    listing = listings[0]
+    return (
+        listing["title"],
+        listing["price"],
+        listing["location"],
+        listing["item_number"],
     )
 
-    df["price_difference"] = df["price_after"]
-    df["price_difference"] = df["price_before"] - df["price_after"]
+
+def features_engineering(df):
+    return add_price_features(df, parse_prices(df["price"]))
+
+
+def add_price_features(df, prices):
+    df = df.copy()
+    for column in prices.columns:
+        df[column] = prices[column]
     return df
@@ -0,0 +1,343 @@
+import time
+
+from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from selectolax.parser import HTMLParser
+
+from utils.html_utils import iter_descendants
+from utils.metrics import observe_post_extraction
+from utils.selectors import (
+    FALLBACK,
+    FIELDS,
+    LISTING_LINK_SELECTOR,
+    MISS,
+    SELECTOR,
+    selector_registry,
+    structural_fields,
+)
+
+
+def item_number_from_href(href):
+    """
+    Derive the marketplace item number from a listing href.
+
+    Args:
+        href (str): The listing href (e.g. "/marketplace/item/123/?ref=...").
+
+    Returns:
+        str: The item number, or "None" if there is no href.
+    """
+    return href.split("/")[-2] if href else "None"
+
+
+def _listing_record(found, card_html, html=None):
+    # Fields missed by the selectors are read from the card structure
+    sources = dict.fromkeys(FIELDS, SELECTOR)
+    missing = [field for field in FIELDS if found[field] is None]
+    if missing and not found["empty"]:
+        structure = structural_fields(card_html())
+        for field in missing:
+            found[field] = structure[field]
+            sources[field] = FALLBACK if found[field] is not None else MISS
+
+    href, title, price, location = (
+        found["href"],
+        found["title"],
+        found["price"],
+        found["location"],
+    )
+    record = {
+        "href": href,
+        "title": title.replace("\n", " ").strip() if title else "None",
+        "price": price.strip() if price else "None",
+        "location": location.strip() if location else "None",
+        "item_number": item_number_from_href(href),
+        "empty": found["empty"],
+        "sources": sources,
+    }
+    if html is not None:
+        record["html"] = html
+    return record
+
+
+def _extract_card(scan, node, selector_set, check_empty, card_html, html):
+    # Scan and fallback of a single card, timed as one CSS extraction
+    start_time = time.perf_counter()
+    record = _listing_record(
+        scan(node, selector_set, check_empty), card_html, html
+    )
+    observe_post_extraction("css", time.perf_counter() - start_time)
+    return record
+
+
+def record_selector_sources(listings, selector_set=None):
+    """
+    Count, in the selector registry, where the fields of the listings came
+    from.
+
+    Kept apart from the extraction so listings parsed in a worker process are
+    counted in the serving process.
+
+    Args:
+        listings (List[dict]): Listings returned by a parser backend.
+        selector_set (SelectorSet, optional): The selector set the listings
+            were extracted with. Defaults to the active one.
+    """
+    selector_set = selector_set or selector_registry.active
+    selector_registry.record(
+        selector_set.version,
+        (listing["sources"] for listing in listings if not listing["empty"]),
+    )
+
+
+def scan_listing_selectolax(node, selector_set, check_empty=True):
+    """
+    Gather the fields of a listing card in a single traversal.
+
+    The first link and the first element matched by the selectors of each
+    field are kept, in document order. The traversal stops at the first
+    empty div, since empty placeholder cards are discarded anyway.
+
+    Args:
+        node (selectolax.parser.Node): The listing card node.
+        selector_set (SelectorSet): The selectors of the fields.
+        check_empty (bool, optional): Whether to look for empty divs.
+            Defaults to True.
+
+    Returns:
+        dict: The ``href``, ``title``, ``price`` and ``location`` found (None
+        when missing) and whether the card is ``empty``.
+    """
+    found = {"href": None, "title": None, "price": None, "location": None}
+    if node.tag == "a":
+        found["href"] = node.attributes.get("href") or ""
+    tags = selector_set.tags
+    for child in iter_descendants(node):
+        tag = child.tag
+        if tag == "a":
+            if found["href"] is None:
+                found["href"] = child.attributes.get("href") or ""
+        elif tag == "div" and check_empty and child.child is None:
+            return {**found, "empty": True}
+        if tag in tags:
+            field = selector_set.field_of(tag, child.attributes.get("class"))
+            if field is not None and found[field] is None:
+                found[field] = child.text()
+    return {**found, "empty": False}
+
+
+def scan_listing_lxml(node, selector_set, check_empty=True):
+    """
+    Gather the fields of a listing card in a single traversal.
+
+    See ``scan_listing_selectolax``.
+
+    Args:
+        node (lxml.html.HtmlElement): The listing card element.
+        selector_set (SelectorSet): The selectors of the fields.
+        check_empty (bool, optional): Whether to look for empty divs.
+            Defaults to True.
+
+    Returns:
+        dict: The fields found and whether the card is ``empty``.
+    """
+    found = {"href": None, "title": None, "price": None, "location": None}
+    tags = selector_set.tags
+    for child in node.iter():
+        tag = child.tag
+        if tag == "a":
+            if found["href"] is None:
+                found["href"] = child.get("href") or ""
+        elif (
+            tag == "div"
+            and check_empty
+            and child is not node
+            and len(child) == 0
+            and not child.text
+        ):
+            return {**found, "empty": True}
+        if tag in tags:
+            field = selector_set.field_of(tag, child.get("class"))
+            if field is not None and found[field] is None:
+                found[field] = child.text_content()
+    return {**found, "empty": False}
+
+
+def scan_listing_bs4(node, selector_set, check_empty=True):
+    """
+    Gather the fields of a listing card in a single traversal.
+
+    See ``scan_listing_selectolax``.
+
+    Args:
+        node (bs4.element.Tag): The listing card tag.
+        selector_set (SelectorSet): The selectors of the fields.
+        check_empty (bool, optional): Whether to look for empty divs.
+            Defaults to True.
+
+    Returns:
+        dict: The fields found and whether the card is ``empty``.
+    """
+    found = {"href": None, "title": None, "price": None, "location": None}
+    if node.name == "a":
+        found["href"] = node.get("href") or ""
+    tags = selector_set.tags
+    for child in node.descendants:
+        tag = child.name
+        if tag == "a":
+            if found["href"] is None:
+                found["href"] = child.get("href") or ""
+        elif tag == "div" and check_empty and not child.contents:
+            return {**found, "empty": True}
+        if tag in tags:
+            class_attr = " ".join(child.get("class") or ())
+            field = selector_set.field_of(tag, class_attr)
+            if field is not None and found[field] is None:
+                found[field] = child.text
+    return {**found, "empty": False}
+
+
+def extract_listings_selectolax(html, include_html=False, selector_set=None):
+    selector_set = selector_set or selector_registry.active
+    tree = HTMLParser(html)
+    nodes, check_empty = tree.css(selector_set.listing_selector), True
+    if not nodes:
+        nodes, check_empty = tree.css(LISTING_LINK_SELECTOR), False
+    return [
+        _extract_card(
+            scan_listing_selectolax,
+            node,
+            selector_set,
+            check_empty,
+            lambda: node.html,
+            html=node.html if include_html else None,
+        )
+        for node in nodes
+    ]
+
+
+def extract_listings_lxml(html, include_html=False, selector_set=None):
+    selector_set = selector_set or selector_registry.active
+    tree = lxml_html.fromstring(html)
+    nodes = tree.xpath(f'//div[@class="{selector_set.listing_class}"]')
+    check_empty = True
+    if not nodes:
+        nodes = tree.xpath('//a[contains(@href, "/marketplace/item/")]')
+        check_empty = False
+
+    def card_html(node):
+        return lxml_html.tostring(node, encoding="unicode")
+
+    return [
+        _extract_card(
+            scan_listing_lxml,
+            node,
+            selector_set,
+            check_empty,
+            lambda: card_html(node),
+            html=card_html(node) if include_html else None,
+        )
+        for node in nodes
+    ]
+
+
+def extract_listings_bs4(html, include_html=False, selector_set=None):
+    selector_set = selector_set or selector_registry.active
+    soup = BeautifulSoup(html, "html.parser")
+    nodes = soup.find_all("div", class_=selector_set.listing_class)
+    check_empty = True
+    if not nodes:
+        nodes, check_empty = soup.select(LISTING_LINK_SELECTOR), False
+    return [
+        _extract_card(
+            scan_listing_bs4,
+            node,
+            selector_set,
+            check_empty,
+            lambda: str(node),
+            html=str(node) if include_html else None,
+        )
+        for node in nodes
+    ]
+
+
+def extract_card_fields(card_html, selector_set):
+    """
+    Extract the fields of a single listing card with the selectors only.
+
+    Used to score selector sets against labelled cards, so neither the
+    structural fallback nor the hit-rate tracking is involved.
+
+    Args:
+        card_html (str): The HTML of the listing card.
+        selector_set (SelectorSet): The selectors to score.
+
+    Returns:
+        dict: The ``title``, ``price`` and ``location`` found.
+    """
+    tree = HTMLParser(card_html)
+    node = (
+        tree.css_first(selector_set.listing_selector)
+        or tree.css_first(LISTING_LINK_SELECTOR)
+        or tree.body
+    )
+    return scan_listing_selectolax(node, selector_set, check_empty=False)
+
+
+def selector_hit_rate(listings):
+    """
+    Share of the listing fields found by the selectors.
+
+    Args:
+        listings (List[dict]): Listings returned by a parser backend.
+
+    Returns:
+        float: The hit rate, 1.0 when there is no listing.
+    """
+    sources = [
+        source
+        for listing in listings
+        if not listing["empty"]
+        for source in listing["sources"].values()
+    ]
+    if not sources:
+        return 1.0
+    return sources.count(SELECTOR) / len(sources)
+
+
+PARSER_BACKENDS = {
+    "selectolax": extract_listings_selectolax,
+    "lxml": extract_listings_lxml,
+    "bs4": extract_listings_bs4,
+}
+
+
+def get_parser_backend(name):
+    """
+    Get the listing extraction function of a parser backend.
+
+    Every backend takes the HTML of a marketplace page and returns one dict
+    per listing card with the keys ``href``, ``title``, ``price``,
+    ``location``, ``item_number``, ``empty`` (whether the card holds an
+    empty placeholder div) and ``sources`` (whether each field came from the
+    selectors, the structural fallback or is missing), plus ``html`` (the
+    card outer HTML) when called with ``include_html=True``. The fields are
+    located with the active selector set of the registry unless another
+    ``selector_set`` is passed; when no card matches its listing selector,
+    the links to item pages are used as cards.
+    Field sources are counted in the registry with
+    ``record_selector_sources``.
+
+    Args:
+        name (str): The backend name ("selectolax", "lxml" or "bs4").
+
+    Returns:
+        Callable: The backend extraction function.
+    """
+    try:
+        return PARSER_BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(
+            f"{name} is not a supported parser backend. "
+            f"Choose one of {', '.join(PARSER_BACKENDS)}."
+        )
@@ -0,0 +1,120 @@
+import pandas as pd
+
+# Thousands separators: comma, dot, space, no-break and narrow no-break space
+THOUSANDS = r"[\s\u00a0\u202f.,]"
+
+# Currency symbol or code written before or after an amount
+CURRENCY = r"[^\d\s.,]{0,4}"
+
+
+def amount_pattern(name):
+    # "1,200", "1 200", "1.200,50", "12.5", "300"; the decimals go to their
+    # own group so no second pass is needed to tell both separators apart
+    return (
+        rf"(?P<{name}>\d{{1,3}}(?:{THOUSANDS}\d{{3}})+|\d+)"
+        rf"(?:[.,](?P<{name}_decimals>\d{{1,2}}))?"
+    )
+
+
+# Current price, optionally followed by the strikethrough original price
+PRICE_PATTERN = (
+    rf"^\s*(?P<currency_before>{CURRENCY})\s*{amount_pattern('price_after')}"
+    rf"\s*(?P<currency_after>{CURRENCY})"
+    rf"(?:\s*{CURRENCY}\s*{amount_pattern('price_before')})?"
+)
+
+FREE_PATTERN = r"(?i)\b(?:free|gratuit|gratis|kostenlos)\b"
+
+CURRENCY_CODES = {
+    "€": "EUR",
+    "EUR": "EUR",
+    "$": "USD",
+    "US$": "USD",
+    "USD": "USD",
+    "£": "GBP",
+    "GBP": "GBP",
+    "CA$": "CAD",
+    "C$": "CAD",
+    "CAD": "CAD",
+    "A$": "AUD",
+    "AUD": "AUD",
+    "¥": "JPY",
+    "JPY": "JPY",
+    "₹": "INR",
+    "INR": "INR",
+    "CHF": "CHF",
+}
+
+
+def to_amount(integers, decimals):
+    """
+    Convert the integer and decimal parts of amounts to floats.
+
+    Args:
+        integers (Series): Integer parts, thousands separators included.
+        decimals (Series): Decimal digits (missing when none).
+
+    Returns:
+        Series: The amounts as float64, NaN where missing.
+    """
+    digits = integers.str.replace(r"\D", "", regex=True)
+    return pd.to_numeric(
+        digits + "." + decimals.fillna("0"), errors="coerce"
+    ).astype("float64")
+
+
+def parse_unique_prices(prices):
+    parts = prices.str.extract(PRICE_PATTERN)
+
+    price_after = to_amount(parts["price_after"], parts["price_after_decimals"])
+    price_before = to_amount(
+        parts["price_before"], parts["price_before_decimals"]
+    )
+    is_free = prices.str.contains(FREE_PATTERN, regex=True).astype(bool)
+    is_free &= price_after.isna()
+
+    symbols = parts["currency_before"].where(
+        parts["currency_before"] != "", parts["currency_after"]
+    )
+    currency = symbols.str.upper().map(CURRENCY_CODES)
+
+    return pd.DataFrame(
+        {
+            "cleaned_price": price_after.mask(is_free, 0.0),
+            "price_before": price_before,
+            "price_after": price_after,
+            "price_difference": price_before - price_after,
+            "currency": currency,
+            "is_free": is_free,
+        }
+    )
+
+
+def parse_prices(prices):
+    """
+    Parse marketplace price strings in one vectorised pass.
+
+    Handles currency symbols and codes before or after the amount, locale
+    thousands/decimal separators, free items ("Free", "Gratuit", ...) and
+    discounted listings showing the current price followed by the
+    strikethrough original price (e.g. "€80€100"). Listings share few
+    distinct prices, so only the unique values are parsed.
+
+    Args:
+        prices (Series): Raw price strings (may hold None/NaN).
+
+    Returns:
+        DataFrame: Columns ``cleaned_price`` (current price, 0 for free
+        items), ``price_before`` (original price of a discounted listing),
+        ``price_after`` (current price), ``price_difference``, ``currency``
+        (ISO code) and ``is_free``, aligned on the index of ``prices``.
+    """
+    codes, uniques = pd.factorize(prices, use_na_sentinel=True)
+    # Missing prices get code -1, which picks the trailing empty row
+    uniques = pd.Series(list(uniques) + [""], dtype=object).astype(str)
+    parsed = parse_unique_prices(uniques)
+    parsed.loc[len(uniques) - 1, "is_free"] = False
+
+    result = parsed.iloc[codes].set_axis(prices.index)
+    result["currency"] = result["currency"].astype("string")
+    return result
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import struct
+import time
+from collections import OrderedDict
+
+import orjson
+
+from core.config import settings
+from core.logging import setup_logging
+from utils.misc import QueryParams
+
+logger = setup_logging()
+
+HIT = "HIT"
+STALE = "STALE"
+MISS = "MISS"
+COALESCED = "COALESCED"
+
+# Parameters that change the crawl results; headless only changes how the
+# browser runs
+CACHED_PARAMS = (
+    "city",
+    "query",
+    "max_price",
+    "itemCondition",
+    "strategy",
+    "llm_choice",
+    "model_name",
+    "scroll",
+    "max_listings",
+    "time_budget",
+    "llm_batching",
+)
+
+
+def result_cache_key(params: QueryParams):
+    """
+    Key crawl results on the normalised query parameters.
+
+    Args:
+        params (QueryParams): The query parameters.
+
+    Returns:
+        str: The hex SHA-256 key.
+    """
+    values = params.model_dump(include=set(CACHED_PARAMS))
+    for name in ("city", "query", "itemCondition", "llm_choice"):
+        if values[name] is not None:
+            values[name] = " ".join(values[name].split()).lower()
+    values["strategy"] = values["strategy"].upper()
+    values["max_price"] = float(values["max_price"])
+    if values["strategy"] != "LLM":
+        values.update(llm_choice=None, model_name=None, llm_batching=False)
+    if not values["scroll"]:
+        values.update(max_listings=None, time_budget=None)
+    payload = orjson.dumps(values, option=orjson.OPT_SORT_KEYS)
+    return "crawl:" + hashlib.sha256(payload).hexdigest()
+
+
+class CacheStatus:
+    """
+    How a result was served.
+
+    Attributes:
+        state (str): HIT, STALE, MISS or COALESCED.
+        age (float): Age of the result in seconds.
+    """
+
+    def __init__(self, state, age=0.0):
+        self.state = state
+        self.age = age
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU storage of cached results.
+
+    Attributes:
+        max_entries (int): Maximum number of entries.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at, expires_at = entry
+        if time.time() > expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, stored_at
+
+    async def set(self, key, value, stored_at, ttl):
+        self._entries[key] = (value, stored_at, stored_at + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def close(self):
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """
+    Storage of cached results in a Redis-compatible server.
+
+    Entries are stored as the packed storage time followed by the value,
+    with a server-side expiry.
+
+    Attributes:
+        url (str): The server URL, e.g. "redis://localhost:6379/0".
+    """
+
+    def __init__(self, url, client=None):
+        self.url = url
+        self._client = client
+
+    async def get(self, key):
+        data = await self._redis().get(key)
+        if data is None:
+            return None
+        (stored_at,) = struct.unpack_from("!d", data)
+        return data[8:], stored_at
+
+    async def set(self, key, value, stored_at, ttl):
+        data = struct.pack("!d", stored_at) + value
+        await self._redis().set(key, data, ex=max(1, int(ttl)))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError(
+                    "The redis result cache backend requires the redis package"
+                )
+            self._client = redis.from_url(self.url)
+        return self._client
+
+
+class ResultCache:
+    """
+    Cache of crawl results with stale-while-revalidate and coalescing of
+    identical in-flight crawls.
+
+    A result is served as is for ``fresh_ttl`` seconds. For ``stale_ttl``
+    more seconds it is still served, while a single background crawl
+    refreshes it. Concurrent misses on the same key share one crawl.
+
+    Attributes:
+        backend: The storage backend (memory or Redis), None to disable.
+        fresh_ttl (float): Seconds a result is fresh.
+        stale_ttl (float): Seconds a result may be served stale.
+    """
+
+    def __init__(self, backend, fresh_ttl, stale_ttl):
+        self.backend = backend
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+
+        self._inflight = {}
+
+    async def get_or_produce(self, key, produce, revalidate=None):
+        """
+        Get a result from the cache, or produce and cache it.
+
+        Args:
+            key (str): The cache key.
+            produce (Callable): Coroutine function producing the result as
+                bytes, or None when there is nothing worth caching.
+            revalidate (Callable, optional): Coroutine function refreshing a
+                stale result in the background. Defaults to ``produce``.
+
+        Returns:
+            Tuple[bytes | None, CacheStatus]: The result and how it was
+            served.
+        """
+        if self.backend is None:
+            return await produce(), CacheStatus(MISS)
+
+        entry = await self._get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age <= self.fresh_ttl:
+                return value, CacheStatus(HIT, age)
+            if age <= self.fresh_ttl + self.stale_ttl:
+                if key not in self._inflight:
+                    self._start(key, revalidate or produce)
+                return value, CacheStatus(STALE, age)
+
+        if key in self._inflight:
+            value = await asyncio.shield(self._inflight[key])
+            return value, CacheStatus(COALESCED)
+        value = await asyncio.shield(self._start(key, produce))
+        return value, CacheStatus(MISS)
+
+    def headers(self, status):
+        """
+        HTTP headers describing how a result was served.
+
+        Args:
+            status (CacheStatus): The cache status.
+
+        Returns:
+            dict: The ``X-Cache``, ``Age`` and ``Cache-Control`` headers.
+        """
+        max_age = max(0, int(self.fresh_ttl - status.age))
+        return {
+            "X-Cache": status.state,
+            "Age": str(int(status.age)),
+            "Cache-Control": (
+                f"max-age={max_age}, "
+                f"stale-while-revalidate={int(self.stale_ttl)}"
+            ),
+        }
+
+    async def close(self):
+        for task in self._inflight.values():
+            task.cancel()
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        if self.backend is not None:
+            await self.backend.close()
+
+    def _start(self, key, produce):
+        task = asyncio.create_task(self._produce(key, produce))
+        self._inflight[key] = task
+        task.add_done_callback(lambda task: self._done(key, task))
+        return task
+
+    def _done(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Crawl of {key} failed: {task.exception()}")
+
+    async def _produce(self, key, produce):
+        value = await produce()
+        if value is not None:
+            try:
+                await self.backend.set(
+                    key, value, time.time(), self.fresh_ttl + self.stale_ttl
+                )
+            except Exception as e:
+                logger.error(f"Could not cache result {key}: {e}")
+        return value
+
+    async def _get(self, key):
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Result cache unavailable: {e}")
+            return None
+
+
+def create_result_cache_backend(name):
+    """
+    Create the result cache storage backend.
+
+    Args:
+        name (str): "memory", "redis" or "none".
+
+    Returns:
+        The backend, or None when caching is disabled.
+    """
+    name = name.lower()
+    if name == "memory":
+        return MemoryCacheBackend(settings.RESULT_CACHE_MAX_ENTRIES)
+    if name == "redis":
+        return RedisCacheBackend(settings.RESULT_CACHE_URL)
+    if name == "none":
+        return None
+    raise ValueError(f"{name} is not a supported result cache backend")
+
+
+result_cache = ResultCache(
+    backend=create_result_cache_backend(settings.RESULT_CACHE_BACKEND),
+    fresh_ttl=settings.RESULT_CACHE_FRESH_TTL,
+    stale_ttl=settings.RESULT_CACHE_STALE_TTL,
+)
@@ -0,0 +1,178 @@
+import argparse
+import datetime
+import os
+import urllib.parse
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from core.config import settings
+from core.logging import setup_logging
+from utils.metrics import timed
+
+logger = setup_logging()
+
+BRONZE = "bronze"
+SILVER = "silver"
+PARTITION_KEYS = ("crawl_date", "city", "query")
+
+
+def dataset_path(dataset):
+    """
+    Get the directory of a Parquet dataset.
+
+    Args:
+        dataset (str): The dataset name ("bronze" or "silver").
+
+    Returns:
+        str: The dataset root directory.
+    """
+    return os.path.join(settings.STORAGE_DIR, dataset)
+
+
+def partition_path(dataset, city, query, crawl_date=None):
+    """
+    Get the hive-style partition directory of a crawl.
+
+    Args:
+        dataset (str): The dataset name.
+        city (str): The crawled city.
+        query (str): The search query.
+        crawl_date (datetime.date, optional): The crawl date. Defaults to
+            today.
+
+    Returns:
+        str: The partition directory.
+    """
+    values = {
+        "crawl_date": (crawl_date or datetime.date.today()).isoformat(),
+        "city": city,
+        "query": query,
+    }
+    segments = [
+        f"{key}={urllib.parse.quote(str(values[key]), safe='')}"
+        for key in PARTITION_KEYS
+    ]
+    return os.path.join(dataset_path(dataset), *segments)
+
+
+def write_atomic(table, directory, file_id=None):
+    """
+    Write a table as a new Parquet file, atomically.
+
+    The file is written under a temporary name in the target directory and
+    renamed once complete, so readers never see a partial file and
+    concurrent writers never overwrite each other.
+
+    Args:
+        table (pyarrow.Table): The table to write.
+        directory (str): The partition directory.
+        file_id (str, optional): Names the file, replacing the file written
+            with the same id. Defaults to a new id.
+
+    Returns:
+        str: The path of the written file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-{file_id or uuid.uuid4().hex}.parquet"
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    path = os.path.join(directory, name)
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+@timed("storage_write")
+def append_crawl(df, dataset, city, query, crawl_id=None):
+    """
+    Append the results of a crawl to a Parquet dataset.
+
+    Args:
+        df (DataFrame): The crawl results.
+        dataset (str): The dataset name ("bronze" or "silver").
+        city (str): The crawled city.
+        query (str): The search query.
+        crawl_id (str, optional): The crawl id, e.g. of a job, so a job
+            delivered twice writes its results once.
+
+    Returns:
+        str: The path of the written file.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    path = write_atomic(
+        table, partition_path(dataset, city, query), file_id=crawl_id
+    )
+    logger.info(f"Saved {len(df)} rows to {path}")
+    return path
+
+
+def read_dataset(dataset, row_filter=None):
+    """
+    Read a Parquet dataset, partition columns included.
+
+    Args:
+        dataset (str): The dataset name.
+        row_filter (pyarrow.dataset.Expression, optional): Row filter, e.g.
+            ``ds.field("city") == "Paris"``.
+
+    Returns:
+        DataFrame: The matching rows.
+    """
+    parquet_dataset = ds.dataset(
+        dataset_path(dataset), format="parquet", partitioning="hive"
+    )
+    return parquet_dataset.to_table(filter=row_filter).to_pandas()
+
+
+def compact(dataset, min_files=2):
+    """
+    Merge the small files of every partition into a single file.
+
+    Args:
+        dataset (str): The dataset name.
+        min_files (int, optional): Minimum files in a partition to compact
+            it. Defaults to 2.
+
+    Returns:
+        int: The number of compacted partitions.
+    """
+    compacted = 0
+    for directory, _, filenames in os.walk(dataset_path(dataset)):
+        files = sorted(
+            os.path.join(directory, f)
+            for f in filenames
+            if f.endswith(".parquet") and not f.startswith(".")
+        )
+        if len(files) < min_files:
+            continue
+
+        table = pa.concat_tables(
+            [pq.read_table(f) for f in files], promote_options="default"
+        )
+        write_atomic(table, directory)
+        for f in files:
+            os.remove(f)
+        compacted += 1
+        logger.info(f"Compacted {len(files)} files in {directory}")
+    return compacted
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Maintenance of the Parquet datasets"
+    )
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser(
+        "compact", help="Merge the small files of each partition"
+    )
+    compact_parser.add_argument(
+        "--dataset", choices=[BRONZE, SILVER], action="append"
+    )
+    compact_parser.add_argument("--min-files", type=int, default=2)
+    args = arg_parser.parse_args()
+
+    for dataset in args.dataset or [BRONZE, SILVER]:
+        count = compact(dataset, args.min_files)
+        logger.info(f"{dataset}: compacted {count} partitions")
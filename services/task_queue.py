@@ -0,0 +1,583 @@
+import collections
+import time
+
+import orjson
+
+from core.logging import setup_logging
+
+logger = setup_logging()
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a job is submitted while the job queue is full.
+    """
+
+
+class Lease:
+    """
+    A delivery of a task to a worker, valid until its visibility timeout
+    expires unless extended.
+
+    Attributes:
+        task_id (str): The task identifier.
+        attempt (int): The delivery number, from 1.
+        payload (dict): The task payload.
+        worker_id (str): The worker holding the lease.
+    """
+
+    def __init__(self, task_id, attempt, payload, worker_id):
+        self.task_id = task_id
+        self.attempt = attempt
+        self.payload = payload
+        self.worker_id = worker_id
+
+
+def listing_key(record):
+    # A listing is published once per task, whatever the delivery
+    return f"{record.get('item_number')}|{record.get('url')}"
+
+
+class MemoryQueueBackend:
+    """
+    In-process task queue, for a single API process running its own worker
+    and for tests.
+
+    Follows the semantics of ``RedisQueueBackend``: tasks are leased for a
+    visibility timeout and delivered again once it expires, results are
+    written once.
+
+    Attributes:
+        max_queue (int): Maximum number of queued tasks.
+        max_deliveries (int): Deliveries of a task before it fails.
+        retention_ttl (float): Seconds a finished task is kept.
+    """
+
+    def __init__(self, max_queue, max_deliveries, retention_ttl):
+        self.max_queue = max_queue
+        self.max_deliveries = max_deliveries
+        self.retention_ttl = retention_ttl
+
+        self._pending = collections.deque()
+        self._tasks = {}
+        # Task id: lease deadline
+        self._leases = {}
+        # Task id: (records, keys)
+        self._listings = {}
+        # Worker id: (info, expiry)
+        self._workers = {}
+
+    async def enqueue(self, task_id, payload):
+        self._expire()
+        if task_id in self._tasks:
+            return
+        if len(self._pending) >= self.max_queue:
+            raise JobQueueFull("Job queue is full")
+        self._tasks[task_id] = new_task(task_id, payload)
+        self._listings[task_id] = ([], set())
+        self._pending.appendleft(task_id)
+
+    async def reserve(self, worker_id, visibility_timeout):
+        now = time.time()
+        for task_id, deadline in list(self._leases.items()):
+            if deadline <= now:
+                del self._leases[task_id]
+                self._redeliver(self._tasks[task_id], now)
+        while self._pending:
+            task = self._tasks.get(self._pending.pop())
+            if task is None or task["status"] != QUEUED:
+                continue
+            task["attempts"] += 1
+            task.update(status=RUNNING, worker=worker_id, started_at=now)
+            self._leases[task["id"]] = now + visibility_timeout
+            return Lease(
+                task["id"],
+                task["attempts"],
+                orjson.loads(task["payload"]),
+                worker_id,
+            )
+        return None
+
+    async def extend(self, lease, visibility_timeout):
+        task = self._tasks.get(lease.task_id)
+        if not _holds(task, lease):
+            return False
+        self._leases[lease.task_id] = time.time() + visibility_timeout
+        return True
+
+    async def release(self, lease):
+        task = self._tasks.get(lease.task_id)
+        if not _holds(task, lease):
+            return
+        # A released delivery does not count towards the limit
+        task["attempts"] -= 1
+        task["status"] = QUEUED
+        self._leases.pop(lease.task_id, None)
+        self._pending.append(lease.task_id)
+
+    async def finish(self, task_id, status, result=b"", error=None):
+        task = self._tasks.get(task_id)
+        if task is None or task["status"] != RUNNING:
+            return False
+        task.update(
+            status=status, result=result, error=error, finished_at=time.time()
+        )
+        self._leases.pop(task_id, None)
+        return True
+
+    async def cancel(self, task_id):
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        if task["status"] == QUEUED:
+            # Frees its place in the queue
+            try:
+                self._pending.remove(task_id)
+            except ValueError:
+                pass
+        if task["status"] in (QUEUED, RUNNING):
+            task.update(status=CANCELLED, finished_at=time.time())
+            self._leases.pop(task_id, None)
+        return task["status"]
+
+    async def publish_listings(self, task_id, records):
+        if task_id not in self._listings:
+            return
+        published, keys = self._listings[task_id]
+        for record in records:
+            key = listing_key(record)
+            if key not in keys:
+                keys.add(key)
+                published.append(orjson.loads(orjson.dumps(record)))
+
+    async def listings(self, task_id, start=0):
+        published, _ = self._listings.get(task_id, ([], None))
+        return published[start:]
+
+    async def count_listings(self, task_id):
+        return len(self._listings.get(task_id, ((), None))[0])
+
+    async def get(self, task_id):
+        self._expire()
+        task = self._tasks.get(task_id)
+        return dict(task) if task is not None else None
+
+    async def heartbeat(self, worker_id, info, ttl):
+        self._workers[worker_id] = (info, time.time() + ttl)
+
+    async def workers(self):
+        now = time.time()
+        return [
+            info for info, expiry in self._workers.values() if expiry > now
+        ]
+
+    async def close(self):
+        pass
+
+    def _redeliver(self, task, now):
+        if task["status"] != RUNNING:
+            return
+        if task["attempts"] >= self.max_deliveries:
+            task.update(
+                status=FAILED,
+                error=f"Gave up after {task['attempts']} deliveries",
+                finished_at=now,
+            )
+            return
+        logger.warning(f"Lease of task {task['id']} expired, redelivering")
+        task["status"] = QUEUED
+        self._pending.append(task["id"])
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            task_id
+            for task_id, task in self._tasks.items()
+            if task["status"] in FINISHED_STATUSES
+            and now - task["finished_at"] > self.retention_ttl
+        ]
+        for task_id in expired:
+            del self._tasks[task_id]
+            self._listings.pop(task_id, None)
+
+
+# Adds a task unless it exists. KEYS: task hash, pending list. ARGV: task id,
+# max queue, then the task fields and values.
+ENQUEUE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return 1
+end
+if redis.call('LLEN', KEYS[2]) >= tonumber(ARGV[2]) then
+  return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('LPUSH', KEYS[2], ARGV[1])
+return 1
+"""
+
+# Requeues the tasks whose lease expired, then leases the next queued task.
+# KEYS: pending list, leases zset. ARGV: now, lease deadline, worker id,
+# max deliveries, retention TTL, task key prefix (the task hashes are not
+# declared keys, so the queue needs a single server rather than a cluster).
+RESERVE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, id in ipairs(expired) do
+  redis.call('ZREM', KEYS[2], id)
+  local key = ARGV[6] .. id
+  if redis.call('HGET', key, 'status') == 'running' then
+    local attempts = tonumber(redis.call('HGET', key, 'attempts'))
+    if attempts >= tonumber(ARGV[4]) then
+      redis.call('HSET', key, 'status', 'failed', 'finished_at', ARGV[1],
+        'error', 'Gave up after ' .. attempts .. ' deliveries')
+      redis.call('EXPIRE', key, ARGV[5])
+    else
+      redis.call('HSET', key, 'status', 'queued')
+      redis.call('RPUSH', KEYS[1], id)
+    end
+  end
+end
+while true do
+  local id = redis.call('RPOP', KEYS[1])
+  if not id then return nil end
+  local key = ARGV[6] .. id
+  if redis.call('HGET', key, 'status') == 'queued' then
+    local attempts = redis.call('HINCRBY', key, 'attempts', 1)
+    redis.call('HSET', key, 'status', 'running', 'worker', ARGV[3],
+      'started_at', ARGV[1])
+    redis.call('ZADD', KEYS[2], ARGV[2], id)
+    return {id, attempts, redis.call('HGET', key, 'payload')}
+  end
+end
+"""
+
+# KEYS: task hash, leases zset. ARGV: task id, attempt, lease deadline.
+EXTEND_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running'
+    or redis.call('HGET', KEYS[1], 'attempts') ~= ARGV[2] then
+  return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# KEYS: task hash, leases zset, pending list. ARGV: task id, attempt.
+RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running'
+    or redis.call('HGET', KEYS[1], 'attempts') ~= ARGV[2] then
+  return 0
+end
+redis.call('HINCRBY', KEYS[1], 'attempts', -1)
+redis.call('HSET', KEYS[1], 'status', 'queued')
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('RPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
+# KEYS: task hash, leases zset, listings list, listing keys set.
+# ARGV: task id, status, result, error, now, retention TTL.
+FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+  return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'result', ARGV[3],
+  'error', ARGV[4], 'finished_at', ARGV[5])
+redis.call('ZREM', KEYS[2], ARGV[1])
+for i = 1, 4 do
+  if i ~= 2 then redis.call('EXPIRE', KEYS[i], ARGV[6]) end
+end
+return 1
+"""
+
+# KEYS: task hash, leases zset, listings list, listing keys set, pending
+# list. ARGV: task id, now, retention TTL.
+CANCEL_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status == 'queued' then
+  redis.call('LREM', KEYS[5], 0, ARGV[1])
+end
+if status == 'queued' or status == 'running' then
+  status = 'cancelled'
+  redis.call('HSET', KEYS[1], 'status', status, 'finished_at', ARGV[2])
+  redis.call('ZREM', KEYS[2], ARGV[1])
+  for i = 1, 4 do
+    if i ~= 2 then redis.call('EXPIRE', KEYS[i], ARGV[3]) end
+  end
+end
+return status
+"""
+
+# Appends the records not published yet. KEYS: listings list, listing keys
+# set. ARGV: key, record, key, record...
+PUBLISH_SCRIPT = """
+for i = 1, #ARGV, 2 do
+  if redis.call('SADD', KEYS[2], ARGV[i]) == 1 then
+    redis.call('RPUSH', KEYS[1], ARGV[i + 1])
+  end
+end
+return 1
+"""
+
+
+class RedisQueueBackend:
+    """
+    Task queue in a Redis-compatible server, shared by the API and every
+    worker node.
+
+    Each state transition runs as a server-side script, so a task is leased
+    by one worker at a time and its result is written once even when an
+    expired lease lets another worker run it again.
+
+    Attributes:
+        url (str): The server URL, e.g. "redis://localhost:6379/1".
+        max_queue (int): Maximum number of queued tasks.
+        max_deliveries (int): Deliveries of a task before it fails.
+        retention_ttl (float): Seconds a finished task is kept.
+        prefix (str): The key prefix.
+    """
+
+    def __init__(
+        self,
+        url,
+        max_queue,
+        max_deliveries,
+        retention_ttl,
+        prefix="jobs",
+        client=None,
+    ):
+        self.url = url
+        self.max_queue = max_queue
+        self.max_deliveries = max_deliveries
+        self.retention_ttl = retention_ttl
+        self.prefix = prefix
+        self._client = client
+
+    async def enqueue(self, task_id, payload):
+        task = new_task(task_id, payload)
+        task.update(error="", started_at="", finished_at="")
+        fields = [item for pair in task.items() for item in pair]
+        added = await self._redis().eval(
+            ENQUEUE_SCRIPT,
+            2,
+            self._task_key(task_id),
+            self._key("pending"),
+            task_id,
+            self.max_queue,
+            *fields,
+        )
+        if not added:
+            raise JobQueueFull("Job queue is full")
+
+    async def reserve(self, worker_id, visibility_timeout):
+        now = time.time()
+        reply = await self._redis().eval(
+            RESERVE_SCRIPT,
+            2,
+            self._key("pending"),
+            self._key("leases"),
+            now,
+            now + visibility_timeout,
+            worker_id,
+            self.max_deliveries,
+            int(self.retention_ttl),
+            self._key("task:"),
+        )
+        if reply is None:
+            return None
+        task_id, attempt, payload = reply
+        return Lease(
+            task_id.decode(), int(attempt), orjson.loads(payload), worker_id
+        )
+
+    async def extend(self, lease, visibility_timeout):
+        return bool(
+            await self._redis().eval(
+                EXTEND_SCRIPT,
+                2,
+                self._task_key(lease.task_id),
+                self._key("leases"),
+                lease.task_id,
+                lease.attempt,
+                time.time() + visibility_timeout,
+            )
+        )
+
+    async def release(self, lease):
+        await self._redis().eval(
+            RELEASE_SCRIPT,
+            3,
+            self._task_key(lease.task_id),
+            self._key("leases"),
+            self._key("pending"),
+            lease.task_id,
+            lease.attempt,
+        )
+
+    async def finish(self, task_id, status, result=b"", error=None):
+        return bool(
+            await self._redis().eval(
+                FINISH_SCRIPT,
+                4,
+                *self._task_keys(task_id),
+                task_id,
+                status,
+                result,
+                error or "",
+                time.time(),
+                int(self.retention_ttl),
+            )
+        )
+
+    async def cancel(self, task_id):
+        status = await self._redis().eval(
+            CANCEL_SCRIPT,
+            5,
+            *self._task_keys(task_id),
+            self._key("pending"),
+            task_id,
+            time.time(),
+            int(self.retention_ttl),
+        )
+        return status.decode() if status is not None else None
+
+    async def publish_listings(self, task_id, records):
+        if not records:
+            return
+        args = []
+        for record in records:
+            args += [listing_key(record), orjson.dumps(record)]
+        await self._redis().eval(
+            PUBLISH_SCRIPT,
+            2,
+            self._key(f"listings:{task_id}"),
+            self._key(f"listing_keys:{task_id}"),
+            *args,
+        )
+
+    async def listings(self, task_id, start=0):
+        records = await self._redis().lrange(
+            self._key(f"listings:{task_id}"), start, -1
+        )
+        return [orjson.loads(record) for record in records]
+
+    async def count_listings(self, task_id):
+        return await self._redis().llen(self._key(f"listings:{task_id}"))
+
+    async def get(self, task_id):
+        data = await self._redis().hgetall(self._task_key(task_id))
+        if not data:
+            return None
+        task = {key.decode(): value for key, value in data.items()}
+        for key, value in task.items():
+            if key not in ("payload", "result"):
+                task[key] = value.decode()
+        task["attempts"] = int(task["attempts"])
+        for key in ("created_at", "started_at", "finished_at"):
+            task[key] = float(task[key]) if task[key] else None
+        task["error"] = task["error"] or None
+        return task
+
+    async def heartbeat(self, worker_id, info, ttl):
+        async with self._redis().pipeline(transaction=True) as pipe:
+            pipe.zadd(self._key("workers"), {worker_id: time.time() + ttl})
+            pipe.set(
+                self._key(f"worker:{worker_id}"),
+                orjson.dumps(info),
+                ex=max(1, int(ttl)),
+            )
+            await pipe.execute()
+
+    async def workers(self):
+        redis = self._redis()
+        await redis.zremrangebyscore(self._key("workers"), "-inf", time.time())
+        worker_ids = await redis.zrange(self._key("workers"), 0, -1)
+        if not worker_ids:
+            return []
+        infos = await redis.mget(
+            [self._key(f"worker:{w.decode()}") for w in worker_ids]
+        )
+        return [orjson.loads(info) for info in infos if info is not None]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def _task_key(self, task_id):
+        return self._key(f"task:{task_id}")
+
+    def _task_keys(self, task_id):
+        return (
+            self._task_key(task_id),
+            self._key("leases"),
+            self._key(f"listings:{task_id}"),
+            self._key(f"listing_keys:{task_id}"),
+        )
+
+    def _redis(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError(
+                    "The redis job queue backend requires the redis package"
+                )
+            self._client = redis.from_url(self.url)
+        return self._client
+
+
+def new_task(task_id, payload):
+    return {
+        "id": task_id,
+        "status": QUEUED,
+        "payload": orjson.dumps(payload),
+        "attempts": 0,
+        "worker": "",
+        "result": b"",
+        "error": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+def _holds(task, lease):
+    # Only the latest delivery of a running task holds its lease
+    return (
+        task is not None
+        and task["status"] == RUNNING
+        and task["attempts"] == lease.attempt
+    )
+
+
+def create_job_queue_backend(
+    name, url, max_queue, max_deliveries, retention_ttl
+):
+    """
+    Create the job queue backend.
+
+    Args:
+        name (str): "memory" or "redis".
+        url (str): The server URL of the redis backend.
+        max_queue (int): Maximum number of queued tasks.
+        max_deliveries (int): Deliveries of a task before it fails.
+        retention_ttl (float): Seconds a finished task is kept.
+
+    Returns:
+        The backend.
+    """
+    name = name.lower()
+    if name == "memory":
+        return MemoryQueueBackend(max_queue, max_deliveries, retention_ttl)
+    if name == "redis":
+        return RedisQueueBackend(url, max_queue, max_deliveries, retention_ttl)
+    raise ValueError(f"{name} is not a supported job queue backend")
@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import time
+import uuid
+
+from core.config import settings
+from core.logging import setup_logging
+from services.crawler import crawl_query_params, run_local_crawl
+from services.jobs import job_manager
+from services.llm import close_llm_chains, warm_llm_chains
+from services.parse_pool import parse_pool
+from services.result_cache import result_cache
+from services.task_queue import DONE, FAILED
+from utils.browser_pool import browser_pool
+from utils.metrics import setup_tracing, shutdown_tracing
+from utils.misc import QueryParams
+from utils.serialization import dataframe_to_arrow_ipc
+
+logger = setup_logging()
+
+
+class CrawlWorker:
+    """
+    Runs the crawl jobs of the job queue: at most ``concurrency`` at once,
+    each leased for ``visibility_timeout`` seconds and extended on every
+    heartbeat.
+
+    A job whose worker dies is delivered again once its lease expires, so
+    jobs run at least once: listings are published once per job, the result
+    is written by the first delivery to finish, and the Parquet files of a
+    job are overwritten by its later deliveries.
+
+    Attributes:
+        backend: The job queue backend.
+        worker_id (str): Identifies the worker in the job states.
+        concurrency (int): Maximum number of crawls run at once.
+        visibility_timeout (float): Seconds a job is leased for.
+        heartbeat_interval (float): Seconds between heartbeats.
+        poll_interval (float): Seconds between polls of an empty queue.
+        timeout (float): Maximum run time of a job in seconds.
+    """
+
+    def __init__(
+        self,
+        backend,
+        worker_id,
+        concurrency,
+        visibility_timeout,
+        heartbeat_interval,
+        poll_interval,
+        timeout,
+    ):
+        if visibility_timeout <= heartbeat_interval:
+            raise ValueError(
+                "The job visibility timeout must exceed the heartbeat interval"
+            )
+        self.backend = backend
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+        # (Task id, delivery): (lease, crawl task)
+        self._running = {}
+        # Deliveries whose lease was lost
+        self._lost = set()
+        self._tasks = []
+        self._started_at = None
+
+    async def start(self):
+        """
+        Start the job slots and the heartbeat.
+        """
+        self._started_at = time.time()
+        self._tasks = [
+            asyncio.create_task(self._slot()) for _ in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        logger.info(
+            f"Crawl worker {self.worker_id} started: "
+            f"{self.concurrency} concurrent jobs"
+        )
+
+    async def stop(self):
+        """
+        Stop taking jobs and hand the running ones back to the queue.
+        """
+        leases = [lease for lease, _ in self._running.values()]
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for lease in leases:
+            await self.backend.release(lease)
+            logger.info(f"Job {lease.task_id} handed back to the queue")
+
+    def info(self):
+        return {
+            "id": self.worker_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "started_at": self._started_at,
+        }
+
+    async def _slot(self):
+        while True:
+            try:
+                lease = await self.backend.reserve(
+                    self.worker_id, self.visibility_timeout
+                )
+            except Exception as e:
+                logger.error(f"Job queue unavailable: {e}")
+                lease = None
+            if lease is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self._run(lease)
+            except Exception as e:
+                # The job is delivered again once its lease expires
+                logger.error(f"Job {lease.task_id} could not be run: {e}")
+
+    async def _run(self, lease):
+        job_id = lease.task_id
+        params = QueryParams(**lease.payload["params"])
+        logger.info(f"Job {job_id} started (delivery {lease.attempt})")
+        records = []
+        crawl = asyncio.create_task(
+            asyncio.wait_for(
+                self._crawl(job_id, params, lease.payload["cached"], records),
+                timeout=self.timeout,
+            )
+        )
+        delivery = (job_id, lease.attempt)
+        self._running[delivery] = (lease, crawl)
+        publisher = asyncio.create_task(self._publish(job_id, records))
+        try:
+            df = await crawl
+            status, result, error = DONE, b"", None
+            if df is not None and not df.empty:
+                result = dataframe_to_arrow_ipc(df)
+        except asyncio.CancelledError:
+            if delivery not in self._lost:
+                # The worker is stopping
+                raise
+            logger.info(f"Job {job_id} lost its lease, stopped")
+            return
+        except asyncio.TimeoutError:
+            status, result = FAILED, b""
+            error = f"Job timed out after {self.timeout}s"
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            status, result, error = FAILED, b"", str(e)
+        finally:
+            publisher.cancel()
+            await asyncio.gather(publisher, return_exceptions=True)
+            await self.backend.publish_listings(job_id, records)
+            del self._running[delivery]
+            self._lost.discard(delivery)
+        if await self.backend.finish(job_id, status, result, error):
+            logger.info(f"Job {job_id} {status}")
+        else:
+            logger.info(f"Job {job_id} already finished, result dropped")
+
+    async def _crawl(self, job_id, params, cached, records):
+        def crawl(params, on_record):
+            return run_local_crawl(params, on_record, crawl_id=job_id)
+
+        if cached:
+            return await crawl_query_params(params, records.append, crawl)
+        return await crawl(params, records.append)
+
+    async def _publish(self, job_id, records):
+        # Listings are published in batches while the crawl runs
+        published = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if len(records) > published:
+                batch = records[published:]
+                await self.backend.publish_listings(job_id, batch)
+                published += len(batch)
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await self.backend.heartbeat(
+                    self.worker_id, self.info(), 3 * self.heartbeat_interval
+                )
+                for lease, crawl in list(self._running.values()):
+                    held = await self.backend.extend(
+                        lease, self.visibility_timeout
+                    )
+                    if not held:
+                        # Cancelled, or delivered again after a stall
+                        self._lost.add((lease.task_id, lease.attempt))
+                        crawl.cancel()
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+
+def new_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+crawl_worker = CrawlWorker(
+    backend=job_manager.backend,
+    worker_id=new_worker_id(),
+    concurrency=settings.JOB_WORKERS,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT,
+    heartbeat_interval=settings.JOB_HEARTBEAT_INTERVAL,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    timeout=settings.JOB_TIMEOUT,
+)
+
+
+async def serve(worker):
+    """
+    Run a worker node: start the browser and parse pools and the worker,
+    until SIGINT or SIGTERM.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    setup_tracing()
+    await parse_pool.start()
+    await browser_pool.start()
+    warm_llm_chains()
+    await worker.start()
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Stopping the crawl worker")
+        await worker.stop()
+        await browser_pool.stop()
+        await close_llm_chains()
+        await result_cache.close()
+        await job_manager.stop()
+        await parse_pool.stop()
+        shutdown_tracing()
+
+
+if __name__ == "__main__":
+    # Run a crawl worker node fed from the shared job queue
+    arg_parser = argparse.ArgumentParser(
+        description="Run crawl jobs from the job queue"
+    )
+    arg_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.JOB_WORKERS,
+        help="Maximum number of crawls run at once",
+    )
+    arg_parser.add_argument("--worker-id", default=None)
+    args = arg_parser.parse_args()
+    if settings.JOB_QUEUE_BACKEND.lower() == "memory":
+        arg_parser.error(
+            "Worker nodes need a shared job queue: set JOB_QUEUE_BACKEND=redis"
+        )
+
+    crawl_worker.concurrency = args.concurrency
+    crawl_worker.worker_id = args.worker_id or crawl_worker.worker_id
+    asyncio.run(serve(crawl_worker))
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from utils import browser_pool as browser_pool_module
+from utils.browser_pool import BrowserPool, BrowserPoolExhausted, _PooledBrowser
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    async def new_browser_context(browser, storage_state, routing_mode):
+        return FakeContext()
+
+    monkeypatch.setattr(
+        browser_pool_module, "new_browser_context", new_browser_context
+    )
+
+    pool = BrowserPool(
+        size=1,
+        contexts_per_browser=4,
+        max_queue=8,
+        max_uses=100,
+        acquire_timeout=1,
+        headless=True,
+    )
+
+    async def launch():
+        return _PooledBrowser(FakeBrowser())
+
+    pool._launch = launch
+
+    async def start():
+        pool._playwright = object()
+        pool._slots = asyncio.Semaphore(pool.size * pool.contexts_per_browser)
+        pool._browsers = [await pool._launch()]
+
+    pool.fake_start = start
+    return pool
+
+
+def test_sticky_context_is_reused(pool):
+    async def scenario():
+        await pool.fake_start()
+        async with pool.sticky_context("account", new_session=object) as first:
+            pass
+        async with pool.sticky_context("account", new_session=object) as second:
+            pass
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == second
+    assert not first[0].closed
+
+
+def test_dropped_sticky_context_is_closed_by_its_last_user(pool):
+    async def scenario():
+        await pool.fake_start()
+        async with pool.sticky_context("account") as (context, _):
+            async with pool.sticky_context("account") as (other, _):
+                assert other is context
+                await pool.drop("account")
+                assert not context.closed
+            assert not context.closed
+        assert context.closed
+
+        async with pool.sticky_context("account") as (renewed, _):
+            assert renewed is not context
+        return pool.metrics()
+
+    metrics = asyncio.run(scenario())
+
+    assert metrics["active_contexts"] == 0
+    assert metrics["sticky_contexts"] == 1
+
+
+def test_unused_sticky_context_is_closed_on_drop(pool):
+    async def scenario():
+        await pool.fake_start()
+        async with pool.sticky_context("account") as (context, _):
+            pass
+        await pool.drop("account")
+        await pool.drop("account")
+        return context
+
+    assert asyncio.run(scenario()).closed
+
+
+def failing_launches(pool, count):
+    launch = pool._launch
+    failures = {"left": count}
+
+    async def flaky_launch():
+        if failures["left"] > 0:
+            failures["left"] -= 1
+            raise RuntimeError("Browser failed to launch")
+        return await launch()
+
+    pool._launch = flaky_launch
+
+
+def test_browser_is_kept_when_its_replacement_fails_to_launch(pool):
+    pool.max_uses = 1
+
+    async def scenario():
+        await pool.fake_start()
+        browser = pool._browsers[0]
+        failing_launches(pool, 1)
+        async with pool.context():
+            pass
+        kept = pool._browsers == [browser] and not browser.browser.closed
+        async with pool.context():
+            pass
+        return kept, browser
+
+    kept, browser = asyncio.run(scenario())
+
+    assert kept
+    # Recycled on the next use, once a replacement launches
+    assert browser.retired and browser.browser.closed
+    assert len(pool._browsers) == 1
+    assert pool.metrics()["recycled_total"] == 1
+
+
+def test_lost_browser_is_relaunched_lazily(pool):
+    async def scenario():
+        await pool.fake_start()
+        pool._browsers[0].browser.closed = True
+        failing_launches(pool, 2)
+        with pytest.raises(BrowserPoolExhausted):
+            async with pool.context():
+                pass
+        async with pool.context():
+            pass
+        return pool.metrics()
+
+    metrics = asyncio.run(scenario())
+
+    assert metrics["browsers"] == 1
+    assert metrics["active_contexts"] == 0
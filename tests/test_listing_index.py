@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+from core.config import settings
+from services import parser
+from services.listing_index import (
+    CHANGED,
+    NEW,
+    PRICE_DROP,
+    REMOVED,
+    ListingIndex,
+)
+from services.parse_pool import ParsePool
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ListingIndex(str(tmp_path / "listing_index.sqlite"), removal_after=2)
+
+
+def listing(item_number, price="$1,200", title="MacBook Pro"):
+    return {
+        "href": f"/marketplace/item/{item_number}/",
+        "title": title,
+        "price": price,
+        "location": "Paris",
+        "item_number": item_number,
+    }
+
+
+def crawl(index, listings, failed=()):
+    """
+    Run an incremental crawl of the listings through the index, the
+    extraction of the ``failed`` item numbers failing.
+
+    Returns:
+        Tuple[List[str], Dict[str, int]]: The item numbers sent to
+        extraction and the event counts.
+    """
+    changed, fingerprints = index.select_changed("Paris", "macbook", listings)
+    records = {
+        item["item_number"]: dict(item)
+        for item in changed
+        if item["item_number"] not in failed
+    }
+    counts = index.update("Paris", "macbook", fingerprints, records)
+    return [item["item_number"] for item in changed], counts
+
+
+def kinds(index, since=0):
+    return [
+        (change["item_number"], change["kind"])
+        for change in index.changes(since)["changes"]
+    ]
+
+
+def test_unchanged_listings_are_skipped(index):
+    listings = [listing("1"), listing("2")]
+
+    extracted, counts = crawl(index, listings)
+    assert extracted == ["1", "2"]
+    assert counts[NEW] == 2
+
+    extracted, counts = crawl(index, listings)
+    assert extracted == []
+    assert counts == {NEW: 0, CHANGED: 0, PRICE_DROP: 0, REMOVED: 0}
+    assert kinds(index) == [("1", NEW), ("2", NEW)]
+
+
+def test_price_drop_emits_an_event(index):
+    crawl(index, [listing("1"), listing("2")])
+    cursor = index.changes()["cursor"]
+
+    extracted, counts = crawl(
+        index,
+        [listing("1", price="$950"), listing("2", title="MacBook Pro 16")],
+    )
+
+    assert extracted == ["1", "2"]
+    assert counts[PRICE_DROP] == 1
+    assert counts[CHANGED] == 1
+    changes = index.changes(cursor)["changes"]
+    assert [(c["item_number"], c["kind"]) for c in changes] == [
+        ("1", PRICE_DROP),
+        ("2", CHANGED),
+    ]
+    assert (changes[0]["previous_price"], changes[0]["price"]) == (1200, 950)
+
+
+def test_listing_missing_for_the_threshold_is_removed(index):
+    crawl(index, [listing("1"), listing("2")])
+
+    _, counts = crawl(index, [listing("1")])
+    assert counts[REMOVED] == 0
+
+    _, counts = crawl(index, [listing("1")])
+    assert counts[REMOVED] == 1
+    assert kinds(index)[-1] == ("2", REMOVED)
+
+    # A removed listing coming back is new again
+    extracted, counts = crawl(index, [listing("1"), listing("2")])
+    assert extracted == ["2"]
+    assert counts[NEW] == 1
+
+
+def test_listing_seen_again_resets_its_missed_crawls(index):
+    crawl(index, [listing("1"), listing("2")])
+    crawl(index, [listing("1")])
+    crawl(index, [listing("1"), listing("2")])
+
+    _, counts = crawl(index, [listing("1")])
+
+    assert counts[REMOVED] == 0
+
+
+def test_failed_extractions_are_retried_on_the_next_crawl(index):
+    listings = [listing("1"), listing("2")]
+
+    _, counts = crawl(index, listings, failed={"2"})
+    assert counts[NEW] == 1
+
+    extracted, counts = crawl(index, listings)
+    assert extracted == ["2"]
+    assert counts[NEW] == 1
+
+
+def test_changes_are_filtered_and_paginated(index):
+    crawl(index, [listing("1"), listing("2"), listing("3")])
+    index.update("Lyon", "macbook", {"4": "fingerprint"}, {"4": listing("4")})
+
+    first = index.changes(limit=2)
+    rest = index.changes(first["cursor"])
+
+    assert [c["item_number"] for c in first["changes"]] == ["1", "2"]
+    assert [c["item_number"] for c in rest["changes"]] == ["3", "4"]
+    assert rest["changes"][0]["record"]["price"] == "$1,200"
+    assert [c["item_number"] for c in index.changes(city="Lyon")["changes"]] == [
+        "4"
+    ]
+    assert index.changes(rest["cursor"]) == {
+        "cursor": rest["cursor"],
+        "changes": [],
+    }
+
+
+def test_failed_post_extraction_is_not_indexed(index, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(parser, "listing_index", index)
+    monkeypatch.setattr(parser, "parse_pool", ParsePool("inline", 1, 0))
+    listings = [listing("1"), listing("2")]
+    param_dict = {"city": "Paris", "query": "macbook"}
+
+    changed, fingerprints = index.select_changed("Paris", "macbook", listings)
+    df = asyncio.run(
+        parser.save_listings(
+            changed, [listings[0], None], param_dict, fingerprints=fingerprints
+        )
+    )
+
+    assert list(df["item_number"]) == ["1", "None"]
+    assert kinds(index) == [("1", NEW)]
+    changed, _ = index.select_changed("Paris", "macbook", listings)
+    assert [item["item_number"] for item in changed] == ["2"]
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+from typing import Any
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from core.config import settings
+from services import llm
+from utils.rate_limit import TokenBucket
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FakeState:
+    def __init__(self, rate_limited=0, failing=()):
+        self.rate_limited = rate_limited
+        self.failing = set(failing)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Local chat model answering a JSON post titled after the listing HTML.
+    """
+
+    state: Any
+    delay: float = 0.02
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        html = messages[-1].content
+        self.state.calls += 1
+        self.state.in_flight += 1
+        self.state.max_in_flight = max(
+            self.state.max_in_flight, self.state.in_flight
+        )
+        try:
+            await asyncio.sleep(self.delay)
+            if self.state.rate_limited > 0:
+                self.state.rate_limited -= 1
+                raise RateLimitError("Too Many Requests")
+            if html in self.state.failing:
+                raise ValueError("Model failure")
+        finally:
+            self.state.in_flight -= 1
+        message = AIMessage(content=json.dumps({"title": html}))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_REQUESTS_PER_SECOND", 0)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.01)
+
+    def use(**state):
+        state = FakeState(**state)
+        chain = (
+            llm.LLM_PROMPT
+            | FakeChatModel(state=state)
+            | (lambda message: json.loads(message.content))
+        )
+        monkeypatch.setattr(llm, "get_llm_chain", lambda *args, **kwargs: chain)
+        return state
+
+    return use
+
+
+def extract(htmls, max_concurrency=None):
+    return asyncio.run(
+        llm.aget_posts_data_using_llm(
+            htmls, "OpenAI", "gpt-4", max_concurrency=max_concurrency
+        )
+    )
+
+
+def test_posts_are_extracted_concurrently_in_order(fake_model):
+    state = fake_model()
+    htmls = [f"post {i}" for i in range(8)]
+
+    results = extract(htmls, max_concurrency=3)
+
+    assert [result["title"] for result in results] == htmls
+    assert state.max_in_flight == 3
+
+
+def test_rate_limited_calls_are_retried(fake_model):
+    state = fake_model(rate_limited=2)
+
+    results = extract(["post"])
+
+    assert results == [{"title": "post"}]
+    assert state.calls == 3
+
+
+def test_rate_limited_calls_give_up_after_max_retries(fake_model):
+    state = fake_model(rate_limited=10)
+
+    results = extract(["post"])
+
+    assert results == [None]
+    assert state.calls == settings.LLM_MAX_RETRIES + 1
+
+
+def test_a_failed_post_does_not_fail_the_others(fake_model):
+    fake_model(failing={"post 1"})
+
+    results = extract(["post 0", "post 1", "post 2"])
+
+    assert results == [{"title": "post 0"}, None, {"title": "post 2"}]
+
+
+def test_token_bucket_spaces_out_requests():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def acquire_all():
+        for _ in range(6):
+            await bucket.acquire()
+
+    start_time = time.monotonic()
+    asyncio.run(acquire_all())
+    assert time.monotonic() - start_time >= 0.09
+
+
+def test_token_bucket_without_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, capacity=1)
+
+    async def acquire_all():
+        for _ in range(100):
+            await bucket.acquire()
+
+    asyncio.run(asyncio.wait_for(acquire_all(), timeout=1))
+
+
+def test_batch_results_are_cached_apart():
+    single = llm.get_llm_cache_key("post", "OpenAI", "gpt-4")
+    batch = llm.get_llm_cache_key("post", "OpenAI", "gpt-4", batch=True)
+
+    assert single == llm.get_llm_cache_key("post", "openai", "gpt-4")
+    assert batch != single
+
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def test_failed_encoding_load_is_not_cached(monkeypatch):
+    encoding = FakeEncoding()
+    loads = []
+
+    def encoding_for_model(model_name):
+        loads.append(model_name)
+        if len(loads) == 1:
+            raise ConnectionError("Vocabulary download failed")
+        return encoding
+
+    monkeypatch.setattr(llm.tiktoken, "encoding_for_model", encoding_for_model)
+    llm.get_encoding.cache_clear()
+    try:
+        # Estimated while the encoding cannot be loaded
+        assert llm.count_tokens("a" * 40, "gpt-test") == 11
+        assert llm.count_tokens("hello world", "gpt-test") == 2
+        assert llm.count_tokens("hello world", "gpt-test") == 2
+    finally:
+        llm.get_encoding.cache_clear()
+
+    assert loads == ["gpt-test", "gpt-test"]
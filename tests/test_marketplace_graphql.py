@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from services.marketplace_graphql import (
+    ListingPayloadCollector,
+    extract_embedded_payloads,
+    parse_listing_payload,
+)
+
+FIXTURE_PATH = os.path.join(
+    os.path.dirname(__file__), "fixtures", "marketplace_search_graphql.json"
+)
+
+
+@pytest.fixture
+def body():
+    with open(FIXTURE_PATH, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def test_listings_are_decoded_from_every_document(body):
+    listings = parse_listing_payload(body)
+
+    assert [listing["item_number"] for listing in listings] == [
+        "1012345678901234",
+        "1098765432109876",
+        "1055555555555555",
+        "1012345678901234",
+    ]
+    assert listings[0] == {
+        "href": "/marketplace/item/1012345678901234/",
+        "title": "MacBook Pro 14 M1 Pro 16GB",
+        "price": "€1,200€1,450",
+        "location": "Paris, IDF",
+        "item_number": "1012345678901234",
+    }
+
+
+def test_price_without_strikethrough_price(body):
+    listings = parse_listing_payload(body)
+
+    assert listings[1]["price"] == "€650"
+    assert listings[3]["price"] == "€1,200"
+
+
+def test_custom_title_takes_precedence(body):
+    listings = parse_listing_payload(body)
+
+    assert listings[1]["title"] == "MacBook Air 2020 - like new"
+
+
+def test_free_listing(body):
+    listing = parse_listing_payload(body)[2]
+
+    assert listing["title"] == "Chargeur MacBook"
+    assert listing["price"] == "Gratuit"
+    assert listing["location"] == "Paris"
+
+
+def test_missing_fields_are_none(body):
+    listing = parse_listing_payload(body)[3]
+
+    assert listing["location"] == "None"
+
+
+def test_collector_deduplicates_by_item_number(body):
+    collector = ListingPayloadCollector()
+
+    assert collector.add_payload(body) == 3
+    assert collector.add_payload(body) == 0
+    assert [listing["item_number"] for listing in collector.listings] == [
+        "1012345678901234",
+        "1098765432109876",
+        "1055555555555555",
+    ]
+    # The first occurrence is kept, with its strikethrough price
+    assert collector.listings[0]["price"] == "€1,200€1,450"
+
+
+def test_collector_tracks_the_pagination_cursor(body):
+    collector = ListingPayloadCollector()
+    assert collector.end_cursor is None
+    assert collector.has_next_page is None
+
+    collector.add_payload(body)
+
+    assert collector.end_cursor == "c2"
+    assert collector.has_next_page is True
+
+    last_page = json.loads(body.splitlines()[0])
+    page_info = last_page["data"]["marketplace_search"]["feed_units"]["page_info"]
+    page_info.update(end_cursor="c3", has_next_page=False)
+    collector.add_payload("for (;;);" + json.dumps(last_page))
+
+    assert collector.end_cursor == "c3"
+    assert collector.has_next_page is False
+
+
+def test_body_that_is_not_json_yields_nothing():
+    assert parse_listing_payload(b"<html></html>") == []
+
+
+def test_embedded_payloads(body):
+    document = body.splitlines()[0]
+    html = (
+        '<script type="application/json">{"other": 1}</script>'
+        f'<script type="application/json">{document}</script>'
+    )
+
+    payloads = extract_embedded_payloads(html)
+
+    assert payloads == [document]
+    assert len(parse_listing_payload(payloads[0])) == 2
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from main import app
+from utils.misc import BatchQueryParams, QueryParams
+
+PARAMS = {
+    "city": "Paris",
+    "query": "macbook",
+    "max_price": 1000,
+    "itemCondition": "used_like_new",
+}
+
+
+def test_llm_strategy_requires_a_model():
+    with pytest.raises(ValidationError):
+        QueryParams(**PARAMS, strategy="LLM", llm_choice="OpenAI")
+    with pytest.raises(ValidationError):
+        BatchQueryParams(
+            cities=["Paris"],
+            queries=["macbook"],
+            max_price=1000,
+            itemCondition="used_like_new",
+            strategy="LLM",
+            model_name="gpt-4",
+        )
+
+    params = QueryParams(
+        **PARAMS, strategy="LLM", llm_choice="OpenAI", model_name="gpt-4"
+    )
+    assert params.model_name == "gpt-4"
+    assert QueryParams(**PARAMS, strategy="CSS").llm_choice is None
+
+
+def test_llm_crawl_without_a_model_is_rejected():
+    client = TestClient(app)
+
+    response = client.get("/crawler/", params={**PARAMS, "strategy": "LLM"})
+    assert response.status_code == 422
+
+    response = client.post("/jobs", json={**PARAMS, "strategy": "LLM"})
+    assert response.status_code == 422
@@ -0,0 +1,188 @@
+import asyncio
+import time
+
+import pytest
+
+from services.result_cache import (
+    COALESCED,
+    HIT,
+    MISS,
+    STALE,
+    CacheStatus,
+    MemoryCacheBackend,
+    ResultCache,
+    result_cache_key,
+)
+from utils.misc import QueryParams
+
+
+class Producer:
+    def __init__(self, value=b"result", delay=0.02, error=None):
+        self.value = value
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(MemoryCacheBackend(16), fresh_ttl=60, stale_ttl=300)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_miss_then_hit(cache):
+    produce = Producer()
+
+    async def scenario():
+        first = await cache.get_or_produce("key", produce)
+        second = await cache.get_or_produce("key", produce)
+        return first, second
+
+    (value, miss), (cached, hit) = run(scenario())
+
+    assert value == cached == b"result"
+    assert (miss.state, hit.state) == (MISS, HIT)
+    assert produce.calls == 1
+
+
+def test_concurrent_identical_requests_share_one_producer(cache):
+    produce = Producer()
+
+    async def scenario():
+        return await asyncio.gather(
+            *(cache.get_or_produce("key", produce) for _ in range(5))
+        )
+
+    results = run(scenario())
+
+    assert produce.calls == 1
+    assert [value for value, _ in results] == [b"result"] * 5
+    states = [status.state for _, status in results]
+    assert states.count(MISS) == 1
+    assert states.count(COALESCED) == 4
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(cache):
+    produce = Producer(value=b"fresh")
+
+    async def scenario():
+        await cache.backend.set("key", b"stale", time.time() - 120, 360)
+        results = await asyncio.gather(
+            *(cache.get_or_produce("key", produce) for _ in range(3))
+        )
+        refresh = cache._inflight["key"]
+        await refresh
+        return results, await cache.get_or_produce("key", produce)
+
+    results, (value, status) = run(scenario())
+
+    assert [value for value, _ in results] == [b"stale"] * 3
+    assert all(status.state == STALE for _, status in results)
+    assert all(status.age >= 120 for _, status in results)
+    assert produce.calls == 1
+    assert (value, status.state) == (b"fresh", HIT)
+
+
+def test_expired_entry_is_produced_again(cache):
+    produce = Producer(value=b"new")
+
+    async def scenario():
+        await cache.backend.set("key", b"old", time.time() - 400, 500)
+        return await cache.get_or_produce("key", produce)
+
+    value, status = run(scenario())
+
+    assert (value, status.state) == (b"new", MISS)
+
+
+def test_producer_failure_is_not_cached(cache):
+    failing = Producer(error=RuntimeError("crawl failed"))
+    produce = Producer()
+
+    async def scenario():
+        results = await asyncio.gather(
+            cache.get_or_produce("key", failing),
+            cache.get_or_produce("key", failing),
+            return_exceptions=True,
+        )
+        return results, await cache.get_or_produce("key", produce)
+
+    results, (value, status) = run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert failing.calls == 1
+    assert (value, status.state) == (b"result", MISS)
+    assert produce.calls == 1
+
+
+def test_failed_refresh_keeps_the_stale_entry(cache):
+    failing = Producer(error=RuntimeError("crawl failed"))
+
+    async def scenario():
+        await cache.backend.set("key", b"stale", time.time() - 120, 360)
+        await cache.get_or_produce("key", failing)
+        await asyncio.gather(*cache._inflight.values(), return_exceptions=True)
+        return await cache.get_or_produce("key", failing)
+
+    value, status = run(scenario())
+
+    assert (value, status.state) == (b"stale", STALE)
+    # The next request starts a new refresh
+    assert failing.calls == 2
+
+
+def test_empty_result_is_not_cached(cache):
+    produce = Producer(value=None)
+
+    async def scenario():
+        await cache.get_or_produce("key", produce)
+        return await cache.get_or_produce("key", produce)
+
+    value, status = run(scenario())
+
+    assert (value, status.state) == (None, MISS)
+    assert produce.calls == 2
+
+
+def test_headers(cache):
+    assert cache.headers(CacheStatus(MISS)) == {
+        "X-Cache": "MISS",
+        "Age": "0",
+        "Cache-Control": "max-age=60, stale-while-revalidate=300",
+    }
+    assert cache.headers(CacheStatus(HIT, 12.7)) == {
+        "X-Cache": "HIT",
+        "Age": "12",
+        "Cache-Control": "max-age=47, stale-while-revalidate=300",
+    }
+    headers = cache.headers(CacheStatus(STALE, 90))
+    assert headers["X-Cache"] == "STALE"
+    assert headers["Age"] == "90"
+    assert headers["Cache-Control"].startswith("max-age=0,")
+
+
+def test_cache_key_ignores_irrelevant_parameters():
+    params = {
+        "city": "Paris",
+        "query": "macbook  pro",
+        "max_price": 1000,
+        "itemCondition": "used",
+        "strategy": "css",
+    }
+
+    key = result_cache_key(QueryParams(**params))
+
+    assert key == result_cache_key(
+        QueryParams(**{**params, "query": "MacBook Pro", "headless": False})
+    )
+    assert key != result_cache_key(QueryParams(**{**params, "max_price": 900}))
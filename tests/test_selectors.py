@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from core.config import settings
+from services import parser
+from services.parser_backends import extract_card_fields
+from utils.selectors import (
+    LISTING_CLASS,
+    LOCATION_CLASS,
+    PRICE_CLASS,
+    TITLE_CLASS,
+    SelectorRegistry,
+)
+
+LABELS = [
+    {"title": "MacBook Pro", "price": "€1,200", "location": "Paris, IDF"},
+    {"title": "MacBook Air", "price": "€650", "location": "Lyon, ARA"},
+    {"title": "Chargeur MacBook", "price": "Gratuit", "location": "Nantes"},
+]
+
+
+def card(labels, title_class, price_class, location_class):
+    return (
+        f'<div class="{LISTING_CLASS}">'
+        f'<a href="/marketplace/item/1/">'
+        f'<span class="{price_class}">{labels["price"]}</span>'
+        f'<span class="{title_class}">{labels["title"]}</span>'
+        f'<span class="{location_class}">{labels["location"]}</span>'
+        "</a></div>"
+    )
+
+
+def samples(title_class, price_class, location_class):
+    return [
+        (card(labels, title_class, price_class, location_class), labels)
+        for labels in LABELS
+    ]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return SelectorRegistry(str(tmp_path / "selectors.json"), min_accuracy=0.8)
+
+
+def test_learned_set_is_adopted_when_it_beats_the_active_set(registry):
+    # The site renamed the field classes
+    renamed = samples("xnew1 xtitle", "xnew2 xprice", "xnew3 xloc")
+
+    selector_set = registry.learn(renamed, extract_card_fields)
+
+    assert selector_set is not None
+    assert registry.active is selector_set
+    assert selector_set.fields["title"][0] == {
+        "tag": "span",
+        "class": "xnew1 xtitle",
+    }
+    for card_html, labels in renamed:
+        found = extract_card_fields(card_html, selector_set)
+        assert {field: found[field] for field in labels} == labels
+    # Cached for the next processes
+    reloaded = SelectorRegistry(registry.cache_path)
+    assert reloaded.active.version == selector_set.version
+
+
+def test_learned_set_is_not_adopted_unless_it_beats_the_active_set(registry):
+    builtin = registry.active
+    unchanged = samples(TITLE_CLASS, PRICE_CLASS, LOCATION_CLASS)
+
+    assert registry.learn(unchanged, extract_card_fields) is None
+    assert registry.active is builtin
+
+
+def test_learned_set_below_the_minimum_accuracy_is_not_adopted(registry):
+    builtin = registry.active
+    # Only the titles can be learned, the other fields share no class
+    mixed = [
+        (card(labels, "xtitle", f"xp{i}", f"xl{i}"), labels)
+        for i, labels in enumerate(LABELS)
+    ]
+
+    assert registry.learn(mixed, extract_card_fields) is None
+    assert registry.active is builtin
+
+
+def test_selectors_are_learned_off_the_event_loop(registry, monkeypatch):
+    monkeypatch.setattr(parser, "selector_registry", registry)
+    monkeypatch.setattr(settings, "SELECTOR_LEARN_SAMPLES", 5)
+    renamed = samples("xnew1 xtitle", "xnew2 xprice", "xnew3 xloc")
+    listings = [{"html": card_html} for card_html, _ in renamed]
+    threads = []
+    learn = registry.learn
+
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+        return learn(*args)
+
+    monkeypatch.setattr(registry, "learn", record_thread)
+
+    async def scenario():
+        loop_thread = threading.current_thread()
+        selector_set = await parser.learn_selectors(listings, LABELS)
+        return loop_thread, selector_set
+
+    loop_thread, selector_set = asyncio.run(scenario())
+
+    assert selector_set is registry.active
+    assert threads and threads[0] is not loop_thread
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from utils.serialization import (
+    ARROW_STREAM_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    NDJSON_MEDIA_TYPE,
+    arrow_ipc_to_dataframe,
+    dataframe_to_arrow_ipc,
+    negotiate_media_type,
+    to_ndjson_line,
+)
+
+
+def test_negotiate_media_type():
+    assert negotiate_media_type(None) == JSON_MEDIA_TYPE
+    assert negotiate_media_type("*/*") == JSON_MEDIA_TYPE
+    assert negotiate_media_type("application/x-ndjson") == NDJSON_MEDIA_TYPE
+    assert (
+        negotiate_media_type("text/html, application/vnd.apache.arrow.stream")
+        == ARROW_STREAM_MEDIA_TYPE
+    )
+
+
+def test_negotiate_media_type_follows_quality_values():
+    assert (
+        negotiate_media_type("application/json, application/x-ndjson;q=0.5")
+        == JSON_MEDIA_TYPE
+    )
+    assert (
+        negotiate_media_type(
+            "application/x-ndjson;q=0.5, application/vnd.apache.arrow.stream"
+        )
+        == ARROW_STREAM_MEDIA_TYPE
+    )
+    assert negotiate_media_type("application/x-ndjson;q=0") == JSON_MEDIA_TYPE
+    assert (
+        negotiate_media_type("*/*;q=0.1, application/x-ndjson; q=0.9")
+        == NDJSON_MEDIA_TYPE
+    )
+
+
+def test_arrow_round_trip():
+    df = pd.DataFrame({"title": ["MacBook"], "price": [1200.0]})
+
+    assert arrow_ipc_to_dataframe(dataframe_to_arrow_ipc(df)).equals(df)
+
+
+def test_ndjson_line():
+    assert to_ndjson_line({"title": "MacBook"}) == b'{"title":"MacBook"}\n'
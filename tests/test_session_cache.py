@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.session_cache import SessionCache
+
+
+def storage_state(marker, expires=-1):
+    return {
+        "cookies": [
+            {"name": "c_user", "value": marker, "expires": expires},
+            {"name": "xs", "value": marker, "expires": expires},
+            # Large enough for the writes to overlap
+            *(
+                {"name": f"cookie{i}", "value": marker * 64, "expires": -1}
+                for i in range(200)
+            ),
+        ],
+        "origins": [],
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SessionCache(str(tmp_path / "sessions"), ttl=3600)
+
+
+def test_saved_session_is_loaded(cache):
+    state = storage_state("a")
+
+    cache.save("user@example.com", state)
+
+    assert cache.load("user@example.com") == state
+    assert cache.load("other@example.com") is None
+
+
+def test_concurrent_saves_of_one_account(cache):
+    markers = [str(i) for i in range(16)]
+    barrier = threading.Barrier(len(markers))
+
+    def save(marker):
+        barrier.wait()
+        cache.save("user@example.com", storage_state(marker))
+
+    with ThreadPoolExecutor(len(markers)) as executor:
+        list(executor.map(save, markers))
+
+    files = os.listdir(cache.directory)
+    assert len(files) == 1
+    assert files[0].endswith(".json")
+    with open(os.path.join(cache.directory, files[0]), encoding="utf-8") as f:
+        entry = json.load(f)
+    # One save wins whole
+    marker = entry["storage_state"]["cookies"][0]["value"]
+    assert entry["storage_state"] == storage_state(marker)
+    assert cache.load("user@example.com") == storage_state(marker)
+
+
+def test_expired_sessions_are_not_loaded(cache):
+    cache.save("cookies@example.com", storage_state("a", time.time() - 1))
+    cache.save("ttl@example.com", storage_state("b"))
+
+    assert cache.load("cookies@example.com") is None
+    assert cache.load("ttl@example.com") is not None
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.load("ttl@example.com") is None
+
+
+def test_invalidated_session_is_not_loaded(cache):
+    cache.save("user@example.com", storage_state("a"))
+
+    cache.invalidate("user@example.com")
+    cache.invalidate("user@example.com")
+
+    assert cache.load("user@example.com") is None
@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+
+from services.task_queue import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    JobQueueFull,
+    MemoryQueueBackend,
+)
+
+
+@pytest.fixture
+def backend():
+    return MemoryQueueBackend(max_queue=2, max_deliveries=2, retention_ttl=60)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_tasks_are_delivered_in_order(backend):
+    async def scenario():
+        await backend.enqueue("a", {"n": 1})
+        await backend.enqueue("b", {"n": 2})
+        first = await backend.reserve("w1", 60)
+        second = await backend.reserve("w1", 60)
+        return first, second, await backend.reserve("w1", 60)
+
+    first, second, third = run(scenario())
+
+    assert (first.task_id, first.attempt, first.payload) == ("a", 1, {"n": 1})
+    assert second.task_id == "b"
+    assert third is None
+
+
+def test_full_queue_rejects_tasks(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        await backend.enqueue("b", {})
+        await backend.enqueue("c", {})
+
+    with pytest.raises(JobQueueFull):
+        run(scenario())
+
+
+def test_cancelled_task_frees_its_place_in_the_queue(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        await backend.enqueue("b", {})
+        status = await backend.cancel("a")
+        await backend.enqueue("c", {})
+        lease = await backend.reserve("w1", 60)
+        return status, lease, await backend.get("a")
+
+    status, lease, task = run(scenario())
+
+    assert status == CANCELLED
+    assert task["status"] == CANCELLED
+    assert lease.task_id == "b"
+
+
+def test_expired_lease_is_delivered_again(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        stale = await backend.reserve("w1", 0)
+        lease = await backend.reserve("w2", 60)
+        return stale, lease, await backend.extend(stale, 60)
+
+    stale, lease, extended = run(scenario())
+
+    assert lease.task_id == "a"
+    assert (stale.attempt, lease.attempt) == (1, 2)
+    assert lease.worker_id == "w2"
+    # The stale delivery lost its lease
+    assert not extended
+
+
+def test_extended_lease_is_not_delivered_again(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        lease = await backend.reserve("w1", 0)
+        held = await backend.extend(lease, 60)
+        return held, await backend.reserve("w2", 60)
+
+    held, lease = run(scenario())
+
+    assert held
+    assert lease is None
+
+
+def test_task_fails_after_max_deliveries(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        await backend.reserve("w1", 0)
+        await backend.reserve("w2", 0)
+        lease = await backend.reserve("w3", 60)
+        return lease, await backend.get("a")
+
+    lease, task = run(scenario())
+
+    assert lease is None
+    assert task["status"] == FAILED
+    assert task["attempts"] == 2
+    assert task["error"] == "Gave up after 2 deliveries"
+
+
+def test_released_task_does_not_count_as_a_delivery(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        await backend.release(await backend.reserve("w1", 60))
+        return await backend.reserve("w2", 60)
+
+    lease = run(scenario())
+
+    assert (lease.task_id, lease.attempt) == ("a", 1)
+
+
+def test_first_finish_wins(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        stale = await backend.reserve("w1", 0)
+        lease = await backend.reserve("w2", 60)
+        first = await backend.finish(lease.task_id, DONE, b"second")
+        second = await backend.finish(stale.task_id, FAILED, b"", "stale")
+        return first, second, await backend.get("a")
+
+    first, second, task = run(scenario())
+
+    assert first and not second
+    assert task["status"] == DONE
+    assert task["result"] == b"second"
+    assert task["error"] is None
+
+
+def test_finish_of_a_cancelled_task_is_dropped(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        lease = await backend.reserve("w1", 60)
+        await backend.cancel("a")
+        return await backend.finish(lease.task_id, DONE), await backend.get("a")
+
+    finished, task = run(scenario())
+
+    assert not finished
+    assert task["status"] == CANCELLED
+
+
+def test_listings_are_published_once_per_task(backend):
+    records = [
+        {"item_number": "1", "url": "u1", "price": "€10"},
+        {"item_number": "2", "url": "u2", "price": "€20"},
+    ]
+
+    async def scenario():
+        await backend.enqueue("a", {})
+        await backend.publish_listings("a", records[:1])
+        # A later delivery publishes the same listings again
+        await backend.publish_listings("a", records)
+        return (
+            await backend.listings("a"),
+            await backend.listings("a", start=1),
+            await backend.count_listings("a"),
+        )
+
+    listings, tail, count = run(scenario())
+
+    assert listings == records
+    assert tail == records[1:]
+    assert count == 2
+
+
+def test_unknown_task(backend):
+    async def scenario():
+        return await backend.get("a"), await backend.cancel("a")
+
+    assert run(scenario()) == (None, None)
+
+
+def test_statuses_of_a_delivery(backend):
+    async def scenario():
+        await backend.enqueue("a", {})
+        queued = (await backend.get("a"))["status"]
+        await backend.reserve("w1", 60)
+        return queued, await backend.get("a")
+
+    queued, task = run(scenario())
+
+    assert queued == QUEUED
+    assert task["status"] == RUNNING
+    assert task["worker"] == "w1"
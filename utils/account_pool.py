@@ -0,0 +1,240 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+from core.config import settings
+from core.logging import setup_logging
+from utils.misc import DEFAULT_MARKETPLACE_BASE_URL
+
+logger = setup_logging()
+
+
+class AccountPoolExhausted(Exception):
+    """
+    Raised when no account became available within the acquire timeout.
+    """
+
+
+class AccountBlocked(Exception):
+    """
+    Raised when the site sends an account to a checkpoint or block page.
+    """
+
+
+class Account:
+    """
+    A Facebook account crawls are scheduled on.
+
+    Attributes:
+        email (str): The login email.
+        password (str): The login password.
+        max_concurrency (int): Maximum number of crawls run at once.
+        request_budget (int): Marketplace navigations allowed per budget
+            window.
+        budget_window (float): The budget window in seconds.
+    """
+
+    def __init__(
+        self, email, password, max_concurrency, request_budget, budget_window
+    ):
+        self.email = email
+        self.password = password
+        self.max_concurrency = max_concurrency
+        self.request_budget = request_budget
+        self.budget_window = budget_window
+
+        self.active = 0
+        self.last_used = 0.0
+        self.cooldown_until = 0.0
+        self.blocked_total = 0
+        self.requests_total = 0
+        self._window_start = 0.0
+        self._window_requests = 0
+
+    @property
+    def session_key(self):
+        """
+        The key of the account sessions in the session cache; sessions of
+        another site (e.g. a stand-in) are saved apart.
+        """
+        if settings.MARKETPLACE_BASE_URL == DEFAULT_MARKETPLACE_BASE_URL:
+            return self.email
+        return f"{self.email}@{settings.MARKETPLACE_BASE_URL}"
+
+    @property
+    def credentials(self):
+        return self.email, self.password
+
+    def spend(self):
+        """
+        Count a marketplace navigation against the request budget.
+        """
+        self._roll_window(time.time())
+        self._window_requests += 1
+        self.requests_total += 1
+
+    def available_at(self, now):
+        """
+        Returns:
+            float: When the account can take one more crawl, ``now`` if it
+            can right away, infinity if only a finishing crawl frees it.
+        """
+        self._roll_window(now)
+        if self.active >= self.max_concurrency:
+            return float("inf")
+        at = max(now, self.cooldown_until)
+        if self._window_requests >= self.request_budget:
+            at = max(at, self._window_start + self.budget_window)
+        return at
+
+    def stats(self, now):
+        self._roll_window(now)
+        return {
+            "email": self.email,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "requests_in_window": self._window_requests,
+            "request_budget": self.request_budget,
+            "requests_total": self.requests_total,
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 1),
+            "blocked_total": self.blocked_total,
+            "last_used": self.last_used or None,
+        }
+
+    def _roll_window(self, now):
+        if now - self._window_start >= self.budget_window:
+            self._window_start = now
+            self._window_requests = 0
+
+
+class AccountPool:
+    """
+    Schedules crawls across several accounts.
+
+    Each crawl takes the least recently used account that has a free crawl
+    slot, request budget left and no cooldown, waiting for one if needed.
+    An account sent to a checkpoint or block page cools down for
+    ``cooldown`` seconds.
+
+    Attributes:
+        accounts (List[Account]): The accounts.
+        cooldown (float): Seconds a blocked account is left unused.
+        acquire_timeout (float): Seconds to wait for an available account.
+    """
+
+    def __init__(self, accounts, cooldown, acquire_timeout):
+        if not accounts:
+            raise ValueError("The account pool needs at least one account")
+        self.accounts = accounts
+        self.cooldown = cooldown
+        self.acquire_timeout = acquire_timeout
+
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Take an account for the duration of a crawl.
+
+        Yields:
+            Account: The account.
+
+        Raises:
+            AccountPoolExhausted: If no account became available within
+                ``acquire_timeout`` seconds.
+        """
+        account = await self._wait_for_account()
+        try:
+            yield account
+        except AccountBlocked:
+            self.cool_down(account)
+            raise
+        finally:
+            async with self._changed:
+                account.active -= 1
+                self._changed.notify_all()
+
+    def cool_down(self, account):
+        account.cooldown_until = time.time() + self.cooldown
+        account.blocked_total += 1
+        logger.warning(
+            f"Account {account.email} blocked, cooling down for "
+            f"{self.cooldown}s"
+        )
+
+    def stats(self):
+        """
+        Return the usage, budget and cooldown of every account.
+
+        Returns:
+            List[dict]: Per account statistics, without credentials.
+        """
+        now = time.time()
+        return [account.stats(now) for account in self.accounts]
+
+    async def _wait_for_account(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        async with self._changed:
+            while True:
+                now = time.time()
+                available_at = {a: a.available_at(now) for a in self.accounts}
+                ready = [a for a, at in available_at.items() if at <= now]
+                if ready:
+                    # Least recently used first
+                    account = min(ready, key=lambda a: a.last_used)
+                    account.active += 1
+                    account.last_used = now
+                    return account
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AccountPoolExhausted(
+                        f"No account available after {self.acquire_timeout}s"
+                    )
+                try:
+                    # Woken when a crawl finishes, or when the next cooldown
+                    # or budget window ends
+                    next_at = min(available_at.values())
+                    await asyncio.wait_for(
+                        self._changed.wait(), min(remaining, next_at - now)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+
+def load_accounts(path):
+    """
+    Load the accounts of the pool.
+
+    Args:
+        path (str): A JSON file listing the accounts as objects with an
+            ``email``, a ``password`` and, optionally, ``max_concurrency``
+            and ``request_budget``. When empty, the pool holds the single
+            ``FACEBOOK_EMAIL`` account.
+
+    Returns:
+        List[Account]: The accounts.
+    """
+    entries = [
+        {"email": settings.FACEBOOK_EMAIL, "password": settings.FACEBOOK_PASSWORD}
+    ]
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    return [
+        Account(
+            entry["email"],
+            entry["password"],
+            entry.get("max_concurrency", settings.ACCOUNT_MAX_CONCURRENCY),
+            entry.get("request_budget", settings.ACCOUNT_REQUEST_BUDGET),
+            settings.ACCOUNT_BUDGET_WINDOW,
+        )
+        for entry in entries
+    ]
+
+
+account_pool = AccountPool(
+    accounts=load_accounts(settings.FACEBOOK_ACCOUNTS_FILE),
+    cooldown=settings.ACCOUNT_COOLDOWN,
+    acquire_timeout=settings.ACCOUNT_ACQUIRE_TIMEOUT,
+)
@@ -1,35 +1,94 @@
 import playwright
 import asyncio
+import time
 
 from playwright.async_api import Page
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
 from core.config import settings
 from core.logging import setup_logging
+from services.marketplace_graphql import (
+    GRAPHQL_URL_PATTERN,
+    LISTING_TITLE_KEY,
+    ListingPayloadCollector,
+)
+from utils.account_pool import AccountBlocked
+from utils.metrics import span, timed
+from utils.recording import recorder
+from utils.routing import apply_routing_policy
+from utils.selectors import LISTING_LINK_SELECTOR, selector_registry
+from utils.session_cache import session_cache
 
 logger = setup_logging()
 
 
-async def setup_browser_context(playwright, headless):
+@timed("browser_launch")
+async def launch_browser(playwright, headless):
+    """
+    Launch a WebKit browser using Playwright.
+
+    Args:
+        playwright (Playwright): The Playwright instance.
+        headless (bool): Whether to run the browser in headless mode.
+
+    Returns:
+        Browser: The launched browser.
+    """
+    if not isinstance(headless, bool):
+        raise TypeError("headless must be a boolean value")
+
+    return await playwright.webkit.launch(
+        headless=headless,
+        args=["--disable-blink-features=AutomationControlled"],
+    )
+
+
+async def new_browser_context(browser, storage_state=None, routing_mode="page"):
+    """
+    Create a new isolated browser context.
+
+    Args:
+        browser (Browser): The browser to open the context in.
+        storage_state (dict, optional): A saved storage state (cookies and
+            local storage) to start the context already authenticated.
+        routing_mode (str, optional): The crawl mode selecting the request
+            routing policy ("page", "scroll", "login" or "off"). Defaults to
+            "page".
+
+    Returns:
+        BrowserContext: The new context.
+    """
+    context = await browser.new_context(
+        locale="en-US",  # Setting the browser language to English
+        storage_state=storage_state,
+        # Saved when the context closes, if recording
+        record_har_path=recorder.har_path(),
+    )
+    await apply_routing_policy(context, routing_mode)
+    return context
+
+
+async def setup_browser_context(
+    playwright, headless, storage_state=None, routing_mode="page"
+):
     """
     Set up a browser context using Playwright.
 
     Args:
         playwright (Playwright): The Playwright instance.
         headless (bool): Whether to run the browser in headless mode.
+        storage_state (dict, optional): A saved storage state to start the
+            context already authenticated.
+        routing_mode (str, optional): The crawl mode selecting the request
+            routing policy. Defaults to "page".
 
     Returns:
         Tuple: A tuple containing the browser and context objects.
     """
     try:
-        if not isinstance(headless, bool):
-            raise TypeError("headless must be a boolean value")
-
-        browser = await playwright.webkit.launch(
-            headless=headless,
-            args=["--disable-blink-features=AutomationControlled"],
-        )
-        context = await browser.new_context(
-            locale="en-US",  # Setting the browser language to English
+        browser = await launch_browser(playwright, headless)
+        context = await new_browser_context(
+            browser, storage_state, routing_mode
         )
         return browser, context
     except Exception as e:
@@ -62,7 +121,10 @@ async def handle_cookies_popup(page, button_txt, headless):
         logger.error(f"An error occurred while handling cookies popup: {e}")
 
 
-async def login_facebook(page, url_login):
+@timed("login")
+async def login_facebook(page, url_login, email=None, password=None):
+    email = email or settings.FACEBOOK_EMAIL
+    password = password or settings.FACEBOOK_PASSWORD
     try:
         await page.goto(url_login)
 
@@ -71,11 +133,11 @@ async def login_facebook(page, url_login):
         email_input = await page.wait_for_selector(
             'input[name="email"]', timeout=90000
         )
-        await email_input.fill(settings.FACEBOOK_EMAIL)
+        await email_input.fill(email)
         password_input = await page.wait_for_selector(
             'input[name="pass"]', timeout=90000
         )
-        await password_input.fill(settings.FACEBOOK_PASSWORD)
+        await password_input.fill(password)
         await page.click("button[name='login']")
         await page.wait_for_load_state("domcontentloaded")
         logger.info("Logged in Facebook")
@@ -85,17 +147,421 @@ async def login_facebook(page, url_login):
         raise
 
 
-async def scrape_marketplace(page: Page, url_marketplace):
-    await page.goto(url_marketplace)
-    await asyncio.sleep(2)
+async def login_and_save_session(page, url_login, account, credentials=None):
+    """
+    Log in to Facebook and cache the resulting storage state for the account.
+
+    Args:
+        page (Page): The page to log in with.
+        url_login (str): The login URL.
+        account (str): The account identifier the session is saved under.
+        credentials (Tuple[str, str], optional): The email and password,
+            ``FACEBOOK_EMAIL`` and ``FACEBOOK_PASSWORD`` by default.
+
+    Raises:
+        AccountBlocked: If the login landed on a checkpoint.
+    """
+    await login_facebook(page, url_login, *(credentials or ()))
+    if is_account_blocked(page):
+        raise AccountBlocked(f"Account {account} sent to a checkpoint")
+    session_cache.save(account, await page.context.storage_state())
+
+
+def is_session_rejected(page: Page):
+    """
+    Check whether the site bounced a saved session back to the login form.
+
+    Args:
+        page (Page): The page after navigation.
+
+    Returns:
+        bool: True if the page landed on the login flow.
+    """
+    return "/login" in page.url
+
+
+def is_account_blocked(page: Page):
+    """
+    Check whether the site sent the account to a checkpoint or block page,
+    which logging in again does not clear.
+
+    Args:
+        page (Page): The page after navigation.
+
+    Returns:
+        bool: True if the page landed on the checkpoint flow.
+    """
+    return "/checkpoint" in page.url
+
+
+class FacebookSession:
+    """
+    Authenticated Facebook session shared by every page of a browser context.
+
+    Logs in at most once per context and, when the site rejects a saved
+    session, renews it once no matter how many pages noticed the rejection
+    concurrently.
+
+    Attributes:
+        account (str): The account identifier the session is saved under.
+        url_login (str): The login URL.
+        authenticated (bool): Whether the context holds a session cookie.
+        credentials (Tuple[str, str], optional): The email and password of
+            the account, ``FACEBOOK_EMAIL`` and ``FACEBOOK_PASSWORD`` by
+            default.
+        on_navigation (Callable, optional): Called before each marketplace
+            navigation, e.g. to count it against the account budget.
+    """
+
+    def __init__(
+        self,
+        account,
+        url_login,
+        authenticated=False,
+        credentials=None,
+        on_navigation=None,
+    ):
+        self.account = account
+        self.url_login = url_login
+        self.authenticated = authenticated
+        self.credentials = credentials
+        self.on_navigation = on_navigation
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def ensure(self, page: Page):
+        """
+        Log in with ``page`` unless the context is already authenticated.
+        """
+        if self.authenticated:
+            return
+        async with self._lock:
+            if not self.authenticated:
+                logger.info(f"Navigating to login page: {self.url_login}")
+                await login_and_save_session(
+                    page, self.url_login, self.account, self.credentials
+                )
+                self.authenticated = True
+                self._generation += 1
+
+    async def scrape(
+        self, page: Page, url_marketplace, scraper=None, **scrape_kwargs
+    ):
+        """
+        Scrape a marketplace page, renewing the session if it was rejected.
+
+        Args:
+            page (Page): The page to navigate with.
+            url_marketplace (str): The marketplace search URL.
+            scraper (Callable, optional): The scraping coroutine function,
+                ``scrape_marketplace`` (default) or
+                ``capture_marketplace_listings``.
+            **scrape_kwargs: Forwarded to the scraper.
+
+        Returns:
+            The scraper result: the HTML of the marketplace page, or the
+            listings decoded from its payloads.
+
+        Raises:
+            AccountBlocked: If the site sent the account to a checkpoint.
+        """
+        scraper = scraper or scrape_marketplace
+        recorder.attach(page)
+        await self.ensure(page)
+        generation = self._generation
+        html = await self._navigate(scraper, page, url_marketplace, scrape_kwargs)
+
+        if is_session_rejected(page):
+            async with self._lock:
+                if self._generation == generation:
+                    logger.info("Saved session rejected, logging in again")
+                    session_cache.invalidate(self.account)
+                    await login_and_save_session(
+                        page, self.url_login, self.account, self.credentials
+                    )
+                    self._generation += 1
+            html = await self._navigate(
+                scraper, page, url_marketplace, scrape_kwargs
+            )
+
+        return html
+
+    async def _navigate(self, scraper, page, url_marketplace, scrape_kwargs):
+        if self.on_navigation is not None:
+            self.on_navigation()
+        result = await scraper(page, url_marketplace, **scrape_kwargs)
+        if is_account_blocked(page):
+            raise AccountBlocked(f"Account {self.account} sent to a checkpoint")
+        return result
+
 
-    await page.wait_for_load_state("domcontentloaded")
-    html = await page.content()
-    await page.screenshot(path="data/marketplace_posts.png")
+# Returns the outer HTML of listing cards not collected yet and marks them
+# as seen, so each scroll step serialises only the newly appended nodes.
+COLLECT_NEW_LISTINGS_JS = """
+(selector) => {
+    const nodes = document.querySelectorAll(selector + ':not([data-wdc-seen])');
+    const html = [];
+    for (const node of nodes) {
+        html.push(node.outerHTML);
+        node.setAttribute('data-wdc-seen', '1');
+    }
+    return html;
+}
+"""
+
+HAS_NEW_LISTINGS_JS = """
+(selector) => document.querySelector(selector + ':not([data-wdc-seen])') !== null
+"""
+
+
+async def wait_for_listings(page: Page, timeout):
+    """
+    Wait until at least one listing card is attached to the page.
+
+    Args:
+        page (Page): The marketplace page.
+        timeout (float): Maximum time to wait in milliseconds.
+
+    Returns:
+        bool: True if a listing appeared, False on timeout.
+    """
+    # Item links still show up when the listing card classes rotate
+    selector = ", ".join(
+        (selector_registry.active.listing_selector, LISTING_LINK_SELECTOR)
+    )
+    try:
+        await page.wait_for_selector(
+            selector, state="attached", timeout=timeout
+        )
+        return True
+    except PlaywrightTimeoutError:
+        logger.warning("No listing found on the marketplace page")
+        return False
+
+
+@timed("scroll")
+async def scroll_marketplace(page: Page, max_listings, time_budget):
+    """
+    Scroll the results page and collect listing cards as they are appended.
+
+    Stops once ``max_listings`` cards are collected, ``time_budget`` seconds
+    have elapsed, or a scroll step loads no new card.
+
+    Args:
+        page (Page): The marketplace page, with the first results loaded.
+        max_listings (int): Target number of listing cards.
+        time_budget (float): Maximum scrolling time in seconds.
+
+    Returns:
+        List[str]: Outer HTML of every collected listing card.
+    """
+    deadline = time.monotonic() + time_budget
+    listings = []
+    selector = selector_registry.active.listing_selector
+    if await page.query_selector(selector) is None:
+        logger.warning("Listing cards not found, collecting item links")
+        selector = LISTING_LINK_SELECTOR
+
+    while True:
+        with span("dom_serialisation"):
+            new_listings = await page.evaluate(
+                COLLECT_NEW_LISTINGS_JS, selector
+            )
+        listings.extend(new_listings)
+        logger.info(
+            f"Collected {len(new_listings)} new listings ({len(listings)} total)"
+        )
+
+        remaining = deadline - time.monotonic()
+        if len(listings) >= max_listings or remaining <= 0:
+            break
+
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            await page.wait_for_function(
+                HAS_NEW_LISTINGS_JS,
+                arg=selector,
+                timeout=min(settings.SCROLL_IDLE_TIMEOUT, remaining) * 1000,
+            )
+        except PlaywrightTimeoutError:
+            logger.info("No new listings after scrolling, stopping")
+            break
+
+    return listings[:max_listings]
+
+
+async def scrape_marketplace(
+    page: Page,
+    url_marketplace,
+    scroll=False,
+    max_listings=None,
+    time_budget=None,
+):
+    """
+    Load a marketplace search page and return its listings HTML.
+
+    Args:
+        page (Page): The page to navigate with.
+        url_marketplace (str): The marketplace search URL.
+        scroll (bool, optional): Whether to keep scrolling to load more
+            results. Defaults to False.
+        max_listings (int, optional): Target number of listings when
+            scrolling.
+        time_budget (float, optional): Maximum scrolling time in seconds.
+
+    Returns:
+        str: The page HTML, or a document made of the collected listing
+        cards when scrolling.
+    """
+    with span("navigation", url=url_marketplace):
+        await page.goto(url_marketplace, wait_until="domcontentloaded")
+        found = await wait_for_listings(
+            page, settings.LISTING_WAIT_TIMEOUT * 1000
+        )
+
+    if scroll and found:
+        listings = await scroll_marketplace(
+            page,
+            max_listings or settings.SCROLL_MAX_LISTINGS,
+            time_budget or settings.SCROLL_TIME_BUDGET,
+        )
+        html = "<html><body>" + "".join(listings) + "</body></html>"
+    else:
+        with span("dom_serialisation"):
+            html = await page.content()
+    with span("screenshot"):
+        await page.screenshot(path="data/marketplace_posts.png")
 
     return html
 
 
+# Returns the JSON scripts of the page holding listings, i.e. the first
+# results rendered by the server
+EMBEDDED_PAYLOADS_JS = """
+(key) => Array.from(
+    document.querySelectorAll('script[type="application/json"]'),
+    (script) => script.textContent,
+).filter((text) => text.includes(key))
+"""
+
+
+async def capture_marketplace_listings(
+    page: Page,
+    url_marketplace,
+    scroll=False,
+    max_listings=None,
+    time_budget=None,
+):
+    """
+    Load a marketplace search page and decode its listings from the JSON
+    payloads the page receives, without serialising the DOM.
+
+    The first results come from the JSON embedded in the page scripts (or
+    the first GraphQL responses); with ``scroll`` the page keeps scrolling
+    while every GraphQL response is decoded as it arrives.
+
+    Args:
+        page (Page): The page to navigate with.
+        url_marketplace (str): The marketplace search URL.
+        scroll (bool, optional): Whether to keep scrolling to load more
+            results. Defaults to False.
+        max_listings (int, optional): Target number of listings when
+            scrolling.
+        time_budget (float, optional): Maximum scrolling time in seconds.
+
+    Returns:
+        List[dict]: The listings decoded, empty if no payload held any.
+    """
+    collector = ListingPayloadCollector()
+    arrived = asyncio.Event()
+    pending = set()
+
+    async def read_response(response):
+        try:
+            body = await response.body()
+        except Exception as e:
+            logger.debug(f"Could not read GraphQL response: {e}")
+            return
+        with span("payload_decode"):
+            new_listings = collector.add_payload(body)
+        if new_listings:
+            arrived.set()
+
+    def on_response(response):
+        if response.request.method == "POST" and GRAPHQL_URL_PATTERN.search(
+            response.url
+        ):
+            task = asyncio.create_task(read_response(response))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+    page.on("response", on_response)
+    try:
+        with span("navigation", url=url_marketplace):
+            await page.goto(url_marketplace, wait_until="domcontentloaded")
+            for payload in await page.evaluate(
+                EMBEDDED_PAYLOADS_JS, LISTING_TITLE_KEY
+            ):
+                with span("payload_decode"):
+                    collector.add_payload(payload)
+            if not len(collector):
+                try:
+                    await asyncio.wait_for(
+                        arrived.wait(), settings.LISTING_WAIT_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("No listing payload on the marketplace page")
+
+        if scroll and len(collector):
+            with span("scroll"):
+                await scroll_marketplace_payloads(
+                    page,
+                    collector,
+                    arrived,
+                    max_listings or settings.SCROLL_MAX_LISTINGS,
+                    time_budget or settings.SCROLL_TIME_BUDGET,
+                )
+        # Responses already received are decoded before returning
+        await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        page.remove_listener("response", on_response)
+
+    listings = collector.listings
+    if scroll:
+        listings = listings[: max_listings or settings.SCROLL_MAX_LISTINGS]
+    logger.info(f"Decoded {len(listings)} listings from the page payloads")
+    return listings
+
+
+async def scroll_marketplace_payloads(
+    page: Page, collector, arrived, max_listings, time_budget
+):
+    """
+    Scroll the results page until ``max_listings`` listings are decoded,
+    ``time_budget`` seconds have elapsed, the payloads report no next page,
+    or a scroll step brings no new listing.
+    """
+    deadline = time.monotonic() + time_budget
+    while True:
+        remaining = deadline - time.monotonic()
+        if len(collector) >= max_listings or remaining <= 0:
+            break
+        if collector.has_next_page is False:
+            logger.info("No more results to load, stopping")
+            break
+        arrived.clear()
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            await asyncio.wait_for(
+                arrived.wait(), min(settings.SCROLL_IDLE_TIMEOUT, remaining)
+            )
+        except asyncio.TimeoutError:
+            logger.info("No new listing payload after scrolling, stopping")
+            break
+        logger.info(f"Decoded {len(collector)} listings so far")
+
+
+@timed("storage_write")
 async def save_html(html, filepath):
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(html)
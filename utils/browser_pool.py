@@ -0,0 +1,373 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from core.config import settings
+from core.logging import setup_logging
+from utils.browser import launch_browser, new_browser_context
+
+logger = setup_logging()
+
+
+class BrowserPoolExhausted(Exception):
+    """
+    Raised when the pool wait queue is full, a context could not be
+    acquired within the configured timeout, or no browser could be launched.
+    """
+
+
+class _PooledBrowser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+        self.retired = False
+
+
+class _StickyContext:
+    def __init__(self, pooled, context, session):
+        self.pooled = pooled
+        self.context = context
+        self.session = session
+        self.active = 0
+        self.dropped = False
+
+
+class BrowserPool:
+    """
+    Pool of warm Playwright browsers handing out isolated contexts.
+
+    Each acquired context is a fresh ``BrowserContext`` (own cookies, cache and
+    storage) opened on one of the long-lived browsers, so requests never share
+    state while the browser cold start is paid only once. A browser is retired
+    and replaced after ``max_uses`` contexts to bound memory growth.
+
+    Sticky contexts stay open instead and are handed out again for the same
+    key (e.g. one per account), keeping their cookies, cache and session,
+    until their browser is recycled or ``drop`` closes them.
+
+    Attributes:
+        size (int): Number of warm browsers.
+        contexts_per_browser (int): Concurrent contexts allowed per browser.
+        max_queue (int): Maximum number of requests waiting for a context.
+        max_uses (int): Contexts served by a browser before it is recycled.
+        acquire_timeout (float): Seconds to wait for a free context.
+        headless (bool): Whether pooled browsers run headless.
+    """
+
+    def __init__(
+        self,
+        size,
+        contexts_per_browser,
+        max_queue,
+        max_uses,
+        acquire_timeout,
+        headless,
+    ):
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.max_queue = max_queue
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self.headless = headless
+
+        self._playwright = None
+        self._browsers = []
+        self._lock = asyncio.Lock()
+        # Sticky key: sticky context
+        self._sticky = {}
+        self._sticky_locks = {}
+        self._slots = None
+        self._waiting = 0
+        self._acquired_total = 0
+        self._recycled_total = 0
+        self._rejected_total = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    @property
+    def started(self):
+        return self._playwright is not None
+
+    async def start(self):
+        """
+        Start Playwright and launch the warm browsers.
+        """
+        if self.started:
+            return
+        logger.info(f"Starting browser pool with {self.size} browsers")
+        self._playwright = await async_playwright().start()
+        self._slots = asyncio.Semaphore(self.size * self.contexts_per_browser)
+        for _ in range(self.size):
+            self._browsers.append(await self._launch())
+
+    async def stop(self):
+        """
+        Close every pooled browser and stop Playwright.
+        """
+        if not self.started:
+            return
+        logger.info("Stopping browser pool")
+        for pooled in self._browsers:
+            await self._close(pooled)
+        self._browsers = []
+        self._sticky = {}
+        self._sticky_locks = {}
+        await self._playwright.stop()
+        self._playwright = None
+
+    @asynccontextmanager
+    async def context(self, storage_state=None, routing_mode="page"):
+        """
+        Acquire an isolated browser context for the duration of the block.
+
+        Args:
+            storage_state (dict, optional): A saved storage state to start the
+                context already authenticated.
+            routing_mode (str, optional): The crawl mode selecting the
+                request routing policy. Defaults to "page".
+
+        Raises:
+            BrowserPoolExhausted: If the wait queue is full, no context
+                became available within ``acquire_timeout`` seconds, or no
+                browser could be launched.
+        """
+        if not self.started:
+            raise RuntimeError("Browser pool is not started")
+
+        await self._wait_for_slot()
+        try:
+            pooled = await self._checkout()
+            try:
+                context = await new_browser_context(
+                    pooled.browser, storage_state, routing_mode
+                )
+                try:
+                    yield context
+                finally:
+                    await context.close()
+            finally:
+                await self._checkin(pooled)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def sticky_context(
+        self,
+        sticky_key,
+        storage_state=None,
+        routing_mode="page",
+        new_session=None,
+    ):
+        """
+        Acquire the sticky browser context of a key for the duration of the
+        block, opening it on first use.
+
+        Args:
+            sticky_key (str): The key the context is kept under.
+            storage_state (dict, optional): A saved storage state to open the
+                context already authenticated.
+            routing_mode (str, optional): The crawl mode selecting the
+                request routing policy. Defaults to "page".
+            new_session (Callable, optional): Builds the session kept with
+                the context when it is opened.
+
+        Yields:
+            Tuple: The browser context and its session.
+
+        Raises:
+            BrowserPoolExhausted: If the wait queue is full, no context
+                became available within ``acquire_timeout`` seconds, or no
+                browser could be launched.
+        """
+        if not self.started:
+            raise RuntimeError("Browser pool is not started")
+
+        await self._wait_for_slot()
+        try:
+            sticky = await self._checkout_sticky(
+                sticky_key, storage_state, routing_mode, new_session
+            )
+            try:
+                yield sticky.context, sticky.session
+            finally:
+                sticky.active -= 1
+                if sticky.dropped and sticky.active == 0:
+                    await self._close_sticky(sticky)
+                await self._checkin(sticky.pooled)
+        finally:
+            self._slots.release()
+
+    async def drop(self, sticky_key):
+        """
+        Close the sticky context of a key, e.g. once its account is blocked.
+
+        The next acquisition of the key opens a new context; crawls still
+        using the dropped one keep it until the last of them releases it.
+        """
+        sticky = self._sticky.pop(sticky_key, None)
+        if sticky is None:
+            return
+        sticky.dropped = True
+        if sticky.active == 0:
+            await self._close_sticky(sticky)
+
+    def metrics(self):
+        """
+        Return a snapshot of pool size, usage and wait-time metrics.
+
+        Returns:
+            dict: Pool metrics.
+        """
+        acquired = self._acquired_total
+        return {
+            "browsers": len(self._browsers),
+            "capacity": self.size * self.contexts_per_browser,
+            "active_contexts": sum(b.active for b in self._browsers),
+            "sticky_contexts": len(self._sticky),
+            "waiting": self._waiting,
+            "max_queue": self.max_queue,
+            "acquired_total": acquired,
+            "rejected_total": self._rejected_total,
+            "recycled_total": self._recycled_total,
+            "wait_seconds_total": round(self._wait_seconds_total, 4),
+            "wait_seconds_avg": (
+                round(self._wait_seconds_total / acquired, 4) if acquired else 0.0
+            ),
+            "wait_seconds_max": round(self._wait_seconds_max, 4),
+        }
+
+    async def _wait_for_slot(self):
+        if self._waiting >= self.max_queue:
+            self._rejected_total += 1
+            raise BrowserPoolExhausted("Browser pool wait queue is full")
+
+        self._waiting += 1
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                self._slots.acquire(), timeout=self.acquire_timeout
+            )
+        except asyncio.TimeoutError:
+            self._rejected_total += 1
+            raise BrowserPoolExhausted(
+                f"No browser context available after {self.acquire_timeout}s"
+            )
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - start_time
+        self._acquired_total += 1
+        self._wait_seconds_total += waited
+        self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+    async def _checkout(self, pooled=None):
+        async with self._lock:
+            for browser in list(self._browsers):
+                if not browser.browser.is_connected():
+                    logger.warning("Pooled browser disconnected, replacing it")
+                    await self._retire(browser)
+            if len(self._browsers) < self.size:
+                # Browsers whose replacement failed to launch are relaunched
+                # lazily
+                await self._replenish()
+
+            if pooled is None:
+                if not self._browsers:
+                    raise BrowserPoolExhausted("No pooled browser available")
+                pooled = min(self._browsers, key=lambda b: b.active)
+            pooled.uses += 1
+            pooled.active += 1
+            if pooled.uses >= self.max_uses:
+                await self._retire(pooled)
+            return pooled
+
+    async def _checkout_sticky(
+        self, key, storage_state, routing_mode, new_session
+    ):
+        async with self._sticky_locks.setdefault(key, asyncio.Lock()):
+            sticky = self._sticky.get(key)
+            if sticky is not None:
+                pooled = sticky.pooled
+                if not pooled.retired and pooled.browser.is_connected():
+                    # Reuses count too, so sticky contexts are recycled with
+                    # their browser
+                    await self._checkout(pooled)
+                    sticky.active += 1
+                    return sticky
+
+            pooled = await self._checkout()
+            try:
+                context = await new_browser_context(
+                    pooled.browser, storage_state, routing_mode
+                )
+            except BaseException:
+                await self._checkin(pooled)
+                raise
+            session = new_session() if new_session is not None else None
+            sticky = _StickyContext(pooled, context, session)
+            sticky.active += 1
+            self._sticky[key] = sticky
+            return sticky
+
+    async def _checkin(self, pooled):
+        async with self._lock:
+            pooled.active -= 1
+            if pooled.retired and pooled.active == 0:
+                await self._close(pooled)
+
+    async def _retire(self, pooled):
+        # Replace the browser right away; the old one is closed once its last
+        # context is released.
+        logger.info(f"Recycling browser after {pooled.uses} uses")
+        try:
+            replacement = await self._launch()
+        except Exception as e:
+            logger.error(f"Could not launch a replacement browser: {e}")
+            if pooled.browser.is_connected():
+                # Keep the old browser until a replacement launches
+                return
+            replacement = None
+        pooled.retired = True
+        self._browsers.remove(pooled)
+        if replacement is not None:
+            self._browsers.append(replacement)
+            self._recycled_total += 1
+        if pooled.active == 0:
+            await self._close(pooled)
+
+    async def _replenish(self):
+        while len(self._browsers) < self.size:
+            try:
+                self._browsers.append(await self._launch())
+            except Exception as e:
+                logger.error(f"Could not launch a pooled browser: {e}")
+                return
+
+    async def _launch(self):
+        browser = await launch_browser(self._playwright, self.headless)
+        return _PooledBrowser(browser)
+
+    async def _close_sticky(self, sticky):
+        try:
+            await sticky.context.close()
+        except Exception as e:
+            logger.error(f"Error closing sticky context: {e}")
+
+    async def _close(self, pooled):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.error(f"Error closing pooled browser: {e}")
+
+
+browser_pool = BrowserPool(
+    size=settings.BROWSER_POOL_SIZE,
+    contexts_per_browser=settings.BROWSER_POOL_CONTEXTS_PER_BROWSER,
+    max_queue=settings.BROWSER_POOL_MAX_QUEUE,
+    max_uses=settings.BROWSER_POOL_MAX_USES,
+    acquire_timeout=settings.BROWSER_POOL_ACQUIRE_TIMEOUT,
+    headless=settings.BROWSER_POOL_HEADLESS,
+)
@@ -1,8 +1,96 @@
+import re
+
 from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
+
+# Tags dropped with their content before sending HTML to a model
+DROPPED_TAGS = ["script", "style", "svg", "noscript", "img", "link", "meta"]
+
+# Attributes kept when compacting HTML
+KEPT_ATTRIBUTES = ("href", "aria-label")
+
+# Wrapper tags unwrapped once they carry no attribute
+WRAPPER_TAGS = ("div", "span")
 
 
 def clean_html(html):
     soup = BeautifulSoup(html, "html.parser")
     for script in soup(["script", "style"]):
         script.extract()
-    return soup.prettify()
+    return str(soup)
+
+
+def iter_descendants(node):
+    """
+    Iterate over the descendants of a selectolax node in document order.
+
+    ``Node.traverse()`` walks on past the end of the subtree, so the
+    depth-first walk is bounded to the node explicitly.
+
+    Args:
+        node (selectolax.parser.Node): The root node, not included.
+
+    Yields:
+        selectolax.parser.Node: Each descendant, text nodes included.
+    """
+    pending = []
+    current = node.child
+    while current is not None:
+        yield current
+        if current.child is not None:
+            if current.next is not None:
+                pending.append(current.next)
+            current = current.child
+        else:
+            current = current.next
+        if current is None and pending:
+            current = pending.pop()
+
+
+def compact_html(html, as_text=False):
+    """
+    Minimise the HTML of a listing before sending it to a model.
+
+    Drops scripts, styles, SVGs and images, strips every attribute except
+    ``href`` and ``aria-label``, unwraps the attribute-less ``div``/``span``
+    wrappers and collapses whitespace. With ``as_text`` the result is plain
+    text where each link is preceded by a ``[link: <href>]`` marker.
+
+    Args:
+        html (str): The HTML code of a listing.
+        as_text (bool, optional): Whether to convert to compact text.
+            Defaults to False.
+
+    Returns:
+        str: The compacted HTML or text.
+    """
+    tree = HTMLParser(html)
+    tree.strip_tags(DROPPED_TAGS)
+    body = tree.body
+    if body is None:
+        return ""
+
+    wrappers = []
+    for node in body.traverse():
+        for name in list(node.attributes):
+            if name not in KEPT_ATTRIBUTES:
+                del node.attrs[name]
+        if node.tag in WRAPPER_TAGS and not node.attributes:
+            wrappers.append(node)
+    for node in reversed(wrappers):
+        if node.child is None:
+            node.decompose()
+        else:
+            # Keep the text of sibling wrappers apart once unwrapped
+            node.insert_after(" ")
+            node.unwrap()
+
+    if as_text:
+        for link in body.css("a[href]"):
+            link.insert_before(f" [link: {link.attributes['href']}] ")
+        return re.sub(r"\s+", " ", body.text(separator=" ")).strip()
+
+    inner_html = "".join(
+        node.html for node in body.iter(include_text=True) if node.html
+    )
+    return re.sub(r"\s+", " ", re.sub(r">\s+<", "><", inner_html)).strip()
@@ -0,0 +1,277 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from core.config import settings
+from core.logging import setup_logging
+
+logger = setup_logging()
+
+# The charset is appended by the response
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4"
+
+# Crawl stages last from milliseconds (parsing) to minutes (scrolling)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS += (10.0, 30.0, 60.0, 120.0, 300.0)
+# A listing card is scanned in microseconds, an LLM call takes seconds
+POST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+POST_BUCKETS += (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    A Prometheus histogram with labels.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The metric help text.
+        label_names (Tuple[str]): The label names.
+        buckets (Tuple[float]): The bucket upper bounds, ascending.
+    """
+
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+        self._lock = threading.Lock()
+        # Per label values: per-bucket counts (last one is +Inf), sum
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0]
+                self._series[key] = series
+            series[0][idx] += 1
+            series[1] += value
+
+    def snapshot(self, reset=False):
+        """
+        Copy the observations of every series.
+
+        Args:
+            reset (bool, optional): Whether to clear the series afterwards.
+                Defaults to False.
+
+        Returns:
+            dict: Per label values, the per-bucket counts and the sum.
+        """
+        with self._lock:
+            series = {
+                key: (list(counts), total)
+                for key, (counts, total) in self._series.items()
+            }
+            if reset:
+                self._series.clear()
+        return series
+
+    def merge(self, series):
+        """
+        Add the observations of a snapshot, e.g. taken in a worker process.
+        """
+        with self._lock:
+            for key, (counts, total) in series.items():
+                own = self._series.get(key)
+                if own is None:
+                    own = [[0] * (len(self.buckets) + 1), 0.0]
+                    self._series[key] = own
+                own[0] = [a + b for a, b in zip(own[0], counts)]
+                own[1] += total
+
+    def render(self):
+        """
+        Render the histogram in the Prometheus text exposition format.
+
+        Returns:
+            List[str]: The lines of the metric.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, (counts, total) in sorted(self.snapshot().items()):
+            labels = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.label_names, key)
+            ]
+            bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+            cumulative = 0
+            for le, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(
+                    f"{self.name}_bucket{{{bucket_labels}}} {cumulative}"
+                )
+            selector = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{selector} {total}")
+            lines.append(f"{self.name}_count{selector} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram(
+    "webdata_stage_duration_seconds",
+    "Duration of the crawl stages in seconds.",
+    ("stage",),
+    STAGE_BUCKETS,
+)
+POST_EXTRACTION_SECONDS = Histogram(
+    "webdata_post_extraction_duration_seconds",
+    "Duration of the extraction of a single listing in seconds.",
+    ("strategy",),
+    POST_BUCKETS,
+)
+METRICS = [STAGE_SECONDS, POST_EXTRACTION_SECONDS]
+
+_tracer = None
+_tracer_provider = None
+
+
+def setup_tracing():
+    """
+    Export the stage spans to an OpenTelemetry collector.
+
+    Enabled when ``OTEL_EXPORTER_OTLP_ENDPOINT`` is set; requires the
+    ``opentelemetry-sdk`` and ``opentelemetry-exporter-otlp-proto-http``
+    packages.
+    """
+    global _tracer, _tracer_provider
+    if not settings.OTEL_EXPORTER_OTLP_ENDPOINT or _tracer is not None:
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning(
+            "OpenTelemetry export requires the opentelemetry-sdk and "
+            "opentelemetry-exporter-otlp-proto-http packages"
+        )
+        return
+
+    _tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME})
+    )
+    _tracer_provider.add_span_processor(
+        BatchSpanProcessor(
+            OTLPSpanExporter(
+                endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT.rstrip("/")
+                + "/v1/traces"
+            )
+        )
+    )
+    _tracer = _tracer_provider.get_tracer("webdata_collector")
+    logger.info(f"Exporting spans to {settings.OTEL_EXPORTER_OTLP_ENDPOINT}")
+
+
+def shutdown_tracing():
+    global _tracer, _tracer_provider
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+    _tracer, _tracer_provider = None, None
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Time a crawl stage into the stage histogram, and export it as a span
+    when OpenTelemetry is set up.
+
+    Args:
+        stage (str): The stage name, e.g. "navigation" or "parse".
+        **attributes: Span attributes (not used as histogram labels).
+    """
+    start = time.perf_counter()
+    if _tracer is None:
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        return
+    with _tracer.start_as_current_span(stage, attributes=attributes):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage):
+    """
+    Decorate a function or coroutine function to time it as a crawl stage.
+
+    Args:
+        stage (str): The stage name.
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_post_extraction(strategy, seconds):
+    POST_EXTRACTION_SECONDS.observe(seconds, strategy=strategy)
+
+
+def pop_metrics():
+    """
+    Take and clear the observations of every metric, so a worker process can
+    hand them over to the parent process.
+
+    Returns:
+        dict: The snapshot of each metric by name.
+    """
+    return {metric.name: metric.snapshot(reset=True) for metric in METRICS}
+
+
+def merge_metrics(snapshots):
+    """
+    Add the observations popped in a worker process.
+
+    Args:
+        snapshots (dict): The result of ``pop_metrics``.
+    """
+    for metric in METRICS:
+        if metric.name in snapshots:
+            metric.merge(snapshots[metric.name])
+
+
+def render_metrics():
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics page.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,22 @@
 import urllib.parse
-from pydantic import BaseModel
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from core.config import settings
+
+
+def check_llm_model(params):
+    """
+    Check that LLM crawls name their model.
+
+    Raises:
+        ValueError: If the strategy is "LLM" without ``llm_choice`` and
+            ``model_name``.
+    """
+    if params.strategy == "LLM" and not (params.llm_choice and params.model_name):
+        raise ValueError("The LLM strategy requires llm_choice and model_name")
+    return params
 
 
 class QueryParams(BaseModel):
@@ -12,9 +29,14 @@ class QueryParams(BaseModel):
         max_price (float): The maximum price for the search.
         itemCondition (str): The condition of the items for the search.
         headless (bool, optional): Whether to run the browser in headless mode. Defaults to True.
-        strategy (str): The strategy for the search.
+        strategy (str): The extraction strategy: "CSS", "LLM" or "GRAPHQL" (listings decoded from the page JSON payloads).
         llm_choice (str): The choice for the llm (low-level model) search.
         model_name (str): The name of the model.
+        scroll (bool, optional): Whether to scroll to load more results. Defaults to False.
+        max_listings (int, optional): Target number of listings when scrolling.
+        time_budget (float, optional): Maximum scrolling time in seconds.
+        llm_batching (bool, optional): Whether to extract several posts per LLM call. Defaults to False.
+        incremental (bool, optional): Whether to skip the listings unchanged since the last crawl. Defaults to False.
 
     """
 
@@ -24,10 +46,63 @@ class QueryParams(BaseModel):
     itemCondition: str
     headless: bool = True
     strategy: str
-    llm_choice: str
-    model_name: str
+    llm_choice: Optional[str] = None
+    model_name: Optional[str] = None
+    scroll: bool = False
+    max_listings: int = Field(default=settings.SCROLL_MAX_LISTINGS, ge=1)
+    time_budget: float = Field(default=settings.SCROLL_TIME_BUDGET, gt=0)
+    llm_batching: bool = False
+    incremental: bool = False
+
+    _check_llm_model = model_validator(mode="after")(check_llm_model)
 
 
+class BatchQueryParams(BaseModel):
+    """
+    A class representing the query parameters of a batch crawl over the cross
+    product of several cities and queries.
+
+    Attributes:
+        cities (List[str]): The cities for the marketplace search.
+        queries (List[str]): The query strings for the search.
+        max_price (float): The maximum price for the search.
+        itemCondition (str): The condition of the items for the search.
+        headless (bool, optional): Whether to run the browser in headless mode. Defaults to True.
+        strategy (str): The extraction strategy: "CSS", "LLM" or "GRAPHQL" (listings decoded from the page JSON payloads).
+        llm_choice (str): The choice for the llm (low-level model) search.
+        model_name (str): The name of the model.
+        max_concurrency (int, optional): Maximum number of combinations crawled at once.
+        scroll (bool, optional): Whether to scroll to load more results. Defaults to False.
+        max_listings (int, optional): Target number of listings per combination when scrolling.
+        time_budget (float, optional): Maximum scrolling time per combination in seconds.
+        llm_batching (bool, optional): Whether to extract several posts per LLM call. Defaults to False.
+        incremental (bool, optional): Whether to skip the listings unchanged since the last crawl. Defaults to False.
+
+    """
+
+    cities: List[str] = Field(min_length=1)
+    queries: List[str] = Field(min_length=1)
+    max_price: float
+    itemCondition: str
+    headless: bool = True
+    strategy: str
+    llm_choice: Optional[str] = None
+    model_name: Optional[str] = None
+    max_concurrency: int = Field(
+        default=settings.BATCH_MAX_CONCURRENCY, ge=1
+    )
+    scroll: bool = False
+    max_listings: int = Field(default=settings.SCROLL_MAX_LISTINGS, ge=1)
+    time_budget: float = Field(default=settings.SCROLL_TIME_BUDGET, gt=0)
+    llm_batching: bool = False
+    incremental: bool = False
+
+    _check_llm_model = model_validator(mode="after")(check_llm_model)
+
+
+DEFAULT_MARKETPLACE_BASE_URL = "https://www.facebook.com"
+URL_LOGIN = f"{settings.MARKETPLACE_BASE_URL}/login"
+
 cities = {
     "Paris": "paris",
     "New York": "nyc",
@@ -81,6 +156,8 @@ def setup_urls_facebook_marketplace(query, max_price, city, item_condition):
     """
     Set up URLs for Facebook Marketplace search.
 
+    The URLs point at ``MARKETPLACE_BASE_URL``, facebook.com by default.
+
     Args:
         query (str): The query string for the search.
         max_price (float): The maximum price for the search.
@@ -91,9 +168,9 @@ def setup_urls_facebook_marketplace(query, max_price, city, item_condition):
         tuple: A tuple containing the login URL and the marketplace URL.
 
     """
-    url_login = "https://www.facebook.com/login"
+    url_login = URL_LOGIN
     base_url_marketplace = (
-        f"https://www.facebook.com/marketplace/{city}/search/"
+        f"{settings.MARKETPLACE_BASE_URL}/marketplace/{city}/search/"
     )
 
     query_params = {
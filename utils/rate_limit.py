@@ -0,0 +1,68 @@
+import asyncio
+import time
+import urllib.parse
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host by a minimum interval.
+
+    Attributes:
+        min_interval (float): Minimum number of seconds between two requests
+            to the same host.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url):
+        """
+        Wait until a request to the host of ``url`` is allowed.
+
+        Args:
+            url (str): The URL about to be requested.
+        """
+        host = urllib.parse.urlparse(url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for async callers.
+
+    Attributes:
+        rate (float): Tokens added per second, 0 or less for no limit.
+        capacity (float): Maximum number of tokens (burst size).
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a token is available and consume it.
+        """
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,218 @@
+import asyncio
+import base64
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+
+from core.config import settings
+from core.logging import setup_logging
+from services.marketplace_graphql import GRAPHQL_URL_PATTERN
+
+logger = setup_logging()
+
+PAGE = "page"
+PAYLOAD = "payload"
+
+
+class Recorder:
+    """
+    Records the traffic of live sessions so a stand-in server can replay it.
+
+    Each browser context saves a HAR file, and the search pages and GraphQL
+    responses of every scraped page are saved as HTML and JSON files listed
+    in ``index.jsonl``, with the URL of the page that received them.
+
+    Attributes:
+        directory (str): The recording directory, empty to disable.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        self._lock = threading.Lock()
+        # Pages already attached, dropped with the page
+        self._pages = weakref.WeakSet()
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def har_path(self):
+        """
+        Returns:
+            str | None: A new HAR file path, None when recording is disabled.
+        """
+        if not self.enabled:
+            return None
+        directory = os.path.join(self.directory, "har")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{_timestamp()}-{_short_id()}.har")
+
+    def attach(self, page):
+        """
+        Save the search pages and GraphQL responses received by a page.
+
+        Args:
+            page (Page): The Playwright page.
+        """
+        if not self.enabled or page in self._pages:
+            return
+        self._pages.add(page)
+        pending = set()
+
+        async def save(response, kind):
+            try:
+                body = await response.text()
+            except Exception as e:
+                logger.debug(f"Could not record {response.url}: {e}")
+                return
+            await asyncio.to_thread(
+                self.save, kind, response.url, page.url, body
+            )
+
+        def on_response(response):
+            kind = None
+            if response.request.resource_type == "document" and (
+                "/marketplace/" in response.url
+            ):
+                kind = PAGE
+            elif response.request.method == "POST" and (
+                GRAPHQL_URL_PATTERN.search(response.url)
+            ):
+                kind = PAYLOAD
+            if kind is not None:
+                task = asyncio.create_task(save(response, kind))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+        page.on("response", on_response)
+
+    def save(self, kind, url, page_url, body):
+        """
+        Save a recorded response and list it in the index.
+
+        Args:
+            kind (str): "page" or "payload".
+            url (str): The response URL.
+            page_url (str): The URL of the page that received it.
+            body (str): The response body.
+        """
+        extension = "html" if kind == PAGE else "json"
+        directory = os.path.join(self.directory, f"{kind}s")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory, f"{_timestamp()}-{_short_id()}.{extension}"
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(body)
+        entry = {
+            "kind": kind,
+            "url": url,
+            "page_url": page_url,
+            "path": os.path.relpath(path, self.directory),
+            "recorded_at": time.time(),
+        }
+        index_path = os.path.join(self.directory, "index.jsonl")
+        with self._lock:
+            with open(index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def load_recording_index(directory):
+    """
+    Read the index of a recording directory.
+
+    Args:
+        directory (str): The recording directory.
+
+    Returns:
+        List[dict]: The recorded responses, in recording order, with their
+        ``body`` loaded.
+    """
+    entries = []
+    index_path = os.path.join(directory, "index.jsonl")
+    if not os.path.exists(index_path):
+        return entries
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            with open(
+                os.path.join(directory, entry["path"]), "r", encoding="utf-8"
+            ) as body:
+                entry["body"] = body.read()
+            entries.append(entry)
+    return entries
+
+
+def load_har(path):
+    """
+    Read the search pages and GraphQL responses of a HAR file.
+
+    Args:
+        path (str): The HAR file, with embedded response content.
+
+    Returns:
+        List[dict]: The responses, like ``load_recording_index``.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        har = json.load(f)
+    entries, page_url = [], None
+    for har_entry in har["log"]["entries"]:
+        request = har_entry["request"]
+        content = har_entry["response"]["content"]
+        text = content.get("text")
+        if text is None:
+            continue
+        if content.get("encoding") == "base64":
+            text = base64.b64decode(text).decode("utf-8", errors="replace")
+        url = request["url"]
+        if "html" in content.get("mimeType", "") and "/marketplace/" in url:
+            kind, page_url = PAGE, url
+        elif request["method"] == "POST" and GRAPHQL_URL_PATTERN.search(url):
+            kind = PAYLOAD
+        else:
+            continue
+        entries.append(
+            {
+                "kind": kind,
+                "url": url,
+                "page_url": page_url or url,
+                "body": text,
+            }
+        )
+    return entries
+
+
+def load_recordings(directory):
+    """
+    Read the recorded responses of a directory: its index if any, else its
+    HAR files.
+
+    Args:
+        directory (str): The recording directory.
+
+    Returns:
+        List[dict]: The recorded responses, in recording order.
+    """
+    entries = load_recording_index(directory)
+    if entries:
+        return entries
+    pattern = os.path.join(directory, "**", "*.har")
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        entries.extend(load_har(path))
+    return entries
+
+
+def _timestamp():
+    return time.strftime("%Y%m%dT%H%M%S")
+
+
+def _short_id():
+    return uuid.uuid4().hex[:8]
+
+
+recorder = Recorder(settings.RECORDING_DIR)
@@ -0,0 +1,344 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+from core.config import settings
+from core.logging import setup_logging
+
+logger = setup_logging()
+
+# Analytics beacons, logging endpoints and third-party trackers
+TRACKER_PATTERNS = (
+    r"^https?://[^/]*facebook\.com/tr[/?]",
+    r"^https?://[^/]*facebook\.com/ajax/(?:bz|bnzai|logging)",
+    r"^https?://[^/]*facebook\.com/security/hsts-pixel",
+    r"^https?://connect\.facebook\.net/",
+    r"^https?://[^/]*(?:google-analytics|googletagmanager|doubleclick)\.",
+)
+
+# Versioned static assets, whose content never changes for a given URL
+STATIC_ASSET_PATTERNS = (r"^https://static\.[a-z0-9.]*fbcdn\.net/rsrc\.php/",)
+STATIC_RESOURCE_TYPES = frozenset({"script", "stylesheet", "font"})
+
+# Typical transfer sizes used to estimate the bytes saved by blocking
+RESOURCE_SIZE_ESTIMATES = {
+    "image": 40_000,
+    "media": 500_000,
+    "font": 30_000,
+    "stylesheet": 20_000,
+    "script": 50_000,
+}
+DEFAULT_SIZE_ESTIMATE = 5_000
+
+
+class RoutingPolicy:
+    """
+    Which requests a browser context lets through.
+
+    A request matching an allow pattern always goes through. Otherwise it is
+    aborted if its resource type is blocked or its URL matches a deny
+    pattern.
+
+    Attributes:
+        name (str): The policy name, i.e. the crawl mode it serves.
+        blocked_resource_types (frozenset): Playwright resource types to
+            abort (e.g. "image", "font").
+        deny_patterns (Tuple[str]): Regular expressions of URLs to abort.
+        allow_patterns (Tuple[str]): Regular expressions of URLs always
+            allowed.
+        cache_static (bool): Whether to serve versioned static assets from
+            the disk cache.
+    """
+
+    def __init__(
+        self,
+        name,
+        blocked_resource_types=(),
+        deny_patterns=(),
+        allow_patterns=(),
+        cache_static=True,
+    ):
+        self.name = name
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.deny_patterns = tuple(deny_patterns)
+        self.allow_patterns = tuple(allow_patterns)
+        self.cache_static = cache_static
+
+        self._deny = _compile(self.deny_patterns)
+        self._allow = _compile(self.allow_patterns)
+
+    def is_blocked(self, url, resource_type):
+        """
+        Decide whether a request is aborted.
+
+        Args:
+            url (str): The request URL.
+            resource_type (str): The Playwright resource type.
+
+        Returns:
+            bool: True to abort the request.
+        """
+        if self._allow is not None and self._allow.search(url):
+            return False
+        if resource_type in self.blocked_resource_types:
+            return True
+        return self._deny is not None and self._deny.search(url) is not None
+
+
+def _compile(patterns):
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+def _with_overrides(blocked_resource_types, deny_patterns=TRACKER_PATTERNS):
+    return {
+        "blocked_resource_types": blocked_resource_types,
+        "deny_patterns": deny_patterns + tuple(settings.ROUTING_DENY_PATTERNS),
+        "allow_patterns": tuple(settings.ROUTING_ALLOW_PATTERNS),
+        "cache_static": settings.ROUTING_STATIC_CACHE_ENABLED,
+    }
+
+
+# One policy per crawl mode. Infinite scroll needs the stylesheets for the
+# layout that triggers loading more results; login pages keep them too so
+# the cookie and login buttons stay visible.
+ROUTING_POLICIES = {
+    "page": RoutingPolicy(
+        "page",
+        **_with_overrides(
+            ("image", "media", "font", "stylesheet", "texttrack", "manifest")
+        ),
+    ),
+    "scroll": RoutingPolicy(
+        "scroll",
+        **_with_overrides(("image", "media", "font", "texttrack", "manifest")),
+    ),
+    "login": RoutingPolicy(
+        "login", **_with_overrides(("image", "media", "texttrack"))
+    ),
+    "off": RoutingPolicy("off", cache_static=False),
+}
+
+LOGIN_URL_PATTERN = re.compile(r"/(?:login|checkpoint)")
+
+
+class StaticAssetCache:
+    """
+    Disk cache of versioned static assets, keyed by URL.
+
+    Each asset is stored as a body file and a JSON file holding its status
+    and headers.
+
+    Attributes:
+        directory (str): The cache directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.patterns = _compile(STATIC_ASSET_PATTERNS)
+
+    def is_cacheable(self, request):
+        return (
+            request.method == "GET"
+            and request.resource_type in STATIC_RESOURCE_TYPES
+            and self.patterns.search(request.url) is not None
+        )
+
+    async def get(self, url):
+        return await asyncio.to_thread(self._read, self._path(url))
+
+    async def set(self, url, status, headers, body):
+        await asyncio.to_thread(
+            self._write, self._path(url), status, headers, body
+        )
+
+    def _path(self, url):
+        return os.path.join(
+            self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest()
+        )
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path + ".json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(path, "rb") as f:
+                return meta["status"], meta["headers"], f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, path, status, headers, body):
+        os.makedirs(self.directory, exist_ok=True)
+        # The body is written first so a metadata file always has its body
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        with open(path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"status": status, "headers": headers}, f)
+        os.replace(path + ".json.tmp", path + ".json")
+
+
+class RoutingStats:
+    """
+    Request counters of the routing policies, per policy.
+
+    Blocked requests are never downloaded, so their bytes are estimated
+    from the average size of the allowed requests of the same type.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._sizes = {}
+
+    def blocked(self, policy, resource_type):
+        with self._lock:
+            counters = self._policy(policy)
+            counters["blocked_requests"] += 1
+            counters["blocked_bytes_estimate"] += self._estimate(resource_type)
+            counters[f"blocked.{resource_type}"] += 1
+
+    def allowed(self, policy, resource_type, size):
+        with self._lock:
+            counters = self._policy(policy)
+            counters["allowed_requests"] += 1
+            counters["allowed_bytes"] += size
+            total, count = self._sizes.get(resource_type, (0, 0))
+            self._sizes[resource_type] = (total + size, count + 1)
+
+    def cached(self, policy, size):
+        with self._lock:
+            counters = self._policy(policy)
+            counters["cache_hits"] += 1
+            counters["cache_bytes"] += size
+
+    def stats(self):
+        """
+        Return the counters of each policy.
+
+        Returns:
+            dict: Allowed and blocked requests and bytes, and static cache
+            hits, per policy.
+        """
+        with self._lock:
+            return {
+                policy: dict(counters)
+                for policy, counters in self._counters.items()
+            }
+
+    def _policy(self, policy):
+        return self._counters.setdefault(policy, Counter())
+
+    def _estimate(self, resource_type):
+        total, count = self._sizes.get(resource_type, (0, 0))
+        if count:
+            return total // count
+        return RESOURCE_SIZE_ESTIMATES.get(resource_type, DEFAULT_SIZE_ESTIMATE)
+
+
+routing_stats = RoutingStats()
+static_asset_cache = StaticAssetCache(settings.ROUTING_STATIC_CACHE_DIR)
+
+
+def get_routing_policy(mode):
+    """
+    Get the routing policy of a crawl mode.
+
+    Args:
+        mode (str): "page", "scroll", "login" or "off".
+
+    Returns:
+        RoutingPolicy: The policy.
+    """
+    try:
+        return ROUTING_POLICIES[mode]
+    except KeyError:
+        raise ValueError(
+            f"{mode} is not a supported routing mode. "
+            f"Choose one of {', '.join(ROUTING_POLICIES)}."
+        )
+
+
+async def apply_routing_policy(context, mode):
+    """
+    Route every request of a browser context through a routing policy.
+
+    Login and checkpoint pages always use the "login" policy. Versioned
+    static assets are served from the disk cache when the policy allows it,
+    and the bytes of the other allowed requests are counted once finished.
+
+    Args:
+        context (BrowserContext): The browser context.
+        mode (str): The crawl mode, see ``get_routing_policy``.
+    """
+    if not settings.ROUTING_ENABLED:
+        mode = "off"
+    crawl_policy = get_routing_policy(mode)
+    login_policy = get_routing_policy("login")
+    if crawl_policy.name == "off":
+        return
+
+    def policy_of(request):
+        try:
+            frame_url = request.frame.url
+        except Exception:
+            frame_url = ""
+        if LOGIN_URL_PATTERN.search(frame_url or request.url):
+            return login_policy
+        return crawl_policy
+
+    async def handle(route):
+        request = route.request
+        policy = policy_of(request)
+        if policy.is_blocked(request.url, request.resource_type):
+            routing_stats.blocked(policy.name, request.resource_type)
+            await route.abort()
+            return
+
+        if policy.cache_static and static_asset_cache.is_cacheable(request):
+            cached = await static_asset_cache.get(request.url)
+            if cached is None:
+                response = await route.fetch()
+                body = await response.body()
+                headers = response.headers
+                if response.status == 200 and "no-store" not in headers.get(
+                    "cache-control", ""
+                ):
+                    await static_asset_cache.set(
+                        request.url, response.status, headers, body
+                    )
+                routing_stats.allowed(
+                    policy.name, request.resource_type, len(body)
+                )
+                await route.fulfill(response=response, body=body)
+                return
+            status, headers, body = cached
+            routing_stats.cached(policy.name, len(body))
+            await route.fulfill(status=status, headers=headers, body=body)
+            return
+
+        await route.continue_()
+
+    async def on_request_finished(request):
+        # Only the requests continued to the network, not those fulfilled
+        # by the handler above
+        policy = policy_of(request)
+        if policy.cache_static and static_asset_cache.is_cacheable(request):
+            return
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        routing_stats.allowed(
+            policy.name,
+            request.resource_type,
+            sizes["responseBodySize"] + sizes["responseHeadersSize"],
+        )
+
+    await context.route("**/*", handle)
+    context.on("requestfinished", on_request_finished)
@@ -0,0 +1,401 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+from selectolax.parser import HTMLParser
+
+from core.config import settings
+from core.logging import setup_logging
+from utils.html_utils import iter_descendants
+
+logger = setup_logging()
+
+# Facebook Marketplace atomic CSS classes of a single listing card
+LISTING_CLASS = "x9f619 x78zum5 x1r8uery xdt5ytf x1iyjqo2 xs83m0k x1e558r4 x150jy0e x1iorvi4 xjkvuk6 xnpuxes x291uyu x1uepa24"
+
+# CSS selector matching the listing cards
+LISTING_SELECTOR = "div." + ".".join(LISTING_CLASS.split())
+
+# Atomic CSS classes of the listing fields
+TITLE_CLASS = "x1lliihq x6ikm8r x10wlt62 x1n2onr6"
+PRICE_CLASS = "x193iq5w"
+LOCATION_CLASS = "x1nxh6w3"
+
+# Structural fallback: every listing card links to its item page
+LISTING_LINK_SELECTOR = 'a[href*="/marketplace/item/"]'
+
+FIELDS = ("title", "price", "location")
+
+# Where a field value came from
+SELECTOR = "selector"
+FALLBACK = "fallback"
+MISS = "miss"
+
+PRICE_TEXT = re.compile(
+    r"^\D{0,4}\d[\d\s.,]*\D{0,4}$|^(?:free|gratuit)$", re.IGNORECASE
+)
+
+
+def _normalize_text(text):
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+class SelectorSet:
+    """
+    A versioned set of selectors for the listing cards and their fields.
+
+    Each field has an ordered list of rules; a rule matches an element by tag
+    and class attribute, either exactly or by a subset of class tokens.
+
+    Attributes:
+        version (str): The selector set version.
+        listing_class (str): The class attribute of the listing card divs.
+        fields (Dict[str, List[dict]]): The rules of each field, as dicts
+            with ``tag``, ``class`` and ``exact`` keys.
+        learned_at (float): When the set was learned, None if built in.
+    """
+
+    def __init__(self, version, listing_class, fields, learned_at=None):
+        self.version = version
+        self.listing_class = listing_class
+        self.fields = fields
+        self.learned_at = learned_at
+
+        self._rules = [
+            (field, rule["tag"], rule["class"], rule.get("exact", False))
+            for field in FIELDS
+            for rule in fields.get(field, [])
+        ]
+        self.tags = frozenset(tag for _, tag, _, _ in self._rules)
+
+    @property
+    def listing_selector(self):
+        return "div." + ".".join(self.listing_class.split())
+
+    def field_of(self, tag, class_attr):
+        """
+        Get the field held by an element.
+
+        Args:
+            tag (str): The element tag.
+            class_attr (str): The element class attribute.
+
+        Returns:
+            str | None: The field name, or None if no rule matches.
+        """
+        if not class_attr or tag not in self.tags:
+            return None
+        tokens = None
+        for field, rule_tag, rule_class, exact in self._rules:
+            if rule_tag != tag:
+                continue
+            if exact:
+                if class_attr == rule_class:
+                    return field
+                continue
+            if tokens is None:
+                tokens = set(class_attr.split())
+            if tokens.issuperset(rule_class.split()):
+                return field
+        return None
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "listing_class": self.listing_class,
+            "fields": self.fields,
+            "learned_at": self.learned_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["version"],
+            data["listing_class"],
+            data["fields"],
+            data.get("learned_at"),
+        )
+
+
+BUILTIN_SELECTOR_SETS = [
+    SelectorSet(
+        "2024.1",
+        LISTING_CLASS,
+        {
+            "title": [{"tag": "span", "class": TITLE_CLASS, "exact": True}],
+            "price": [{"tag": "span", "class": PRICE_CLASS}],
+            "location": [{"tag": "span", "class": LOCATION_CLASS}],
+        },
+    ),
+]
+
+
+def structural_fields(card_html):
+    """
+    Extract the fields of a listing card from its structure alone.
+
+    Used when the selectors miss a field: the text leaves of the card are
+    read in document order, the price being the first price-like text and
+    the title and location the next two texts. The link ``aria-label`` or
+    image ``alt`` stands in for a missing title.
+
+    Args:
+        card_html (str): The HTML of the listing card.
+
+    Returns:
+        Dict[str, str | None]: The title, price and location found.
+    """
+    tree = HTMLParser(card_html)
+    texts = []
+    for node in iter_descendants(tree.body):
+        # Text leaves: elements holding a single text node
+        if node.child is None or node.child.next is not None:
+            continue
+        text = node.text(deep=False).strip()
+        if node.child.tag == "-text" and text:
+            texts.append(text)
+    found = dict.fromkeys(FIELDS)
+    rest = texts
+    for idx, text in enumerate(texts):
+        if PRICE_TEXT.match(text):
+            found["price"] = text
+            rest = texts[idx + 1 :]
+            break
+    rest = [text for text in rest if not PRICE_TEXT.match(text)]
+    if rest:
+        found["title"] = rest[0]
+    if len(rest) > 1:
+        found["location"] = rest[1]
+
+    if found["title"] is None:
+        labelled = tree.css_first("a[aria-label], img[alt]")
+        if labelled is not None:
+            found["title"] = labelled.attributes.get(
+                "aria-label"
+            ) or labelled.attributes.get("alt")
+    return found
+
+
+def _candidate_rule(card_html, value):
+    # Tag and class tokens of the innermost classed element holding the
+    # labelled value
+    wanted = _normalize_text(value)
+    rule, rule_depth = None, -1
+    for node in HTMLParser(card_html).css("[class]"):
+        if _normalize_text(node.text()) != wanted:
+            continue
+        depth, parent = 0, node.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        if depth > rule_depth:
+            rule = (node.tag, frozenset(node.attributes["class"].split()))
+            rule_depth = depth
+    return rule
+
+
+class SelectorRegistry:
+    """
+    Registry of the selector sets, with field hit-rate tracking and
+    selectors learned from labelled listings.
+
+    Built-in sets are extended by the sets learned from LLM-labelled
+    listings, which are cached on disk. The active set is the configured
+    version, or else the most recently learned one.
+
+    Attributes:
+        cache_path (str): Path of the JSON cache of learned sets.
+        version (str): The version to use, empty for the latest.
+        min_support (float): Share of the samples in which a learned rule
+            must match its field.
+        min_accuracy (float): Share of the sample fields a learned set must
+            extract correctly to be adopted.
+    """
+
+    def __init__(
+        self, cache_path, version="", min_support=0.6, min_accuracy=0.8
+    ):
+        self.cache_path = cache_path
+        self.version = version
+        self.min_support = min_support
+        self.min_accuracy = min_accuracy
+
+        self._lock = threading.Lock()
+        self._sets = {s.version: s for s in BUILTIN_SELECTOR_SETS}
+        self._learned = []
+        self._counters = {}
+        self._load()
+
+    @property
+    def active(self):
+        """
+        SelectorSet: The selector set used to parse listings.
+        """
+        if self.version in self._sets:
+            return self._sets[self.version]
+        if self._learned:
+            return self._learned[-1]
+        return BUILTIN_SELECTOR_SETS[-1]
+
+    def versions(self):
+        return list(self._sets)
+
+    def record(self, version, sources):
+        """
+        Count where the field values of parsed listings came from.
+
+        Args:
+            version (str): The selector set version used.
+            sources (Iterable[Dict[str, str]]): For each listing, the source
+                (selector, fallback or miss) of each field.
+        """
+        with self._lock:
+            counters = self._counters.setdefault(
+                version,
+                {field: Counter() for field in FIELDS},
+            )
+            for listing_sources in sources:
+                for field, source in listing_sources.items():
+                    counters[field][source] += 1
+
+    def stats(self):
+        """
+        Return the per-field hit rates of each selector set used.
+
+        Returns:
+            dict: The active version, the known versions and, for each
+            version used, the selector/fallback/miss counts and the selector
+            hit rate of each field.
+        """
+        with self._lock:
+            usage = {}
+            for version, counters in self._counters.items():
+                usage[version] = {}
+                for field, counter in counters.items():
+                    total = sum(counter.values())
+                    usage[version][field] = {
+                        SELECTOR: counter[SELECTOR],
+                        FALLBACK: counter[FALLBACK],
+                        MISS: counter[MISS],
+                        "hit_rate": (
+                            round(counter[SELECTOR] / total, 4) if total else 0.0
+                        ),
+                    }
+        return {
+            "active": self.active.version,
+            "versions": self.versions(),
+            "usage": usage,
+        }
+
+    def learn(self, samples, extract):
+        """
+        Learn a selector set from labelled listing cards.
+
+        For each field, the class tokens shared by the elements holding the
+        labelled value become the new rule; the rules of the active set are
+        kept as fallbacks. The learned set is adopted and cached only if it
+        extracts the samples better than the active set.
+
+        Args:
+            samples (List[Tuple[str, dict]]): Listing card HTML with its
+                labelled ``title``, ``price`` and ``location``.
+            extract (Callable): Extracts the fields of a card HTML with a
+                given selector set, returning a dict like the labels.
+
+        Returns:
+            SelectorSet | None: The adopted set, or None.
+        """
+        if not samples:
+            return None
+        current = self.active
+        fields = {}
+        for field in FIELDS:
+            matches = []
+            for card_html, labels in samples:
+                value = labels.get(field)
+                if not value or value == "None":
+                    continue
+                rule = _candidate_rule(card_html, value)
+                if rule is not None:
+                    matches.append(rule)
+            learned = []
+            if len(matches) >= self.min_support * len(samples):
+                tag, _ = Counter(t for t, _ in matches).most_common(1)[0]
+                tokens = frozenset.intersection(
+                    *(classes for t, classes in matches if t == tag)
+                )
+                if tokens:
+                    learned.append(
+                        {"tag": tag, "class": " ".join(sorted(tokens))}
+                    )
+            fields[field] = learned + current.fields.get(field, [])
+
+        candidate = SelectorSet(
+            f"learned-{int(time.time())}-{uuid.uuid4().hex[:6]}",
+            current.listing_class,
+            fields,
+            learned_at=time.time(),
+        )
+        current_accuracy = self._accuracy(current, samples, extract)
+        accuracy = self._accuracy(candidate, samples, extract)
+        logger.info(
+            f"Learned selectors {candidate.version}: accuracy {accuracy:.2f} "
+            f"vs {current_accuracy:.2f} for {current.version}"
+        )
+        if accuracy < self.min_accuracy or accuracy <= current_accuracy:
+            return None
+
+        with self._lock:
+            if self.active is not current:
+                # Another learning adopted a set meanwhile
+                return None
+            self._sets[candidate.version] = candidate
+            self._learned.append(candidate)
+            self._save()
+        return candidate
+
+    def _accuracy(self, selector_set, samples, extract):
+        correct, total = 0, 0
+        for card_html, labels in samples:
+            found = extract(card_html, selector_set)
+            for field in FIELDS:
+                value = labels.get(field)
+                if not value or value == "None":
+                    continue
+                total += 1
+                correct += _normalize_text(found.get(field)) == _normalize_text(
+                    value
+                )
+        return correct / total if total else 0.0
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                learned = [SelectorSet.from_dict(data) for data in json.load(f)]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring selector cache {self.cache_path}: {e}")
+            return
+        for selector_set in learned:
+            self._sets[selector_set.version] = selector_set
+        self._learned = learned
+
+    def _save(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([s.to_dict() for s in self._learned], f, indent=2)
+        os.replace(tmp_path, self.cache_path)
+
+
+selector_registry = SelectorRegistry(
+    cache_path=settings.SELECTOR_CACHE_PATH,
+    version=settings.SELECTOR_SET_VERSION,
+    min_accuracy=settings.SELECTOR_MIN_ACCURACY,
+)
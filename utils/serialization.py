@@ -0,0 +1,91 @@
+import orjson
+import pyarrow as pa
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def to_ndjson_line(record):
+    """
+    Serialise a record to a single NDJSON line.
+
+    Args:
+        record (dict): The record, which may hold numpy scalars and dates.
+
+    Returns:
+        bytes: The JSON encoded record followed by a newline.
+    """
+    return orjson.dumps(
+        record,
+        default=str,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE,
+    )
+
+
+def dataframe_to_arrow_ipc(df):
+    """
+    Serialise a DataFrame to the Arrow IPC streaming format.
+
+    Args:
+        df (DataFrame): The DataFrame.
+
+    Returns:
+        bytes: The Arrow IPC stream.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_ipc_to_dataframe(data):
+    """
+    Deserialise an Arrow IPC stream to a DataFrame.
+
+    Args:
+        data (bytes): The Arrow IPC stream.
+
+    Returns:
+        DataFrame: The DataFrame.
+    """
+    with pa.ipc.open_stream(data) as reader:
+        return reader.read_all().to_pandas()
+
+
+def negotiate_media_type(accept_header):
+    """
+    Pick the response media type from an Accept header.
+
+    Media ranges are tried by decreasing quality value, ``q=0`` ranges are
+    refused.
+
+    Args:
+        accept_header (str): The value of the Accept request header.
+
+    Returns:
+        str: NDJSON or Arrow IPC stream when the client prefers it, JSON
+        otherwise.
+    """
+    accepted = []
+    for media_range in (accept_header or "").split(","):
+        media_type, *media_params = media_range.split(";")
+        quality = 1.0
+        for param in media_params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.append((quality, media_type.strip().lower()))
+    # Stable sort, ranges of equal quality keep their order
+    accepted.sort(key=lambda item: -item[0])
+    for _, media_type in accepted:
+        if media_type in (NDJSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE):
+            return media_type
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from core.config import settings
+from core.logging import setup_logging
+
+logger = setup_logging()
+
+# Cookies Facebook sets on an authenticated session
+AUTH_COOKIES = ("c_user", "xs")
+
+
+class SessionCache:
+    """
+    On-disk cache of Playwright storage states keyed by account.
+
+    A saved state is reused until it is older than ``ttl`` seconds, its
+    authentication cookies expire, or the site rejects it (see
+    ``invalidate``).
+
+    Attributes:
+        directory (str): Directory holding one JSON file per account.
+        ttl (float): Maximum age of a saved session in seconds.
+    """
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+
+    def load(self, account):
+        """
+        Load the storage state saved for an account.
+
+        Args:
+            account (str): The account identifier (e.g. the login email).
+
+        Returns:
+            dict | None: The storage state, or None if missing, expired or
+            lacking valid authentication cookies.
+        """
+        path = self._path(account)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unreadable session cache entry {path}: {e}")
+            return None
+
+        if time.time() - entry.get("saved_at", 0) > self.ttl:
+            logger.info("Saved session expired")
+            return None
+
+        storage_state = entry.get("storage_state")
+        if not is_storage_state_valid(storage_state):
+            logger.info("Saved session has no valid authentication cookies")
+            return None
+
+        return storage_state
+
+    def save(self, account, storage_state):
+        """
+        Save the storage state of an authenticated session.
+
+        Args:
+            account (str): The account identifier.
+            storage_state (dict): The state returned by
+                ``BrowserContext.storage_state()``.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # A temporary file per save, so concurrent saves of one account never
+        # write to the same file before the atomic replace
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False, encoding="utf-8"
+        ) as f:
+            json.dump({"saved_at": time.time(), "storage_state": storage_state}, f)
+        try:
+            os.replace(f.name, self._path(account))
+        except OSError:
+            os.remove(f.name)
+            raise
+        logger.info("Saved authenticated session")
+
+    def invalidate(self, account):
+        """
+        Drop the storage state saved for an account.
+
+        Args:
+            account (str): The account identifier.
+        """
+        try:
+            os.remove(self._path(account))
+            logger.info("Invalidated saved session")
+        except FileNotFoundError:
+            pass
+
+    def _path(self, account):
+        digest = hashlib.sha256((account or "").encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest[:16]}.json")
+
+
+def is_storage_state_valid(storage_state):
+    """
+    Check that a storage state holds unexpired authentication cookies.
+
+    This is a local check only; a session revoked server-side is detected
+    when a page redirects to the login form.
+
+    Args:
+        storage_state (dict): A Playwright storage state.
+
+    Returns:
+        bool: True if every authentication cookie is present and unexpired.
+    """
+    if not storage_state:
+        return False
+
+    now = time.time()
+    cookies = {c["name"]: c for c in storage_state.get("cookies", [])}
+    for name in AUTH_COOKIES:
+        cookie = cookies.get(name)
+        if cookie is None:
+            return False
+        expires = cookie.get("expires", -1)
+        if expires != -1 and expires < now:
+            return False
+    return True
+
+
+session_cache = SessionCache(
+    directory=settings.SESSION_CACHE_DIR,
+    ttl=settings.SESSION_CACHE_TTL,
+)